@@ -0,0 +1,149 @@
+import os
+import json
+
+# Events dispatched by an IIDChecker while it parses a patch, for tracing what
+# the parser does without turning on its debug output, and for feeding what it
+# finds into other tools as it finds it.
+#
+# Listeners are added with IIDChecker.addEventListener(). A listener is any
+# callable taking a single CheckEvent. Events are only created when a checker
+# has listeners, so checks without any pay nothing for them. Listeners are
+# called on the thread doing the parsing, in the order in which the parser
+# (legacy or vectorized) makes its decisions, so they should be quick.
+#
+# File sections answered from a VerdictCache aren't parsed, so they don't
+# dispatch any events.
+
+
+# @class CheckEvent Something that happened at a line of a patch.
+class CheckEvent:
+
+    # The type of the event, as used in toDict(). Subclasses override this.
+    kType = "event"
+
+    # Create a new CheckEvent.
+    #
+    # @param aIDLFileName The name of the IDL file whose section of the patch
+    #        the event happened in, or None, if it happened before the first one.
+    # @param aInterfaceName The name of the interface the event concerns, or
+    #        None, if it doesn't concern one.
+    # @param aLineNumber The line number, in the patched IDL file, at which the
+    #        event happened, or None, if it didn't happen at one.
+    # @param aPatchLineNumber The (1-based) line number, in the patch, at which
+    #        the event happened.
+    def __init__(self, aIDLFileName, aInterfaceName, aLineNumber, aPatchLineNumber):
+        self.mIDLFileName = aIDLFileName
+        self.mInterfaceName = aInterfaceName
+        self.mLineNumber = aLineNumber
+        self.mPatchLineNumber = aPatchLineNumber
+
+    def getType(self):
+        return self.kType
+
+    def getIDLFileName(self):
+        return self.mIDLFileName
+
+    def getInterfaceName(self):
+        return self.mInterfaceName
+
+    def getLineNumber(self):
+        return self.mLineNumber
+
+    def getPatchLineNumber(self):
+        return self.mPatchLineNumber
+
+    # Convert the event into a form that can be stored as JSON.
+    #
+    # @returns A dict.
+    def toDict(self):
+        return {'type': self.kType,
+                'file': self.mIDLFileName,
+                'interface': self.mInterfaceName,
+                'line': self.mLineNumber,
+                'patchLine': self.mPatchLineNumber}
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self.toDict()) + ")"
+
+
+# @class InterfaceFlaggedEvent An interface was found to require a new IID,
+#        having not required one until then.
+class InterfaceFlaggedEvent(CheckEvent):
+    kType = "flagged"
+
+
+# @class InterfaceClearedEvent An interface that required a new IID was found
+#        to be removed entirely, so no longer requires one.
+class InterfaceClearedEvent(CheckEvent):
+    kType = "cleared"
+
+
+# @class IIDChangeEvent An IID was added to, or removed from, an interface
+#        definition.
+class IIDChangeEvent(CheckEvent):
+    kType = "iid"
+
+    # Create a new IIDChangeEvent.
+    #
+    # @param aKind '+', if the IID was added, or '-', if it was removed. The
+    #        interface of a removed IID isn't known, so is always None.
+    # @param aIID The IID.
+    #
+    # See CheckEvent for the other arguments.
+    def __init__(self, aIDLFileName, aInterfaceName, aLineNumber, aPatchLineNumber, aKind, aIID):
+        CheckEvent.__init__(self, aIDLFileName, aInterfaceName, aLineNumber, aPatchLineNumber)
+        self.mKind = aKind
+        self.mIID = aIID
+
+    def getKind(self):
+        return self.mKind
+
+    def getIID(self):
+        return self.mIID
+
+    def toDict(self):
+        contents = CheckEvent.toDict(self)
+        contents['kind'] = self.mKind
+        contents['iid'] = self.mIID
+        return contents
+
+
+# @class SectionFinishedEvent The parser reached the end of the section of the
+#        patch for an IDL file. Its patch line number is that of the last line
+#        of the section, and it has no interface or line number.
+#
+# Sections cut short by a deadline don't finish.
+class SectionFinishedEvent(CheckEvent):
+    kType = "section"
+
+
+# @class JSONLinesEventWriter A listener that writes each event as a JSON object
+#        on a line of its own (see CheckEvent.toDict()) to a file descriptor.
+class JSONLinesEventWriter:
+
+    # Create a new JSONLinesEventWriter.
+    #
+    # @param aFileDescriptor The file descriptor to write to. It is not closed by
+    #        the writer.
+    def __init__(self, aFileDescriptor):
+        self.mFileDescriptor = aFileDescriptor
+
+    def __call__(self, aEvent):
+        data = (json.dumps(aEvent.toDict()) + "\n").encode('utf-8', 'surrogateescape')
+        while data:
+            written = os.write(self.mFileDescriptor, data)
+            data = data[written:]
+
+
+# @class EventCounter A listener that counts events by type in a CheckMetrics
+#        object, as the 'events' metric.
+class EventCounter:
+
+    # Create a new EventCounter.
+    #
+    # @param aMetrics The CheckMetrics in which to count events.
+    def __init__(self, aMetrics):
+        self.mMetrics = aMetrics
+
+    def __call__(self, aEvent):
+        self.mMetrics.add('events', 1, {'type': aEvent.kType})
@@ -19,33 +19,30 @@
 # WARNING: Your tree must be in the same state as <endrev>. To achieve this,
 #          you must run: hg update -r <endrev> BEFORE running the script!
 #
+# NOTE: argparse and tempfile are imported only where they're needed, to keep
+#       hook invocations (see checkiidhook.py) as cheap as possible.
 import re
 import sys
+import time
+import collections
 import os.path
-import argparse
-import tempfile
 from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
 from idlutils import IDLDescriptor
-from idlutils import SpecialBlockRange
-
-# Use to turn on debugging output
-DEBUG = False
-
-# Verbose output switch
-VERBOSE = False
-
-# Whether or not color formatting should be turned on
-COLOR = True
-
-# Path to reference "output" file when performing unit test in test mode.
-gOutputTestPath = None
+from idlutils import SpecialBlockRangeCache
+from idlutils import FileContentProvider
+from uuidindex import normalizeIID
+from patchinput import PatchBuffer
+from patchinput import decodePatchLine
+from resulttable import InterfaceResultTable
+from checkevents import InterfaceFlaggedEvent
+from checkevents import InterfaceClearedEvent
+from checkevents import IIDChangeEvent
+from checkevents import SectionFinishedEvent
 
 # Command-line argument parser
 gParser = None
 
-# Printing utility vehicle
-gPrinter = None
-
 # Simple class representing an interface or dictionary name.
 # class ChangeContainer:
 #  def __init__(self, aName, aType='interface'):
@@ -79,82 +76,6 @@ def isStartOfIDLFile(aLine):
     return False
 
 
-# Detect whether or not a line is the addition of a new interface, based on
-# data collected from the line, the current interface (if one has been seen)
-# and the IDL file of which the interface is a part.
-#
-# @param aLine The line to check. This line must represent an interface
-#        definition line for this method to return true.
-# @param aCurrentInterface The name of the interface currently being processed.
-#        Can be None, but this will automatically result in a return value of
-#        False.
-# @param aIDLFilePath The path on the filesystem to the IDL file where
-#        aCurrentInterface is defined. If this is None, then this method will
-#        return False.
-# @param aLineRange A tuple containing the start and end lines (the range) from
-#        which we last saw the removal of the IID and interface. Can be None,
-#        but this will result in searching the entire IDL file for the given
-#        interface name.
-#
-# @returns True, if the line represents a new interface that was renamed from
-#          aCurrentInterface; False otherwise.
-def isLineInterfaceRename(aLine, aCurrentInterface, aIDLFilePath, aLineRange=None):
-    global gPrinter
-
-    if not aIDLFilePath:
-        gPrinter.debug("isLineInterfaceRename: Path nonexistent: " + str(aIDLFilePath))
-        return False
-
-    if not aCurrentInterface:
-        gPrinter.debug("isLineInterfaceRename: current interface is not set!")
-        return False
-
-    if not isInterfaceDefinitionLine(aLine):
-        gPrinter.debug("isLineInterfaceRename: aLine is not interface definition line")
-        return False
-
-    # If this line is an interface definition line, and a current interface is
-    # specified, then look at the IDL file path at the given lines, and see if
-    # they still contain the old interface name.
-    try:
-        idlFile = open(aIDLFilePath)
-    except:
-        # We had trouble opening the file, so just return a false value so we report
-        # the error.
-        gPrinter.debug("isLineInterfaceRename: could not open file path: '" + aIDLFilePath + "'")
-        return False
-
-    idlLines = idlFile.readlines()
-
-    if not aLineRange:
-        start = 0
-        end = len(idlLines)
-    else:
-        (start, end) = aLineRange
-
-    if not start:
-        start = 0
-
-    if not end or end > len(idlLines):
-        end = len(idlLines)
-
-    gPrinter.debug("start is: " + str(start) + ", end is: " + str(end))
-    idlFile.close()
-
-    counter = start - 1
-
-    gPrinter.debug("idlLines has: " + str(len(idlLines)) + " lines.")
-    while (counter < end):
-        gPrinter.debug("Attempting to get value within idlLines at line: " + str(counter))
-        idlFileLine = idlLines[counter]
-        if str(aCurrentInterface) in idlFileLine:
-            gPrinter.debug("isLineInterfaceRename: found '" + str(aCurrentInterface) + "' in specified lines!")
-            return False
-        counter = counter + 1
-
-    return True
-
-
 # Detect whether or not a line is an addition of a line containing an IDL IID.
 #
 # @param aLine A line to check
@@ -293,47 +214,24 @@ def isLineStartOfNewFile(aLine):
     return False
 
 
-def isLineConstantExpression(aLine):
-    global gPrinter
-    if not isAdditionLine(aLine) and not isRemovalLine(aLine):
-        return False
-
-    match = re.search("^(\s)*[\+\-](\s)+const(\s)+(.*)", aLine)
-    if match:
-        gPrinter.debug("Line is constant expression: " + aLine)
-        return True
-    return False
-
-
-# Determine whether or not this line represents the addition or removal of a
-# comment. This is a non-functional change, and IIDs should not be incremented
-# if the only changes to a file are non-functional changes.
+# Determine whether or not a line is the addition or removal of a constant
+# definition. Constants don't affect the vtable layout of an interface, so they
+# don't require an IID change.
 #
 # @param aLine The line to check
-# @param aLineNumber The line number (in the original file, NOT in the diff
-#        output) where this line will take effect.
-# @param aFilePath The path to the IDL file that this line is changing.
+# @param aPrinter An optional argument of type PrettyPrinter to route debug
+#        output from this method through.
 #
-# @returns True, if aLine indicates a comment (block or single-line);
-#          False, otherwise.
-def isLineComment(aLine, aLineNumber, aFilePath):
-    global gPrinter
-    if not isLineChange(aLine):
+# @returns True, if aLine adds or removes a constant; False, otherwise.
+def isLineConstantExpression(aLine, aPrinter=None):
+    if not isAdditionLine(aLine) and not isRemovalLine(aLine):
         return False
 
-    # To determine this, we check to see if the line starts with '//'
-    match = re.search("^[\+\-](\s)*\/\/", aLine)
-    if (match):
+    match = re.search("^(\s)*[\+\-](\s)+const(\s)+(.*)", aLine)
+    if match:
+        if aPrinter:
+            aPrinter.debug("Line is constant expression: " + aLine)
         return True
-
-    # or is contained within a block comment for a given file.
-    ranges = SpecialBlockRange.getRangesForFilePath(aFilePath, gPrinter)
-
-    for myRange in ranges:
-        if aLineNumber in myRange:
-            gPrinter.debug("Line " + str(aLineNumber) + ": Block comment running from: " + str(myRange.mStartLine) + " to " + str(myRange.mEndLine))
-            return True
-
     return False
 
 
@@ -341,18 +239,19 @@ def isLineComment(aLine, aLineNumber, aFilePath):
 # file.
 #
 # @param aLine The line to check
+# @param aPrinter An optional argument of type PrettyPrinter to route debug
+#        output from this method through.
 #
 # @returns True, if the aLine corresponds to the definition of an interface;
 #          False, otherwise.
-def isInterfaceDefinitionLine(aLine):
-    global gPrinter
-
+def isInterfaceDefinitionLine(aLine, aPrinter=None):
     if extractInterfaceNameFromDefinitionLine(aLine):
         # If this line ends with a semicolon, then it's not a real interface
         # definition line, but rather a forward declaration. That's not what we want.
         trimmedLine = aLine.rstrip()
         if len(trimmedLine) == 0 or trimmedLine[len(trimmedLine) - 1] == ';':
-            gPrinter.debug("Line: " + aLine + " was detected to be a forward declaration.")
+            if aPrinter:
+                aPrinter.debug("Line: " + aLine + " was detected to be a forward declaration.")
             return False
 
         return True
@@ -429,6 +328,21 @@ def extractLineNumberFromContext(aLine):
     return 0
 
 
+# Extract the line number at which a hunk starts in the changed version of a
+# file from its context line (e.g. 15, from
+# '@@ -14,28 +15,27 @@ interface nsIScriptGlobalObject').
+#
+# @param aLine The line to check
+#
+# @returns The line number, if one was found in the line;
+#          None, otherwise.
+def extractNewLineNumberFromContext(aLine):
+    match = re.match(r"@@ -[0-9]+(?:,[0-9]+)? \+([0-9]+)", aLine)
+    if match:
+        return int(match.group(1))
+    return None
+
+
 # Extract an interface name, given a line and an optional prefix. An interface
 # is defined in the following manner:
 #
@@ -491,6 +405,18 @@ def isAdditionLine(aLine):
     return True
 
 
+# Detect whether a change line adds or removes a '//' comment.
+#
+# @param aLine A line to check
+#
+# @returns True, if the content of the line starts with '//'; False, otherwise.
+def isLineSingleLineComment(aLine):
+    match = re.search("^[\+\-](\s)*\/\/", aLine)
+    if match:
+        return True
+    return False
+
+
 def isEndOfInterfaceRemoval(aLine):
     if not isRemovalLine(aLine):
         return False
@@ -521,6 +447,25 @@ def isRemovalLine(aLine):
     return True
 
 
+# Detect whether a line of a hunk can only continue the interface it's in,
+# without telling us anything about which interface that is: a changed or
+# unchanged line that isn't a file header, and that mentions neither an IID nor
+# an interface.
+#
+# @param aLine A line to check
+#
+# @returns True, if the line can be skipped while the verdict for the current
+#          interface is decided; False, otherwise.
+def isPlainHunkLine(aLine):
+    if not aLine or aLine[0] not in "+- ":
+        return False
+
+    if aLine.startswith("+++") or aLine.startswith("---"):
+        return False
+
+    return "uuid(" not in aLine and "interface" not in aLine
+
+
 def extractContentFromChangeLine(aLine):
     if not isRemovalLine(aLine) and not isAdditionLine(aLine):
         return None
@@ -531,6 +476,34 @@ def extractContentFromChangeLine(aLine):
     return None
 
 
+# Split diff output into file sections. Each section starts with a line
+# beginning with 'diff ' and runs up to (but not including) the next one. Any
+# lines before the first such line are not part of any section, and are dropped.
+#
+# @param aInputPatch An iterable of the lines of the diff output.
+#
+# @returns A generator of (lineNumber, section) tuples, one per file section,
+#          where section is a list of its lines, and lineNumber is the
+#          (1-based) line number of its first line in aInputPatch.
+def splitPatchIntoFileSections(aInputPatch):
+    section = None
+    lineNumber = 1
+    for line in aInputPatch:
+        if line.startswith("diff "):
+            if section:
+                yield (lineNumber, section)
+                lineNumber = lineNumber + len(section)
+            section = []
+
+        if section is not None:
+            section.append(line)
+        else:
+            lineNumber = lineNumber + 1
+
+    if section:
+        yield (lineNumber, section)
+
+
 def updateFileMetadata(aLine, aPrevLineNumber, aLastLineWasRemoval):
     currentLineNumber = aPrevLineNumber + 1
     isRemoval = False
@@ -547,282 +520,1602 @@ def updateFileMetadata(aLine, aPrevLineNumber, aLastLineWasRemoval):
     return (currentLineNumber, isRemoval)
 
 
-# Parse a given diff output to get data about which interfaces have been changed
-# and whether corresponding IIDs were changed as well.
+# Create the list of IDL descriptors known to affect binary compatibility, which
+# is used by an IIDChecker unless it's given a list of its own.
 #
-# @param aInputPatch A string containing lines of a diff output 'patch' which
-#        needs to be parsed to get the required information.
-# @param aRootPath The path to the root hg repository onto which the patch would
-#        be applied. This is necessary because the comment-checking code needs
-#        to look at actual files, not just the patch file.
+# @returns A new list of IDLDescriptor objects.
+def createDefaultDescriptors():
+    implicitJs = IDLDescriptor("implicit_jscontext", True)
+    nostdcall = IDLDescriptor("nostdcall", True)
+    notxpcom = IDLDescriptor("notxpcom", True)
+    optionalArgc = IDLDescriptor("optional_argc", True)
+    return [implicitJs, nostdcall, notxpcom, optionalArgc]
+
+
+# Describe how one list differs from another, for compareParseResults().
 #
-# @returns A tuple, (interfacesRequiringNewIID, revvedInterfaces,
-#          interfaceNameIDLMap), where interfacesRequiringNewIID is a set of
-#          interface names that require an IID change, revvedInterfaces is a
-#          set of interface names that have already had their IIDs changed, and
-#          interfaceNameIDLMap is a map from interface names to IDL file full
-#          paths.
-def parsePatch(aInputPatch, aRootPath):
-    global gPrinter
-
-    currentIDLFile = None
-    changedIDLFilePaths = []
-    changedIDLFileNames = []
-    revvedInterfaces = []
-    interfacesRequiringNewIID = []
-    interfaceNameIDLMap = {}
-    currentInterfaceName = None
-    previousInterfaceName = None
-    needInterfaceName = False
-    foundIIDChangeLine = False
-    fileWarningsIssued = []
-    interfaceMayBeRemoved = False
-    lastUUIDChangeLineSeen = None
-    currentInterfaceWasRenamed = False
-
-    # Note that this is NOT the line number in the patch file, but rather the line
-    # number where the patch line will take effect for the file in the hg root.
-    currentLineNumber = -1
-    lastLineWasRemoval = False
-
-    # Patch file line numbers. This is mostly for debugging, but is used for a few
-    # other things, as well.
-    lineNo = 0
+# @param aWhat A description of what the lists hold.
+# @param aExpected The expected list.
+# @param aActual The actual list.
+#
+# @returns A string, or None, if the lists are the same.
+def describeListDifference(aWhat, aExpected, aActual):
+    if aExpected == aActual:
+        return None
 
-    for line in aInputPatch:
-        lineNo = lineNo + 1
+    missing = [item for item in aExpected if item not in aActual]
+    unexpected = [item for item in aActual if item not in aExpected]
+    if not missing and not unexpected:
+        return aWhat + " are the same, but in a different order"
+
+    parts = []
+    if missing:
+        parts.append("missing " + ", ".join([str(item) for item in missing]))
+    if unexpected:
+        parts.append("unexpected " + ", ".join([str(item) for item in unexpected]))
+    return aWhat + ": " + "; ".join(parts)
 
-        (currentLineNumber, lastLineWasRemoval) = updateFileMetadata(line, currentLineNumber, lastLineWasRemoval)
 
-        idlStart = isStartOfIDLFile(line)
+# Compare the results of two parses of the same patch (e.g. by parsePatch() and
+# by the VectorizedPatchParser).
+#
+# @param aExpected The tuple returned by the trusted parse.
+# @param aActual The tuple returned by the parse being checked against it.
+#
+# @returns A list of strings describing the differences, which is empty if the
+#          results are the same.
+def compareParseResults(aExpected, aActual):
+    (expectedTable, expectedMissing, expectedChanges) = aExpected
+    (actualTable, actualMissing, actualChanges) = aActual
+
+    comparisons = [
+        ("interfaces seen", [record.getKey() for record in expectedTable.getRecords()], [record.getKey() for record in actualTable.getRecords()]),
+        ("interfaces requiring a new IID", [record.getKey() for record in expectedTable.getRecordsRequiringNewIID()], [record.getKey() for record in actualTable.getRecordsRequiringNewIID()]),
+        ("revved interfaces", [record.getKey() for record in expectedTable.getRevvedRecords()], [record.getKey() for record in actualTable.getRevvedRecords()]),
+        ("missing IDL files", expectedMissing, actualMissing),
+        ("IID changes", expectedChanges, actualChanges),
+    ]
+
+    for expectedRecord in expectedTable.getRecords():
+        actualRecord = actualTable.getRecord(expectedRecord.getIDLFileName(), expectedRecord.getInterfaceName())
+        if actualRecord is not None:
+            what = "lines of '" + str(expectedRecord.getInterfaceName()) + "' in '" + str(expectedRecord.getIDLFileName()) + "'"
+            comparisons.append(("change " + what, expectedRecord.getChangeLines(), actualRecord.getChangeLines()))
+            comparisons.append(("IID change " + what, expectedRecord.getRevLines(), actualRecord.getRevLines()))
+
+    differences = []
+    for (what, expected, actual) in comparisons:
+        difference = describeListDifference(what, expected, actual)
+        if difference:
+            differences.append(difference)
+    return differences
+
+
+# @class IIDCheckResult The outcome of running an IIDChecker over a patch.
+class IIDCheckResult:
+
+    # Create a new IIDCheckResult.
+    #
+    # @param aResultTable An InterfaceResultTable of every interface the patch
+    #        touched.
+    # @param aMissingIDLFiles A list of the names of IDL files that could not be
+    #        found in the repository.
+    # @param aIIDConflicts An optional list of IIDConflict objects for IIDs added
+    #        by the patch that are already in use, or were retired.
+    # @param aUncheckedIDLFiles An optional list of the names of IDL files that
+    #        were not (fully) checked, because the check ran out of time.
+    # @param aDegradedIDLFiles An optional list of the names of IDL files that
+    #        were checked without looking at their contents, because the check
+    #        was short on time.
+    def __init__(self, aResultTable, aMissingIDLFiles, aIIDConflicts=None, aUncheckedIDLFiles=None, aDegradedIDLFiles=None):
+        self.mResultTable = aResultTable
+        self.mMissingIDLFiles = aMissingIDLFiles
+        self.mIIDConflicts = aIIDConflicts or []
+        self.mUncheckedIDLFiles = aUncheckedIDLFiles or []
+        self.mDegradedIDLFiles = aDegradedIDLFiles or []
+
+    # @returns The InterfaceResultTable of every interface the patch touched.
+    def getResultTable(self):
+        return self.mResultTable
+
+    # @returns A list of the InterfaceRecords of interfaces that require an IID
+    #          change, but whose IIDs were not changed. These are the findings of
+    #          the check.
+    def getUnrevvedRecords(self):
+        return self.mResultTable.getUnrevvedRecords()
+
+    # @returns A list of interface names that were changed in a way that requires
+    #          an IID change, whether or not the IID was changed.
+    def getInterfacesRequiringNewIID(self):
+        return self.getInterfaceNames(self.mResultTable.getRecordsRequiringNewIID())
+
+    # @returns A list of interface names whose IIDs were changed.
+    def getRevvedInterfaces(self):
+        return self.getInterfaceNames(self.mResultTable.getRevvedRecords())
+
+    # @returns A list of interface names that require an IID change, but whose
+    #          IIDs were not changed.
+    def getUnrevvedInterfaces(self):
+        return self.getInterfaceNames(self.mResultTable.getUnrevvedRecords())
+
+    def getInterfaceNames(self, aRecords):
+        names = {}
+        for record in aRecords:
+            names[record.getInterfaceName()] = None
+        return list(names)
+
+    # Retrieve the name of the IDL file in which an interface is defined. If
+    # interfaces with the same name were seen in several files, the last of them
+    # is returned; use getResultTable() to tell them apart.
+    #
+    # @param aInterfaceName The name of the interface.
+    #
+    # @returns The IDL file name, or None, if the interface wasn't seen.
+    def getIDLFileName(self, aInterfaceName):
+        records = self.mResultTable.getRecordsForInterface(aInterfaceName)
+        if not records:
+            return None
+        return records[-1].getIDLFileName()
+
+    # @returns A map from interface names to the names of the IDL files in which
+    #          they're defined (see getIDLFileName()).
+    def getInterfaceNameIDLMap(self):
+        interfaceNameIDLMap = {}
+        for record in self.mResultTable.getRecords():
+            interfaceNameIDLMap[record.getInterfaceName()] = record.getIDLFileName()
+        return interfaceNameIDLMap
+
+    # @returns A list of the names of IDL files that could not be found in the
+    #          repository (see IIDChecker.isLineComment).
+    def getMissingIDLFiles(self):
+        return self.mMissingIDLFiles
+
+    # @returns A list of IIDConflict objects, one for each IID added by the patch
+    #          that is already used elsewhere in the repository, or was retired.
+    def getIIDConflicts(self):
+        return self.mIIDConflicts
+
+    # @returns A list of the names of IDL files that were not checked, or only
+    #          partly checked, because the check ran past its deadline. Findings
+    #          in these files may be missing.
+    def getUncheckedIDLFiles(self):
+        return self.mUncheckedIDLFiles
+
+    # @returns A list of the names of IDL files in which comments and interface
+    #          renames were not detected, because the check was short on time.
+    #          Changes to comments in these files may be reported as findings.
+    def getDegradedIDLFiles(self):
+        return self.mDegradedIDLFiles
+
+    # @returns True, if the check ran out of time before checking every IDL file.
+    def isPartial(self):
+        return len(self.mUncheckedIDLFiles) > 0
+
+
+# @class IIDConflict An IID added by a patch that is already in use by another
+#        interface, or that was removed by an earlier patch.
+class IIDConflict:
+
+    # Create a new IIDConflict.
+    #
+    # @param aIID The IID that was added.
+    # @param aInterfaceName The name of the interface to which it was added.
+    # @param aIDLPath The path, relative to the repository root, of the IDL file
+    #        in which the interface is defined.
+    # @param aOwners A list of (relativePath, interfaceName) tuples of the other
+    #        uses of the IID.
+    # @param aWasRetired True, if the IID was retired by an earlier patch.
+    def __init__(self, aIID, aInterfaceName, aIDLPath, aOwners, aWasRetired):
+        self.mIID = aIID
+        self.mInterfaceName = aInterfaceName
+        self.mIDLPath = aIDLPath
+        self.mOwners = aOwners
+        self.mWasRetired = aWasRetired
+
+    def getIID(self):
+        return self.mIID
+
+    def getInterfaceName(self):
+        return self.mInterfaceName
+
+    def getIDLPath(self):
+        return self.mIDLPath
+
+    def getOwners(self):
+        return self.mOwners
+
+    def wasRetired(self):
+        return self.mWasRetired
+
+    # @returns A message describing the conflict, suitable for reporting.
+    def getMessage(self):
+        message = "Interface '" + str(self.mInterfaceName) + "', in file '" + self.mIDLPath + "' uses IID '" + self.mIID + "'"
+        if self.mOwners:
+            users = ["'" + str(interfaceName) + "' in '" + path + "'" for (path, interfaceName) in self.mOwners]
+            message += ", which is also used by " + ", ".join(users)
+        if self.mWasRetired:
+            message += ", which was retired by an earlier change"
+        return message + ". Please generate a new IID."
+
+
+# @class IIDChecker Checks a patch for interfaces that were changed without a
+#        corresponding IID change.
+#
+# An IIDChecker owns all of the state needed to perform a check: its IDL
+# descriptor registry, its cache of special block ranges, the PrettyPrinter it
+# reports through and the FileContentProvider used to read files from the
+# repository. Nothing is shared with other IIDChecker objects unless it's passed
+# in explicitly, so separate checkers can run concurrently on separate threads,
+# and one long-lived checker per repository can keep its caches warm between
+# checks.
+class IIDChecker:
+
+    # Names of the engines with which a checker can parse patches.
+    kLegacyEngine = "legacy"
+    kVectorEngine = "numpy"
+
+    # Fraction of the time budget after which checks stop waiting for IDL files
+    # to be read (see the aTimeBudget argument of the constructor).
+    kDegradeFraction = 0.5
+
+    # Number of patch lines parsed between checks of the deadline.
+    kDeadlineCheckInterval = 64
+
+    # Create a new IIDChecker.
+    #
+    # @param aRootPath The path to the root hg repository onto which patches would
+    #        be applied. Ignored if aContentProvider is given.
+    # @param aPrinter An optional PrettyPrinter through which to report output.
+    #        If not given, a PrettyPrinter without color, debug or verbose output
+    #        is used.
+    # @param aDescriptorList An optional list of IDLDescriptor objects to use in
+    #        place of the list returned by createDefaultDescriptors().
+    # @param aContentProvider An optional FileContentProvider through which to
+    #        read files from the repository.
+    # @param aRangeCache An optional SpecialBlockRangeCache to use. This may be
+    #        shared between checkers working on the same repository, as long as
+    #        they use the same content.
+    # @param aVerdictCache An optional VerdictCache. If given, each IDL file
+    #        section of a patch is checked on its own, and sections whose verdicts
+    #        are already in the cache are not analysed again.
+    # @param aUUIDIndex An optional UUIDIndex of the IIDs in the repository. If
+    #        given, IIDs added by a patch are checked against it.
+    # @param aTimeBudget An optional number of seconds each check may take. Once
+    #        kDegradeFraction of it is used up, lines in IDL files that haven't
+    #        been read yet are assumed not to be comments, and interface
+    #        definitions in them are assumed not to be renames. Once all of it is
+    #        used up, the check stops and reports what it found so far, along
+    #        with the files it didn't check.
+    # @param aMetrics An optional CheckMetrics object, in which the checker
+    #        records what it did and how long it took.
+    # @param aEngine The engine with which to parse patches: kLegacyEngine, for
+    #        parsePatch(), or kVectorEngine, for the NumPy-based
+    #        VectorizedPatchParser. If NumPy isn't available, parsePatch() is
+    #        used.
+    # @param aInterfaceGraph An optional InterfaceGraph of the repository. If
+    #        given, every interface derived (directly or indirectly) from an
+    #        interface requiring a new IID requires a new IID, too.
+    # @param aInterfaceNames An optional list of the names of the interfaces to
+    #        report on. If given, all other interfaces are left out of the
+    #        results.
+    # @param aCheckpointFile An optional CheckpointFile. If given, checks of
+    #        PatchBuffers save their state in it periodically, and resume from
+    #        the state loaded into it, if any. Checks with a VerdictCache don't.
+    # @param aShadow If True, and aEngine isn't kLegacyEngine, patches are parsed
+    #        in shadow mode: by both parsePatch() and aEngine. The results of
+    #        parsePatch() are used, and any differences between the two are
+    #        reported, along with how long each took.
+    # @param aRetireIIDs If True, IIDs removed by a patch are retired in
+    #        aUUIDIndex, so that adding them again is reported. This should only
+    #        be done for patches that are being pushed, since a patch that is
+    #        only checked may never land, or may be backed out and landed again.
+    def __init__(self, aRootPath=None, aPrinter=None, aDescriptorList=None, aContentProvider=None, aRangeCache=None, aVerdictCache=None, aUUIDIndex=None, aTimeBudget=None, aMetrics=None, aEngine=None, aInterfaceGraph=None, aInterfaceNames=None, aCheckpointFile=None, aShadow=False, aRetireIIDs=False):
+        if not aContentProvider:
+            aContentProvider = FileContentProvider(aRootPath)
+
+        if not aPrinter:
+            aPrinter = PrettyPrinter()
+
+        if aDescriptorList is None:
+            aDescriptorList = createDefaultDescriptors()
+
+        if not aRangeCache:
+            aRangeCache = SpecialBlockRangeCache(aContentProvider)
+
+        self.mContentProvider = aContentProvider
+        self.mPrinter = aPrinter
+        self.mDescriptorList = aDescriptorList
+        self.mRangeCache = aRangeCache
+        self.mVerdictCache = aVerdictCache
+        self.mUUIDIndex = aUUIDIndex
+        self.mRetireIIDs = aRetireIIDs
+        self.mInterfaceGraph = aInterfaceGraph
+        self.mInterfaceNames = aInterfaceNames
+        self.mCheckpointFile = aCheckpointFile
+
+        # The callables to which CheckEvents are dispatched (see checkevents).
+        self.mEventListeners = []
+
+        # The offset, in the PatchBuffer being checked, of the file section whose
+        # header was last handed to parsePatch(), or None, if the patch being
+        # checked isn't in a PatchBuffer.
+        self.mSectionOffset = None
+
+        # Where parsePatch() is, as a (lineNo, idlFileName, interfaceName,
+        # interfaceCount) tuple, for progress reports made from another thread
+        # (see progress). It's replaced as a whole, at the start of each file
+        # section and wherever the interface being parsed changes, or None, if
+        # parsePatch() isn't running.
+        self.mParseProgress = None
+        self.mTimeBudget = aTimeBudget
+        self.mMetrics = aMetrics
+        self.startClock()
+
+        self.mVectorParser = None
+        if aEngine == self.kVectorEngine:
+            try:
+                from vectorparse import VectorizedPatchParser
+                self.mVectorParser = VectorizedPatchParser(self)
+            except ImportError:
+                self.mPrinter.warn("NumPy is not available, so patches will be parsed line by line.")
+
+        # In shadow mode, the engine runs in a checker of its own, which shares
+        # this one's files and caches, but reports nothing.
+        self.mShadowChecker = None
+        self.mShadowEngine = None
+        if aShadow and self.mVectorParser is not None:
+            self.mShadowChecker = IIDChecker(aPrinter=PrettyPrinter(aSink=NullSink()), aDescriptorList=aDescriptorList, aContentProvider=aContentProvider, aRangeCache=aRangeCache, aEngine=aEngine)
+            self.mShadowEngine = aEngine
+            self.mVectorParser = None
+        self.resetShadowStatistics()
+
+        # Byte sequences whose presence in the body of a file section means it
+        # must be parsed (see isSectionBodyRelevant()).
+        self.mSectionMarkers = [b"interface", b"uuid(", b"/dev/null"]
+        for descriptor in self.mDescriptorList:
+            self.mSectionMarkers.append(descriptor.getToken().encode('utf-8'))
+
+    # @returns The list of IDLDescriptor objects used by this checker.
+    def getDescriptorList(self):
+        return self.mDescriptorList
+
+    # @returns The path to the root of the repository being checked.
+    def getRootPath(self):
+        return self.mContentProvider.getRootPath()
+
+    # @returns The PrettyPrinter through which this checker reports output.
+    def getPrinter(self):
+        return self.mPrinter
+
+    # @returns The SpecialBlockRangeCache used by this checker.
+    def getRangeCache(self):
+        return self.mRangeCache
+
+    # @returns The VerdictCache used by this checker, or None.
+    def getVerdictCache(self):
+        return self.mVerdictCache
+
+    # @returns The CheckMetrics in which this checker records its work, or None.
+    def getMetrics(self):
+        return self.mMetrics
+
+    # Start timing a phase of a check, if this checker records metrics.
+    def startPhase(self, aPhase):
+        if self.mMetrics is not None:
+            self.mMetrics.startPhase(aPhase)
+
+    # Stop timing a phase of a check, if this checker records metrics.
+    def endPhase(self, aPhase):
+        if self.mMetrics is not None:
+            self.mMetrics.endPhase(aPhase)
+
+    # Add a listener for the CheckEvents dispatched while parsing patches.
+    #
+    # @param aListener A callable taking a single CheckEvent.
+    def addEventListener(self, aListener):
+        self.mEventListeners.append(aListener)
+
+    # Remove a listener added with addEventListener().
+    def removeEventListener(self, aListener):
+        self.mEventListeners.remove(aListener)
+
+    # @returns True, if any listeners were added with addEventListener(), in
+    #          which case the parsers create and dispatch CheckEvents.
+    def hasEventListeners(self):
+        return len(self.mEventListeners) > 0
+
+    # Dispatch a CheckEvent to all listeners.
+    def dispatchEvent(self, aEvent):
+        for listener in self.mEventListeners:
+            listener(aEvent)
+
+    # Find the interface enclosing a given line of an IDL file in the repository.
+    #
+    # This will raise an IOError if aIDLFilePath cannot be read.
+    #
+    # @param aIDLFilePath The full path of the IDL file.
+    # @param aLineNumber The line number (in the file, starting at 1) to look up.
+    #
+    # @returns The InterfaceSpan enclosing the line, or None, if the line is not
+    #          within an interface.
+    def getEnclosingInterface(self, aIDLFilePath, aLineNumber):
+        interfaceIndex = self.mRangeCache.getInterfaceIndexForFilePath(aIDLFilePath, self.mPrinter)
+        return interfaceIndex.getEnclosingInterface(aLineNumber)
+
+    # Create the IIDCheckResult of a check, including the files that the check's
+    # deadline kept from being checked fully.
+    #
+    # @returns A new IIDCheckResult.
+    def createResult(self, aResultTable, aMissingIDLFiles, aIIDChanges):
+        if self.mShadowStatistics['parses']:
+            self.reportShadowStatistics()
+
+        if self.mInterfaceGraph is not None:
+            self.propagateToDescendants(aResultTable)
+
+        if self.mInterfaceNames is not None:
+            aResultTable = aResultTable.selectInterfaces(self.mInterfaceNames)
+
+        result = IIDCheckResult(aResultTable, aMissingIDLFiles,
+                                self.findIIDConflicts(aIIDChanges), list(self.mUncheckedIDLFiles), list(self.mDegradedIDLFiles))
+
+        if self.mMetrics is not None:
+            self.mMetrics.add('interfaces_examined', len(aResultTable))
+            self.mMetrics.add('findings', len(aResultTable.getUnrevvedRecords()), {'kind': 'unrevved'})
+            self.mMetrics.add('findings', len(aResultTable.getRevvedRecords()), {'kind': 'revved'})
+            self.mMetrics.add('findings', len(result.getIIDConflicts()), {'kind': 'iid_conflict'})
+            self.mMetrics.add('findings', len(aMissingIDLFiles), {'kind': 'missing_file'})
+            self.mMetrics.add('findings', len(result.getUncheckedIDLFiles()), {'kind': 'unchecked_file'})
+            self.mMetrics.add('findings', len(result.getDegradedIDLFiles()), {'kind': 'degraded_file'})
+
+        return result
+
+    # Mark every interface derived from an interface requiring a new IID as
+    # requiring one, too, using this checker's InterfaceGraph.
+    #
+    # @param aResultTable The InterfaceResultTable of the check.
+    def propagateToDescendants(self, aResultTable):
+        for record in aResultTable.getRecordsRequiringNewIID():
+            if record.getInterfaceName() is None:
+                continue
 
-        if idlStart:
-            currentIDLFileWasDeleted = False
-            interfaceMayBeRemoved = False
-            currentInterfaceWasRenamed = False
+            for (idlFileName, interfaceName) in self.mInterfaceGraph.getDescendants(record.getIDLFileName(), record.getInterfaceName()):
+                self.mPrinter.debug("Interface '" + interfaceName + "' inherits the changes to '" + record.getInterfaceName() + "'.")
+                aResultTable.markInheritsChange(idlFileName, interfaceName, record.getInterfaceName())
+
+    # Start timing a check against this checker's time budget, and forget the
+    # files left unchecked or degraded by any previous check.
+    def startClock(self):
+        self.mUncheckedIDLFiles = []
+        self.mDegradedIDLFiles = []
+        if self.mTimeBudget is None:
+            self.mDeadline = None
+            self.mDegradeTime = None
+            return
+
+        now = time.monotonic()
+        self.mDeadline = now + self.mTimeBudget
+        self.mDegradeTime = now + self.mTimeBudget * self.kDegradeFraction
+
+    # @returns True, if the current check has run past its deadline, and should
+    #          stop; False, otherwise, or if there is no deadline.
+    def isPastDeadline(self):
+        return self.mDeadline is not None and time.monotonic() >= self.mDeadline
+
+    # @returns True, if the current check has used up enough of its time budget
+    #          that it should no longer wait for IDL files to be read and
+    #          scanned; False, otherwise, or if there is no deadline.
+    def isDegraded(self):
+        return self.mDegradeTime is not None and time.monotonic() >= self.mDegradeTime
+
+    # Record that an IDL file was not (fully) checked, because the current check
+    # ran past its deadline.
+    def markIDLFileUnchecked(self, aIDLFileName):
+        if aIDLFileName and aIDLFileName not in self.mUncheckedIDLFiles:
+            self.mUncheckedIDLFiles.append(aIDLFileName)
+
+    # Record that an IDL file was checked without waiting for its comment ranges
+    # or interface index, because the current check was short on time.
+    def markIDLFileDegraded(self, aIDLFilePath):
+        idlFileName = os.path.basename(aIDLFilePath)
+        if idlFileName not in self.mDegradedIDLFiles:
+            self.mDegradedIDLFiles.append(idlFileName)
+
+    # Determine whether a lookup in an IDL file should be answered
+    # conservatively rather than waiting for the file to be read and scanned.
+    #
+    # Without a time budget, lookups always wait. With one, a file that hasn't
+    # been scanned yet is only waited for until kDegradeFraction of the budget
+    # is used up. If it still isn't ready, it's recorded as degraded.
+    #
+    # @param aIDLFilePath The full path of the IDL file.
+    #
+    # @returns True, if the caller should not look inside the file.
+    def shouldSkipFileLookup(self, aIDLFilePath):
+        if self.mDegradeTime is None or self.mRangeCache.isFileScanned(aIDLFilePath):
+            return False
 
-        if isAdditionLine(line):
-            interfaceMayBeRemoved = False
+        self.mRangeCache.prefetchRangesForFilePath(aIDLFilePath, self.mPrinter)
+        if self.mRangeCache.waitForFileScan(aIDLFilePath, self.mDegradeTime - time.monotonic()):
+            return False
 
-        if not currentInterfaceName:
-            needInterfaceName = True
+        self.markIDLFileDegraded(aIDLFilePath)
+        return True
 
-        if doesLineSignifyDeletion(line):
-            gPrinter.debug("Current idl file: " + str(currentIDLFile) + " was deleted.")
-            currentIDLFileWasDeleted = True
+    # Check a patch for interfaces that were changed without a corresponding IID
+    # change.
+    #
+    # @param aPatchStream A file object (or any iterable of lines) or PatchBuffer
+    #        containing the diff output to check.
+    #
+    # @returns An IIDCheckResult describing the outcome of the check.
+    def check(self, aPatchStream):
+        self.startClock()
+
+        self.mSectionOffset = None
+        if isinstance(aPatchStream, PatchBuffer):
+            return self.checkBuffer(aPatchStream)
+
+        if self.mVerdictCache is not None:
+            return self.checkWithVerdictCache(aPatchStream)
+
+        # prefetching stage
+        self.startPhase('prefetch')
+        self.prefetchIDLFilesInPatch(aPatchStream)
+        self.endPhase('prefetch')
+
+        # parsing stage
+        self.startPhase('parse')
+        (resultTable, missingIDLFiles, iidChanges) = self.parse(aPatchStream)
+        self.endPhase('parse')
+
+        return self.createResult(resultTable, missingIDLFiles, iidChanges)
+
+    # Check a patch held in a PatchBuffer. Only the header lines of the patch are
+    # decoded to find the IDL files to prefetch, and the bodies of file sections
+    # that can't affect the outcome are never decoded at all.
+    #
+    # @param aPatchBuffer The PatchBuffer containing the diff output to check.
+    #
+    # @returns An IIDCheckResult describing the outcome of the check.
+    def checkBuffer(self, aPatchBuffer):
+        if self.mMetrics is not None:
+            self.mMetrics.add('patch_bytes', len(aPatchBuffer))
+
+        resumeState = None
+        if self.mCheckpointFile is not None and self.mVerdictCache is None:
+            resumeState = self.findResumeState(aPatchBuffer)
+
+        startOffset = 0
+        if resumeState is not None:
+            startOffset = resumeState['offset']
+            self.mPrinter.debug("Resuming from byte " + str(startOffset) + " of the patch.")
+
+        self.startPhase('prefetch')
+        for (start, headerEnd, end) in aPatchBuffer.iterSections():
+            if start < startOffset:
+                continue
+            header = decodePatchLine(aPatchBuffer.getBytes(start, headerEnd))
+            if header.startswith("diff --git"):
+                self.mRangeCache.prefetchRangesForFilePath(extractIDLFilePath(header, self.getRootPath()), self.mPrinter)
+        self.endPhase('prefetch')
+
+        skippedLines = collections.deque()
+        patchLines = self.iterBufferLines(aPatchBuffer, startOffset, skippedLines)
+        if self.mVerdictCache is not None:
+            return self.checkWithVerdictCache(patchLines, skippedLines)
+
+        self.startPhase('parse')
+        (resultTable, missingIDLFiles, iidChanges) = self.parse(patchLines, resumeState, skippedLines)
+        self.endPhase('parse')
+
+        return self.createResult(resultTable, missingIDLFiles, iidChanges)
+
+    # Decode the lines of a PatchBuffer that parsePatch() needs to see.
+    #
+    # Every line is decoded, except for the bodies of file sections for which
+    # isSectionBodyRelevant() is False. Only their header lines are returned,
+    # which leaves parsePatch() in exactly the same state as if the whole
+    # section had been parsed.
+    #
+    # @param aPatchBuffer The PatchBuffer containing the diff output.
+    # @param aStartOffset The offset of the file section at which to start.
+    # @param aSkippedLines An optional deque to which to append an (index,
+    #        lineCount) tuple for each body that is skipped, where index is the
+    #        index, among the lines returned, of the line after it. Passed on to
+    #        parsePatch(), it keeps the line numbers of the patch right.
+    #
+    # @returns A generator of strings, one per line.
+    def iterBufferLines(self, aPatchBuffer, aStartOffset=0, aSkippedLines=None):
+        lineCount = 0
+        for (start, headerEnd, end) in aPatchBuffer.iterSections():
+            if start < aStartOffset:
+                continue
 
-        if currentIDLFileWasDeleted:
-            # If the file in question has been removed, then we don't really care
-            # about it any longer, so just go ahead to the next one.
-            continue
+            if headerEnd == start:
+                for line in aPatchBuffer.decodeLines(start, end):
+                    yield line
+                lineCount = lineCount + aPatchBuffer.countLines(start, end)
+                continue
 
-        if isLineChange(line):
-            # If this line has no content, or the content is just spaces, then
-            # simply skip this line.
-            content = extractContentFromChangeLine(line)
-            content = content.rstrip()
-            if len(content) == 0:
+            header = decodePatchLine(aPatchBuffer.getBytes(start, headerEnd))
+            self.mSectionOffset = start
+            lineCount = lineCount + 1
+            yield header
 
-                gPrinter.debug("Line " + str(lineNo) + " was detected to be empty. Continuing.")
+            if self.isSectionBodyRelevant(header, aPatchBuffer, headerEnd, end):
+                for line in aPatchBuffer.decodeLines(headerEnd, end):
+                    yield line
+                lineCount = lineCount + aPatchBuffer.countLines(headerEnd, end)
                 continue
 
-        # if the line is the start of a non-idl file
-        if isLineStartOfNewFile(line) and not idlStart:
-            gPrinter.debug("Line number " + str(lineNo) + " is start of new file.")
-            lastUUIDChangeLineSeen = None
-            currentInterfaceWasRenamed = False
+            if self.mMetrics is not None:
+                self.mMetrics.add('skipped_sections')
+            if aSkippedLines is not None and end > headerEnd:
+                aSkippedLines.append((lineCount, aPatchBuffer.countLines(headerEnd, end)))
+
+    # Find the state from which a check of a PatchBuffer should resume, as
+    # loaded into this checker's CheckpointFile.
+    #
+    # @param aPatchBuffer The PatchBuffer containing the diff output.
+    #
+    # @returns The state, or None, if the check should start from the beginning.
+    def findResumeState(self, aPatchBuffer):
+        resumeState = self.mCheckpointFile.getResumeState()
+        if resumeState is None:
+            return None
+
+        # make sure the checkpoint was taken while checking this patch
+        offset = resumeState['offset']
+        header = None
+        if offset < len(aPatchBuffer):
+            header = decodePatchLine(aPatchBuffer.getBytes(offset, aPatchBuffer.findEndOfLine(offset, len(aPatchBuffer))))
+
+        if header != resumeState['header']:
+            self.mPrinter.warn("The checkpoint in '" + self.mCheckpointFile.getPath() + "' was taken while checking a different patch. Checking from the beginning.")
+            return None
+
+        return resumeState
+
+    # Determine whether the body of a file section could affect the outcome of
+    # parsePatch().
+    #
+    # The header of a file section that isn't an IDL file resets the interface
+    # being tracked, and nothing in the body can set it again unless it mentions
+    # 'interface', adds or removes a uuid(...), deletes the file or uses one of
+    # this checker's descriptors. Those are searched for in the raw bytes.
+    #
+    # @param aHeaderLine The decoded header line of the section.
+    # @param aPatchBuffer The PatchBuffer containing the section.
+    # @param aStart The offset at which the body of the section starts.
+    # @param aEnd The offset at which the section ends.
+    #
+    # @returns False, if the body can be skipped; True, otherwise.
+    def isSectionBodyRelevant(self, aHeaderLine, aPatchBuffer, aStart, aEnd):
+        if isStartOfIDLFile(aHeaderLine) or not isLineStartOfNewFile(aHeaderLine):
+            return True
 
-            # clear our current interface name
-            previousInterfaceName = currentInterfaceName
-            currentInterfaceName = None
+        for marker in self.mSectionMarkers:
+            if aPatchBuffer.find(marker, aStart, aEnd) != -1:
+                return True
 
-        if (idlStart):
-            gPrinter.debug("Line number " + str(lineNo) + " is start of IDL file.")
+        return False
 
-            lastUUIDChangeLineSeen = None
+    # Check a patch one file section at a time, answering sections that have
+    # been seen before from this checker's VerdictCache.
+    #
+    # Unlike check(), no parser state is carried from one file section to the
+    # next, so that each section's verdict depends only on the section itself,
+    # the contents of its file and the descriptor configuration.
+    #
+    # Each IDL file is read in full and hashed, to look its sections up, which
+    # counts against the deadline: it's checked before each file is hashed, and
+    # again by parsePatch() for sections that weren't in the cache. Hashing a
+    # file isn't interrupted, though, so the deadline can be overrun by the
+    # time it takes to read one file.
+    #
+    # @param aPatchStream A file object (or any iterable of lines) containing the
+    #        diff output to check.
+    # @param aSkippedLines An optional deque of the lines left out of
+    #        aPatchStream (see parsePatch()).
+    #
+    # @returns An IIDCheckResult describing the outcome of the check.
+    def checkWithVerdictCache(self, aPatchStream, aSkippedLines=None):
+        from verdictcache import createVerdictKey, hashFileContents
+
+        resultTable = InterfaceResultTable()
+        missingIDLFiles = []
+        iidChanges = []
+
+        # the number of lines left out of aPatchStream before the section
+        skippedLineCount = 0
+
+        self.startPhase('parse')
+        for (lineNumber, section) in splitPatchIntoFileSections(aPatchStream):
+            while aSkippedLines and aSkippedLines[0][0] < lineNumber:
+                skippedLineCount = skippedLineCount + aSkippedLines.popleft()[1]
+
+            idlPath = extractIDLFilePath(section[0], self.getRootPath())
+            if idlPath and self.isPastDeadline():
+                self.markIDLFileUnchecked(extractIDLFileName(section[0]))
+                continue
 
-            # pop last idl file, if there was one
-            currentIDLFile = extractIDLFileName(line)
-            currentIDLPath = extractIDLFilePath(line, aRootPath)
+            if not idlPath:
+                continue
 
-            # push idl file path onto changed idl list
-            if currentIDLPath not in changedIDLFilePaths:
-                changedIDLFilePaths.append(currentIDLPath)
+            try:
+                idlFile = self.mContentProvider.openFile(idlPath)
+                fileIdentity = hashFileContents(idlFile)
+                idlFile.close()
+            except:
+                fileIdentity = None
+
+            key = createVerdictKey(section, fileIdentity, self.mDescriptorList)
+            verdict = self.mVerdictCache.get(key)
+
+            if verdict is None:
+                # the section is parsed on its own, but its lines are numbered as
+                # in the whole patch
+                sectionSkippedLines = collections.deque([(0, lineNumber - 1 + skippedLineCount)])
+                (sectionTable, sectionMissing, sectionIIDChanges) = self.parse(section, None, sectionSkippedLines)
+
+                # IDL paths are stored relative to the root, since the key
+                # doesn't depend on it, and the same cache may be used from
+                # different checkouts
+                verdict = {'interfaces': sectionTable.toList(),
+                           'missingFiles': sectionMissing,
+                           'iidChanges': [(kind, iid, interfaceName, os.path.relpath(iidPath, self.getRootPath()))
+                                          for (kind, iid, interfaceName, iidPath) in sectionIIDChanges]}
+
+                # a verdict reached in a hurry isn't necessarily the right one
+                idlFileName = extractIDLFileName(section[0])
+                if idlFileName not in self.mUncheckedIDLFiles and idlFileName not in self.mDegradedIDLFiles:
+                    self.mVerdictCache.put(key, verdict)
+            else:
+                self.mPrinter.debug("Verdict for section '" + section[0].rstrip() + "' found in cache.")
+                for fileName in verdict['missingFiles']:
+                    self.warnMissingIDLFile(fileName)
 
-            if currentIDLFile not in changedIDLFileNames:
-                changedIDLFileNames.append(currentIDLFile)
+            resultTable.update(InterfaceResultTable.fromList(verdict['interfaces']))
 
-            # now that we're in a new file, we need to make sure that we detect the
-            # proper interface again
+            for fileName in verdict['missingFiles']:
+                if fileName not in missingIDLFiles:
+                    missingIDLFiles.append(fileName)
 
-            gPrinter.debug("Interface name WAS: " + str(currentInterfaceName))
+            for (kind, iid, interfaceName, relativePath) in verdict['iidChanges']:
+                iidChanges.append((kind, iid, interfaceName, os.path.join(self.getRootPath(), relativePath)))
 
-            needInterfaceName = True
-            previousInterfaceName = currentInterfaceName
-            currentInterfaceName = None
-            foundIIDChangeLine = False
+        self.endPhase('parse')
 
-            gPrinter.debug("Interface now is: " + str(currentInterfaceName))
+        self.mVerdictCache.save()
 
-        if isLineIIDAddition(line):
-            # We'll need to put the interface name (as we haven't seen it yet)
-            # into the currentInterface variable
-            needInterfaceName = True
-            previousInterfaceName = currentInterfaceName
-            currentInterfaceName = None
-            foundIIDChangeLine = True
-        elif isLineIIDDefinition(line):
-            if isRemovalLine(line):
-                interfaceMayBeRemoved = True
-            needInterfaceName = True
-            previousInterfaceName = currentInterfaceName
-            currentInterfaceName = None
-            foundIIDChangeLine = False
+        return self.createResult(resultTable, missingIDLFiles, iidChanges)
 
-        # if we need an interface name, and this happens to be the line
-        # that defines the interface
-        if needInterfaceName and isInterfaceDefinitionLine(line):
+    # Check the IIDs added by a patch against this checker's UUIDIndex, and
+    # retire the IIDs the patch removed, if this checker was asked to.
+    #
+    # @param aIIDChanges The list of IID changes returned by parsePatch().
+    #
+    # @returns A list of IIDConflict objects, which is empty if this checker has
+    #          no UUIDIndex.
+    def findIIDConflicts(self, aIIDChanges):
+        if self.mUUIDIndex is None:
+            return []
 
-            gPrinter.debug("Line number " + str(lineNo) + " is interface definition line and we need one.")
+        conflicts = []
+        addedIIDs = []
+        for (kind, iid, interfaceName, idlPath) in aIIDChanges:
+            if kind != '+' or not iid:
+                continue
 
-            # extract the interface name
-            currentInterfaceName = extractInterfaceNameFromDefinitionLine(line)
+            addedIIDs.append(normalizeIID(iid))
+            relativePath = os.path.relpath(idlPath, self.getRootPath())
+            owners = self.mUUIDIndex.getConflictingOwners(iid, relativePath, interfaceName)
+            wasRetired = self.mUUIDIndex.isRetired(iid)
+            if owners or wasRetired:
+                conflicts.append(IIDConflict(iid, interfaceName, relativePath, owners, wasRetired))
+
+        if not self.mRetireIIDs:
+            return conflicts
+
+        for (kind, iid, interfaceName, idlPath) in aIIDChanges:
+            if kind == '-' and iid and normalizeIID(iid) not in addedIIDs:
+                self.mUUIDIndex.retire(iid)
+
+        return conflicts
+
+    # Report that an IDL file touched by a patch could not be found in the
+    # repository.
+    #
+    # @param aIDLFileName The name of the IDL file.
+    def warnMissingIDLFile(self, aIDLFileName):
+        self.mPrinter.warn("'" + str(aIDLFileName) + "' was not found in local repository. Are you sure your repository is at the correct revision?")
+
+    # Quickly scan the 'diff --git' headers of a patch file and start prefetching the
+    # special block ranges of every IDL file it touches, so that file reads overlap
+    # with parsing of the patch. Inputs that can't be rewound (e.g. stdin) are left
+    # alone; parsePatch() still prefetches each file as it reaches its header.
+    #
+    # @param aInputPatch A file object containing the diff output to be parsed.
+    def prefetchIDLFilesInPatch(self, aInputPatch):
+        try:
+            if not aInputPatch.seekable():
+                return
+            startPosition = aInputPatch.tell()
+        except:
+            return
+
+        for line in aInputPatch:
+            if line.startswith("diff --git"):
+                self.mRangeCache.prefetchRangesForFilePath(extractIDLFilePath(line, self.getRootPath()), self.mPrinter)
+
+        aInputPatch.seek(startPosition)
+
+    # Detect whether or not a line is the addition of a new interface, based on
+    # data collected from the line, the current interface (if one has been seen)
+    # and the IDL file of which the interface is a part.
+    #
+    # @param aLine The line to check. This line must represent an interface
+    #        definition line for this method to return true.
+    # @param aCurrentInterface The name of the interface currently being processed.
+    #        Can be None, but this will automatically result in a return value of
+    #        False.
+    # @param aIDLFilePath The path on the filesystem to the IDL file where
+    #        aCurrentInterface is defined. If this is None, then this method will
+    #        return False.
+    # @param aLineRange A tuple containing the start and end lines (the range) from
+    #        which we last saw the removal of the IID and interface. Can be None,
+    #        but this will result in searching the entire IDL file for the given
+    #        interface name.
+    #
+    # The old name is looked up in the InterfaceSpanIndex built while scanning
+    # the file for special blocks, so the file's text isn't read again.
+    #
+    # @returns True, if the line represents a new interface that was renamed from
+    #          aCurrentInterface; False otherwise.
+    def isLineInterfaceRename(self, aLine, aCurrentInterface, aIDLFilePath, aLineRange=None):
+        if not aIDLFilePath:
+            self.mPrinter.debug("isLineInterfaceRename: Path nonexistent: " + str(aIDLFilePath))
+            return False
 
-            gPrinter.debug("(Line " + str(lineNo) + "): Current interface name is now: " + str(currentInterfaceName))
+        if not aCurrentInterface:
+            self.mPrinter.debug("isLineInterfaceRename: current interface is not set!")
+            return False
 
-            # push interface name onto revved interface list (for the previous step)
-            if foundIIDChangeLine:
-                gPrinter.debug("Appending " + str(currentInterfaceName) + " to revvedInterfaces")
+        if not isInterfaceDefinitionLine(aLine, self.mPrinter):
+            self.mPrinter.debug("isLineInterfaceRename: aLine is not interface definition line")
+            return False
 
-                revvedInterfaces.append(currentInterfaceName)
-                foundIIDChangeLine = False
+        # If this line is an interface definition line, and a current interface is
+        # specified, then look at the IDL file at the given lines, and see if they
+        # still contain the old interface name. If
+        # we're short on time and the file hasn't been read yet, assume it's not a
+        # rename, so the interface's changes are still reported.
+        if self.shouldSkipFileLookup(aIDLFilePath):
+            return False
 
-            # indicate that we no longer need an interface name
-            needInterfaceName = False
+        try:
+            interfaceIndex = self.mRangeCache.getInterfaceIndexForFilePath(aIDLFilePath, self.mPrinter)
+        except:
+            # We had trouble opening the file, so just return a false value so we report
+            # the error.
+            self.mPrinter.debug("isLineInterfaceRename: could not open file path: '" + aIDLFilePath + "'")
+            return False
 
-            # add mapping from interface name to idl file
-            interfaceNameIDLMap[currentInterfaceName] = currentIDLFile
+        lineCount = interfaceIndex.getLineCount()
 
-        # if we didn't need an interface name, but this still happens to be an
-        # interface definition line, then we might be in a situation where the
-        # interface was renamed.
-        if not needInterfaceName and isInterfaceDefinitionLine(line):
-            gPrinter.debug("We apparently don't need an interface name, but line: " + str(lineNo) + " was detected to be an interface definition line.")
-            if isLineInterfaceRename(line, previousInterfaceName, currentIDLPath, (lastUUIDChangeLineSeen, currentLineNumber + 1)):
-                gPrinter.debug("'" + str(currentInterfaceName) + "' was renamed!")
-                currentInterfaceWasRenamed = True
+        if not aLineRange:
+            start = 0
+            end = lineCount
+        else:
+            (start, end) = aLineRange
+
+        if not start:
+            start = 0
 
-        # if this is a context line, then let's extract the line number from it
-        if isContextLine(line):
+        if not end or end > lineCount:
+            end = lineCount
 
-            gPrinter.debug("Line number " + str(lineNo) + " is context line.")
+        self.mPrinter.debug("start is: " + str(start) + ", end is: " + str(end))
 
-            currentLineNumber = extractLineNumberFromContext(line)
+        if interfaceIndex.isNameMentionedInLines(str(aCurrentInterface), start, end):
+            self.mPrinter.debug("isLineInterfaceRename: found '" + str(aCurrentInterface) + "' in specified lines!")
+            return False
 
-            # modify our current interface to match the one in the context, but only
-            # if it's also an interface context line
-            if isInterfaceContextLine(line):
-                currentInterfaceName = extractInterfaceNameFromContextLine(line)
+        return True
 
-                gPrinter.debug("Current interface is now: " + str(currentInterfaceName))
+    # Determine whether or not this line represents the addition or removal of a
+    # comment. This is a non-functional change, and IIDs should not be incremented
+    # if the only changes to a file are non-functional changes.
+    #
+    # @param aLine The line to check
+    # @param aLineNumber The line number (in the original file, NOT in the diff
+    #        output) where this line will take effect.
+    # @param aFilePath The path to the IDL file that this line is changing.
+    #
+    # @returns True, if aLine indicates a comment (block or single-line);
+    #          False, otherwise.
+    def isLineComment(self, aLine, aLineNumber, aFilePath):
+        if not isLineChange(aLine):
+            return False
 
-                # add mapping from interface name to idl file
-                interfaceNameIDLMap[currentInterfaceName] = currentIDLFile
+        # To determine this, we check to see if the line starts with '//'
+        if isLineSingleLineComment(aLine):
+            return True
 
-        # Each of these operations is assigned into a variable for clarity when
-        # reading the if statement.
-        iidRemoval = isLineIIDRemoval(line)
+        # or is contained within a block comment for a given file. If we're short
+        # on time and the file hasn't been read yet, err on the side of caution
+        # and assume it's not.
+        if self.shouldSkipFileLookup(aFilePath):
+            return False
 
-        if iidRemoval:
-            lastUUIDChangeLineSeen = currentLineNumber
+        lineStates = self.mRangeCache.getLineStatesForFilePath(aFilePath, self.mPrinter)
+        if lineStates.isSpecialLine(aLineNumber):
+            self.mPrinter.debug("Line " + str(aLineNumber) + ": Within a block comment or C++ block.")
+            return True
 
-        shouldIssueWarning = False
+        return False
 
+    # Determine whether a changed line of an IDL file is a comment, reporting the
+    # file as missing (once per check) if it can't be read.
+    #
+    # @param aLookup A (line, lineNumber) tuple, of the line and its line number
+    #        in the file.
+    # @param aIDLFileName The name of the IDL file.
+    # @param aIDLFilePath The full path of the IDL file.
+    # @param aMissingIDLFiles The list of names of missing IDL files, to which
+    #        the file is appended if it's missing.
+    # @param aWarnedIDLFiles The set of names of IDL files that were already
+    #        reported missing.
+    #
+    # @returns True, if the line is a comment; False, if it's not, or if the file
+    #          couldn't be read.
+    def lookUpIDLFile(self, aLookup, aIDLFileName, aIDLFilePath, aMissingIDLFiles, aWarnedIDLFiles):
+        (line, lineNumber) = aLookup
         try:
-            cmt = isLineComment(line, currentLineNumber, currentIDLPath)
+            return self.isLineComment(line, lineNumber, aIDLFilePath)
         except:
             # In this case, the file on which we wanted to run was not found, so just
             # assume it's not a comment.
-            cmt = False
-            shouldIssueWarning = True
+            if aIDLFileName not in aWarnedIDLFiles:
+                aWarnedIDLFiles.add(aIDLFileName)
+                aMissingIDLFiles.append(aIDLFileName)
+                self.warnMissingIDLFile(aIDLFileName)
+            return False
 
-        constEx = isLineConstantExpression(line)
-        change = isLineChange(line)
-        binaryCompat = IDLDescriptor.areDescriptorsInLineAffectingBinaryCompat(line, gPrinter)
-        descr = IDLDescriptor.hasDescriptorsInLine(line, gPrinter)
+    # Parse a patch with this checker's engine, or in shadow mode. The vectorized
+    # engine can't stop part way through a patch, so checks with a deadline or
+    # checkpoints always use parsePatch() alone.
+    #
+    # @param aInputPatch An iterable of the lines of the diff output.
+    # @param aResumeState An optional checkpointed state from which to resume
+    #        (see parsePatch()).
+    # @param aSkippedLines An optional deque of the lines left out of aInputPatch
+    #        (see parsePatch()).
+    #
+    # @returns The tuple returned by parsePatch().
+    def parse(self, aInputPatch, aResumeState=None, aSkippedLines=None):
+        if self.mDeadline is None and self.mCheckpointFile is None:
+            if self.mVectorParser is not None:
+                return self.mVectorParser.parsePatch(aInputPatch, aSkippedLines)
+            if self.mShadowChecker is not None:
+                return self.parseInShadowMode(aInputPatch, aSkippedLines)
+        return self.parsePatch(aInputPatch, aResumeState, aSkippedLines)
+
+    # Parse a patch with both the shadow checker's engine and parsePatch(), and
+    # warn about any differences between their results. The engine goes first,
+    # so that it's the one that pays for reading the IDL files, and the speedup
+    # measured is, if anything, too low.
+    #
+    # @param aInputPatch An iterable of the lines of the diff output.
+    # @param aSkippedLines An optional deque of the lines left out of aInputPatch
+    #        (see parsePatch()).
+    #
+    # @returns The tuple returned by parsePatch().
+    def parseInShadowMode(self, aInputPatch, aSkippedLines=None):
+        lines = list(aInputPatch)
+        skippedLines = list(aSkippedLines or [])
+
+        startTime = time.monotonic()
+        engineResults = self.mShadowChecker.parse(lines, None, collections.deque(skippedLines))
+        engineTime = time.monotonic()
+        results = self.parsePatch(lines, None, collections.deque(skippedLines))
+        endTime = time.monotonic()
+
+        differences = compareParseResults(results, engineResults)
+        for difference in differences:
+            self.mPrinter.warn("The " + self.mShadowEngine + " engine's results differ from parsePatch()'s: " + difference)
+
+        self.mShadowStatistics['parses'] += 1
+        self.mShadowStatistics['differingParses'] += 1 if differences else 0
+        self.mShadowStatistics['engineSeconds'] += engineTime - startTime
+        self.mShadowStatistics['legacySeconds'] += endTime - engineTime
+        return results
+
+    # Forget the parses counted by parseInShadowMode().
+    def resetShadowStatistics(self):
+        self.mShadowStatistics = {'parses': 0, 'differingParses': 0, 'engineSeconds': 0.0, 'legacySeconds': 0.0}
+
+    # Report how the shadow checker's engine compared with parsePatch() over
+    # the parses since the last report, and record it in this checker's
+    # metrics.
+    def reportShadowStatistics(self):
+        statistics = self.mShadowStatistics
+        engineSeconds = statistics['engineSeconds']
+        legacySeconds = statistics['legacySeconds']
+
+        message = "Shadow mode: the " + self.mShadowEngine + " engine took " + ("%.3f" % engineSeconds) + "s, and parsePatch() took " + ("%.3f" % legacySeconds) + "s"
+        if engineSeconds > 0:
+            message += " (a speedup of " + ("%.2f" % (legacySeconds / engineSeconds)) + "x)"
+        message += ". " + str(statistics['differingParses']) + " of " + str(statistics['parses']) + " parses differed."
+        self.mPrinter.info(message)
+
+        if self.mMetrics is not None:
+            self.mMetrics.add('shadow_parse_seconds', engineSeconds, {'engine': self.mShadowEngine})
+            self.mMetrics.add('shadow_parse_seconds', legacySeconds, {'engine': self.kLegacyEngine})
+            self.mMetrics.add('shadow_differing_parses', statistics['differingParses'])
+
+        self.resetShadowStatistics()
+
+    # Parse a given diff output to get data about which interfaces have been changed
+    # and whether corresponding IIDs were changed as well.
+    #
+    # If this checker has a CheckpointFile, and the lines come from a PatchBuffer
+    # (see iterBufferLines()), the state of the parse is saved in it at the start
+    # of IDL file sections, every so often.
+    #
+    # @param aInputPatch A string containing lines of a diff output 'patch' which
+    #        needs to be parsed to get the required information.
+    # @param aResumeState An optional state saved in a CheckpointFile, from which
+    #        to resume. aInputPatch must then start at the file section at which
+    #        the state was saved.
+    # @param aSkippedLines An optional deque of (index, lineCount) tuples, for
+    #        runs of lines of the patch that aInputPatch leaves out (see
+    #        iterBufferLines()), where index is the index, in aInputPatch, of the
+    #        line after them. They're only counted, so that lineNo stays the line
+    #        number in the patch. The deque is emptied as they're passed, and may
+    #        be appended to while aInputPatch is being iterated over.
+    #
+    # @returns A tuple, (resultTable, missingIDLFiles, iidChanges), where
+    #          resultTable is an InterfaceResultTable of every interface seen,
+    #          missingIDLFiles is a list of the names of IDL files that could not
+    #          be found in the repository, and iidChanges is a list of (kind, iid,
+    #          interfaceName, idlPath) tuples for every IID added ('+') or removed
+    #          ('-') by the patch.
+    def parsePatch(self, aInputPatch, aResumeState=None, aSkippedLines=None):
+        currentIDLFile = None
+        currentIDLPath = None
+        currentIDLFileWasDeleted = False
+        resultTable = InterfaceResultTable()
+        currentInterfaceName = None
+        previousInterfaceName = None
+        needInterfaceName = False
+        foundIIDChangeLine = False
+        addedIID = None
+        iidChanges = []
+        fileWarningsIssued = set()
+        missingIDLFiles = []
+        interfaceMayBeRemoved = False
+        lastUUIDChangeLineSeen = None
+        currentInterfaceWasRenamed = False
+
+        # The first changed line of the current IDL file for which the file would
+        # have to be read to tell whether it's a comment, as a (line, lineNumber)
+        # tuple, if the file hasn't been read for any line yet. If it never is,
+        # it's read for this line at the end of the file's section, just to find
+        # out whether it exists.
+        pendingFileLookup = None
+        currentIDLFileWasLookedUp = False
+
+        # Whether the current interface's verdict is decided (see
+        # InterfaceResultTable.isDecided()), so that the plain lines of the rest of
+        # its hunks can be skipped.
+        currentInterfaceIsDecided = False
+        decidedLineCount = 0
+
+        # CheckEvents are only created if someone's listening. The IDL file whose
+        # section is open is tracked for SectionFinishedEvents.
+        listeners = self.mEventListeners
+        openSectionIDLFile = None
+
+        # Note that this is NOT the line number in the patch file, but rather the line
+        # number where the patch line will take effect for the file in the hg root.
+        currentLineNumber = -1
+        lastLineWasRemoval = False
+
+        # Patch file line numbers. This is mostly for debugging, but is used for a few
+        # other things, as well.
+        lineNo = 0
+        idlSectionCount = 0
+
+        if aResumeState is not None:
+            resultTable = InterfaceResultTable.fromList(aResumeState['interfaces'])
+            missingIDLFiles = list(aResumeState['missingFiles'])
+            fileWarningsIssued = set(missingIDLFiles)
+            iidChanges = [tuple(iidChange) for iidChange in aResumeState['iidChanges']]
+            currentInterfaceName = aResumeState['interfaceName']
+            currentLineNumber = aResumeState['lineNumber']
+            lineNo = aResumeState['lineNo']
+            idlSectionCount = aResumeState['idlSectionCount']
+            decidedLineCount = aResumeState['decidedLineCount']
+
+            # repeat the warnings given before the check was interrupted
+            for fileName in missingIDLFiles:
+                self.warnMissingIDLFile(fileName)
+
+        # The runs of lines left out of the input, and the line number the
+        # first line of the input would have if there were none before the line
+        # being parsed, which gives the index of the line in the input.
+        skippedLines = aSkippedLines if aSkippedLines is not None else ()
+        firstLineNo = lineNo + 1
+
+        # The IDL file whose section is being parsed, or None, in the section of
+        # any other file.
+        sectionIDLFile = None
+        self.mParseProgress = (lineNo, sectionIDLFile, currentInterfaceName, len(resultTable))
+
+        # debug messages are only built when they're printed, since this loop
+        # runs for every line of the patch
+        debugEnabled = self.mPrinter.isDebugEnabled()
+
+        patchLines = iter(aInputPatch)
+        for line in patchLines:
+            lineNo = lineNo + 1
+
+            if skippedLines and skippedLines[0][0] == lineNo - firstLineNo:
+                lineCount = skippedLines.popleft()[1]
+                lineNo = lineNo + lineCount
+                firstLineNo = firstLineNo + lineCount
+
+            if line.startswith("diff "):
+                sectionIDLFile = extractIDLFileName(line)
+                self.mParseProgress = (lineNo, sectionIDLFile, None, len(resultTable))
+
+            (currentLineNumber, lastLineWasRemoval) = updateFileMetadata(line, currentLineNumber, lastLineWasRemoval)
+
+            idlStart = isStartOfIDLFile(line)
+
+            if self.mDeadline is not None and (idlStart or lineNo % self.kDeadlineCheckInterval == 0) and self.isPastDeadline():
+                # Out of time: the file we're in, and every IDL file after it, goes
+                # unchecked.
+                if debugEnabled:
+                    self.mPrinter.debug("Deadline reached at line " + str(lineNo) + ".")
+                if idlStart:
+                    self.markIDLFileUnchecked(extractIDLFileName(line))
+                elif currentIDLFile and not currentIDLFileWasDeleted:
+                    self.markIDLFileUnchecked(currentIDLFile)
+
+                for remainingLine in patchLines:
+                    if remainingLine.startswith("diff "):
+                        self.markIDLFileUnchecked(extractIDLFileName(remainingLine))
+                break
+
+            if listeners and openSectionIDLFile is not None and line.startswith("diff "):
+                self.dispatchEvent(SectionFinishedEvent(openSectionIDLFile, None, None, lineNo - 1))
+                openSectionIDLFile = None
+
+            if currentInterfaceIsDecided and not interfaceMayBeRemoved and isPlainHunkLine(line):
+                decidedLineCount = decidedLineCount + 1
+                continue
 
-        if shouldIssueWarning & (currentIDLFile not in fileWarningsIssued):
-            fileWarningsIssued.append(currentIDLFile)
-            gPrinter.warn("'" + str(currentIDLFile) + "' was not found in local repository. Are you sure your repository is at the correct revision?")
+            if idlStart:
+                idlSectionCount = idlSectionCount + 1
+                currentIDLFileWasDeleted = False
+                interfaceMayBeRemoved = False
+                currentInterfaceWasRenamed = False
 
-        # if line is change to an interface and not a comment, a constant expr, or
-        # an IID removal line:
-        if binaryCompat or (not currentInterfaceWasRenamed and not descr and not iidRemoval and not cmt and not constEx and change and currentInterfaceName):
+            if isAdditionLine(line):
+                interfaceMayBeRemoved = False
 
-            gPrinter.debug("Line number " + str(lineNo) + " with change to interface '" + str(currentInterfaceName) + "' meets qualifications for needing an IID change.")
-            gPrinter.debug("binaryCompat: " + str(binaryCompat))
-            gPrinter.debug("currentInterfaceWasRenamed: " + str(currentInterfaceWasRenamed))
-            gPrinter.debug("change: " + str(change))
-            gPrinter.debug("comment: " + str(cmt))
-            gPrinter.debug("currentInterfaceName: " + str(currentInterfaceName))
-            gPrinter.debug("iid removal: " + str(iidRemoval))
-            gPrinter.debug("const expr: " + str(constEx))
+            if not currentInterfaceName:
+                needInterfaceName = True
 
-            # push interface name onto required revs list
-            if currentInterfaceName not in interfacesRequiringNewIID:
-                interfacesRequiringNewIID.append(currentInterfaceName)
+            if doesLineSignifyDeletion(line):
+                if debugEnabled:
+                    self.mPrinter.debug("Current idl file: " + str(currentIDLFile) + " was deleted.")
+                currentIDLFileWasDeleted = True
 
-        # Finally, if we just saw the end of an interface's definition, and there
-        # were no additions (only removals), then we don't need to increment the
-        # IID of this interface, because it's being removed completely.
-        if isEndOfInterfaceRemoval(line) and interfaceMayBeRemoved and currentInterfaceName in interfacesRequiringNewIID:
-            interfacesRequiringNewIID.remove(currentInterfaceName)
-            interfaceMayBeRemoved = False
+            if currentIDLFileWasDeleted:
+                # If the file in question has been removed, then we don't really care
+                # about it any longer, so just go ahead to the next one.
+                continue
 
-    return (interfacesRequiringNewIID, revvedInterfaces, interfaceNameIDLMap)
+            if isLineChange(line):
+                # If this line has no content, or the content is just spaces, then
+                # simply skip this line.
+                content = extractContentFromChangeLine(line)
+                content = content.rstrip()
+                if len(content) == 0:
+
+                    if debugEnabled:
+                        self.mPrinter.debug("Line " + str(lineNo) + " was detected to be empty. Continuing.")
+                    continue
+
+            # if the line is the start of a non-idl file
+            if isLineStartOfNewFile(line) and not idlStart:
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " is start of new file.")
+                lastUUIDChangeLineSeen = None
+                currentInterfaceWasRenamed = False
+
+                # clear our current interface name
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+
+            if (idlStart):
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " is start of IDL file.")
+
+                if pendingFileLookup is not None:
+                    self.lookUpIDLFile(pendingFileLookup, currentIDLFile, currentIDLPath, missingIDLFiles, fileWarningsIssued)
+                pendingFileLookup = None
+                currentIDLFileWasLookedUp = False
+
+                # Nothing else about the previous file is carried over into this
+                # one, which makes this a good place for a checkpoint. It's taken
+                # as of the end of the previous line, so that a resumed check starts
+                # by parsing this one.
+                if self.mCheckpointFile is not None and self.mSectionOffset is not None and self.mCheckpointFile.isDue():
+                    if debugEnabled:
+                        self.mPrinter.debug("Saving a checkpoint at line " + str(lineNo) + ".")
+                    self.mCheckpointFile.save({'offset': self.mSectionOffset,
+                                               'header': line,
+                                               'interfaces': resultTable.toList(),
+                                               'missingFiles': missingIDLFiles,
+                                               'iidChanges': iidChanges,
+                                               'interfaceName': currentInterfaceName,
+                                               'lineNumber': currentLineNumber - 1,
+                                               'lineNo': lineNo - 1,
+                                               'idlSectionCount': idlSectionCount - 1,
+                                               'decidedLineCount': decidedLineCount})
+
+                lastUUIDChangeLineSeen = None
+
+                # pop last idl file, if there was one
+                currentIDLFile = extractIDLFileName(line)
+                currentIDLPath = extractIDLFilePath(line, self.getRootPath())
+                openSectionIDLFile = currentIDLFile
+
+                # start reading the file in the background, so its special block ranges
+                # are (hopefully) ready by the time we reach the first changed line
+                self.mRangeCache.prefetchRangesForFilePath(currentIDLPath, self.mPrinter)
+
+                # now that we're in a new file, we need to make sure that we detect the
+                # proper interface again
+
+                if debugEnabled:
+                    self.mPrinter.debug("Interface name WAS: " + str(currentInterfaceName))
+
+                needInterfaceName = True
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+                foundIIDChangeLine = False
 
+                if debugEnabled:
+                    self.mPrinter.debug("Interface now is: " + str(currentInterfaceName))
+
+            if isLineIIDAddition(line):
+                # We'll need to put the interface name (as we haven't seen it yet)
+                # into the currentInterface variable
+                needInterfaceName = True
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+                foundIIDChangeLine = True
+                addedIID = extractIID(line)
+            elif isLineIIDDefinition(line):
+                if isRemovalLine(line):
+                    interfaceMayBeRemoved = True
+                needInterfaceName = True
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+                foundIIDChangeLine = False
 
-def parseArguments():
-    global gParser, DEBUG, VERBOSE, COLOR, gOutputTestPath
+            # if we need an interface name, and this happens to be the line
+            # that defines the interface
+            if needInterfaceName and isInterfaceDefinitionLine(line, self.mPrinter):
+
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " is interface definition line and we need one.")
+
+                # extract the interface name
+                currentInterfaceName = extractInterfaceNameFromDefinitionLine(line)
+
+                if debugEnabled:
+                    self.mPrinter.debug("(Line " + str(lineNo) + "): Current interface name is now: " + str(currentInterfaceName))
+
+                # record that the interface was revved (for the previous step)
+                if foundIIDChangeLine:
+                    if debugEnabled:
+                        self.mPrinter.debug("Marking " + str(currentInterfaceName) + " as revved")
+
+                    resultTable.markRevved(currentIDLFile, currentInterfaceName, currentLineNumber)
+                    iidChanges.append(('+', addedIID, currentInterfaceName, currentIDLPath))
+                    foundIIDChangeLine = False
+                    if listeners:
+                        self.dispatchEvent(IIDChangeEvent(currentIDLFile, currentInterfaceName, currentLineNumber, lineNo, '+', addedIID))
+
+                # indicate that we no longer need an interface name
+                needInterfaceName = False
+
+                resultTable.addInterface(currentIDLFile, currentInterfaceName)
+                self.mParseProgress = (lineNo, sectionIDLFile, currentInterfaceName, len(resultTable))
+
+            # if we didn't need an interface name, but this still happens to be an
+            # interface definition line, then we might be in a situation where the
+            # interface was renamed.
+            if not needInterfaceName and isInterfaceDefinitionLine(line, self.mPrinter):
+                if debugEnabled:
+                    self.mPrinter.debug("We apparently don't need an interface name, but line: " + str(lineNo) + " was detected to be an interface definition line.")
+                if self.isLineInterfaceRename(line, previousInterfaceName, currentIDLPath, (lastUUIDChangeLineSeen, currentLineNumber + 1)):
+                    if debugEnabled:
+                        self.mPrinter.debug("'" + str(currentInterfaceName) + "' was renamed!")
+                    currentInterfaceWasRenamed = True
+
+            # if this is a context line, then let's extract the line number from it
+            if isContextLine(line):
+
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " is context line.")
+
+                currentLineNumber = extractLineNumberFromContext(line)
+
+                # modify our current interface to match the one in the context, but only
+                # if it's also an interface context line
+                if isInterfaceContextLine(line):
+                    currentInterfaceName = extractInterfaceNameFromContextLine(line)
+
+                    if debugEnabled:
+                        self.mPrinter.debug("Current interface is now: " + str(currentInterfaceName))
+
+                    resultTable.addInterface(currentIDLFile, currentInterfaceName)
+                    self.mParseProgress = (lineNo, sectionIDLFile, currentInterfaceName, len(resultTable))
+
+                # Otherwise, the interface of the previous hunk may not be the one
+                # this hunk is in (e.g. if a typedef between them was taken for the
+                # hunk's context), so look it up in the file, if it's been read or
+                # there's time to read it. If the hunk starts outside of any
+                # interface, the next interface definition line is picked up.
+                elif currentInterfaceName and sectionIDLFile and not self.shouldSkipFileLookup(currentIDLPath):
+                    try:
+                        span = self.getEnclosingInterface(currentIDLPath, extractNewLineNumberFromContext(line))
+                        currentInterfaceName = span.getName() if span else None
+                    except:
+                        # The file couldn't be read; it's reported as missing at
+                        # the end of its section.
+                        if debugEnabled:
+                            self.mPrinter.debug("Couldn't look up the interface enclosing line " + str(lineNo) + " in '" + currentIDLPath + "'.")
+                    else:
+                        if debugEnabled:
+                            self.mPrinter.debug("Current interface is now: " + str(currentInterfaceName))
+                        if currentInterfaceName:
+                            resultTable.addInterface(currentIDLFile, currentInterfaceName)
+                            self.mParseProgress = (lineNo, sectionIDLFile, currentInterfaceName, len(resultTable))
+
+            iidRemoval = isLineIIDRemoval(line)
+
+            if iidRemoval:
+                lastUUIDChangeLineSeen = currentLineNumber
+                iidChanges.append(('-', extractIID(line), None, currentIDLPath))
+                if listeners:
+                    self.dispatchEvent(IIDChangeEvent(currentIDLFile, None, currentLineNumber, lineNo, '-', iidChanges[-1][1]))
+
+            change = isLineChange(line)
+            if change and not currentIDLFileWasLookedUp and pendingFileLookup is None and currentIDLPath is not None and currentIDLFile not in fileWarningsIssued and not isLineSingleLineComment(line):
+                pendingFileLookup = (line, currentLineNumber)
+
+            # Decide whether the line requires a new IID. The tests run from the
+            # cheapest to the most expensive, and stop at the first one that
+            # decides, so most lines never get as far as the comment lookup, which
+            # may have to read the IDL file.
+            requiresNewIID = False
+            if resultTable.requiresNewIID(currentIDLFile, currentInterfaceName):
+                # nothing on this line can add to what we know about the interface
+                pass
+            elif '[' in line and IDLDescriptor.areDescriptorsInLineAffectingBinaryCompat(line, self.mPrinter, self.mDescriptorList):
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " changes a descriptor affecting binary compatibility.")
+                requiresNewIID = True
+            elif change and currentInterfaceName and not currentInterfaceWasRenamed and not iidRemoval:
+                if '[' in line and IDLDescriptor.hasDescriptorsInLine(line, self.mPrinter, self.mDescriptorList):
+                    pass
+                elif isLineConstantExpression(line, self.mPrinter):
+                    pass
+                elif currentIDLPath is None:
+                    requiresNewIID = True
+                else:
+                    requiresNewIID = not self.lookUpIDLFile((line, currentLineNumber), currentIDLFile, currentIDLPath, missingIDLFiles, fileWarningsIssued)
+                    if not isLineSingleLineComment(line):
+                        currentIDLFileWasLookedUp = True
+                        pendingFileLookup = None
+
+            if requiresNewIID:
+                if debugEnabled:
+                    self.mPrinter.debug("Line number " + str(lineNo) + " with change to interface '" + str(currentInterfaceName) + "' meets qualifications for needing an IID change.")
+                resultTable.markRequiresNewIID(currentIDLFile, currentInterfaceName, currentLineNumber)
+                if listeners:
+                    self.dispatchEvent(InterfaceFlaggedEvent(currentIDLFile, currentInterfaceName, currentLineNumber, lineNo))
+
+            # Finally, if we just saw the end of an interface's definition, and there
+            # were no additions (only removals), then we don't need to increment the
+            # IID of this interface, because it's being removed completely.
+            if isEndOfInterfaceRemoval(line) and interfaceMayBeRemoved and resultTable.requiresNewIID(currentIDLFile, currentInterfaceName):
+                resultTable.clearRequiresNewIID(currentIDLFile, currentInterfaceName)
+                interfaceMayBeRemoved = False
+                if listeners:
+                    self.dispatchEvent(InterfaceClearedEvent(currentIDLFile, currentInterfaceName, currentLineNumber, lineNo))
+
+            # Skipped lines could be the ones that decide whether the IDL file is
+            # looked up, so only skip lines once that's settled.
+            fileLookupIsSettled = currentIDLPath is None or currentIDLFileWasLookedUp or pendingFileLookup is not None
+            currentInterfaceIsDecided = fileLookupIsSettled and currentInterfaceName is not None and resultTable.isDecided(currentIDLFile, currentInterfaceName)
+        else:
+            # (unless the deadline cut the patch short)
+            if pendingFileLookup is not None:
+                self.lookUpIDLFile(pendingFileLookup, currentIDLFile, currentIDLPath, missingIDLFiles, fileWarningsIssued)
+            if openSectionIDLFile is not None and listeners:
+                self.dispatchEvent(SectionFinishedEvent(openSectionIDLFile, None, None, lineNo))
+            for (index, lineCount) in skippedLines:
+                lineNo = lineNo + lineCount
 
-    if not gParser:
-        createParser()
+        self.mParseProgress = None
+        if self.mMetrics is not None:
+            self.mMetrics.add('patch_lines', lineNo)
+            self.mMetrics.add('decided_lines', decidedLineCount)
+            self.mMetrics.add('idl_sections', idlSectionCount)
 
-    parsed = gParser.parse_args(sys.argv[1:])
+        return (resultTable, missingIDLFiles, iidChanges)
+
+
+# Parse a given diff output to get data about which interfaces have been changed
+# and whether corresponding IIDs were changed as well.
+#
+# This is a convenience wrapper around IIDChecker.parsePatch(), using a new
+# IIDChecker with the default descriptors.
+#
+# @param aInputPatch A string containing lines of a diff output 'patch' which
+#        needs to be parsed to get the required information.
+# @param aRootPath The path to the root hg repository onto which the patch would
+#        be applied. This is necessary because the comment-checking code needs
+#        to look at actual files, not just the patch file.
+# @param aPrinter An optional PrettyPrinter through which to report output.
+#
+# @returns A tuple, (interfacesRequiringNewIID, revvedInterfaces,
+#          interfaceNameIDLMap).
+def parsePatch(aInputPatch, aRootPath, aPrinter=None):
+    checker = IIDChecker(aRootPath, aPrinter)
+    (resultTable, missingIDLFiles, iidChanges) = checker.parsePatch(aInputPatch)
+    result = IIDCheckResult(resultTable, missingIDLFiles)
+    return (result.getInterfacesRequiringNewIID(), result.getRevvedInterfaces(), result.getInterfaceNameIDLMap())
 
-    if parsed.verbose:
-        VERBOSE = True
 
-    if parsed.debug:
-        DEBUG = True
+# Number of changesets checked concurrently by attributeRevisionRange().
+kAttributionWorkers = 8
+
+
+# Find the changesets responsible for each finding of a check over a range of
+# hg revisions.
+#
+# The whole range is checked first, with files read as of aEndRev. Then every
+# changeset in the range that touches an IDL file is checked on its own, with
+# files read as of that changeset, on a pool of worker threads. Each interface
+# found to need a new IID over the whole range is attributed to the changesets
+# that changed it in a way requiring a new IID.
+#
+# @param aRootPath The path to the root of the hg repository.
+# @param aStartRev The revision at which the range starts.
+# @param aEndRev The revision at which the range ends.
+# @param aPrinter An optional PrettyPrinter through which to report output.
+# @param aWorkers The number of changesets to check concurrently.
+#
+# @returns A tuple, (rangeResult, attribution), where rangeResult is the
+#          IIDCheckResult of the check over the whole range, and attribution is
+#          a map from the (idlFileName, interfaceName) key of each unrevved
+#          interface to a list of the changeset ids it is attributed to, in range
+#          order.
+def attributeRevisionRange(aRootPath, aStartRev, aEndRev, aPrinter=None, aWorkers=kAttributionWorkers):
+    import hgutils
+    from concurrent.futures import ThreadPoolExecutor
+
+    rangeProvider = hgutils.HgRevisionContentProvider(aRootPath, aEndRev)
+    rangeChecker = IIDChecker(aPrinter=aPrinter, aContentProvider=rangeProvider)
+    rangeResult = rangeChecker.check(hgutils.getIDLDiff(aRootPath, aStartRev, aEndRev))
+
+    unrevvedRecords = rangeResult.getUnrevvedRecords()
+    if not unrevvedRecords:
+        return (rangeResult, {})
+
+    revisions = hgutils.getRevisionsInRange(aRootPath, aStartRev, aEndRev, '**.idl')
+
+    def checkRevision(aRev):
+        revisionProvider = hgutils.HgRevisionContentProvider(aRootPath, aRev)
+        revisionChecker = IIDChecker(aPrinter=aPrinter, aContentProvider=revisionProvider)
+        return revisionChecker.check(hgutils.exportIDLChanges(aRootPath, aRev))
+
+    pool = ThreadPoolExecutor(max_workers=aWorkers)
+    revisionResults = list(zip(revisions, pool.map(checkRevision, revisions)))
+    pool.shutdown()
+
+    attribution = {}
+    for record in unrevvedRecords:
+        (idlFileName, interfaceName) = record.getKey()
+        attribution[record.getKey()] = []
+        for (rev, revisionResult) in revisionResults:
+            if revisionResult.getResultTable().requiresNewIID(idlFileName, interfaceName):
+                attribution[record.getKey()].append(rev)
+
+    return (rangeResult, attribution)
+
+
+# Build the message reported for an interface that may need a new IID.
+#
+# @param aInterface The name of the interface.
+# @param aIDLFileName The name of the IDL file in which the interface is defined.
+#
+# @returns The message, as a string.
+def createFindingMessage(aInterface, aIDLFileName):
+    message = "Interface '" + str(aInterface) + "', in file '" + aIDLFileName + "' may need a new IID. Check on:\n"
+    message += "http://dxr.mozilla.org/mozilla-central/search?q=" + aIDLFileName + "&redirect=true"
+    return message
+
+
+# Parse the command line arguments given to the script.
+#
+# @param aPatchData An optional bytes object containing the patch, if it was
+#        already read from stdin (e.g. by checkiidhook). This is used in place of
+#        stdin when no input file is given.
+#
+# @returns A tuple, (patchBuffer, rootPath, options), of the PatchBuffer holding
+#          the patch, the path to the root of the repository and the parsed
+#          command line options.
+def parseArguments(aPatchData=None):
+    global gParser
+
+    if not gParser:
+        createParser()
 
-    if parsed.nocolor:
-        COLOR = False
+    parsed = gParser.parse_args(sys.argv[1:])
 
     if not parsed.repo:
         gParser.print_help()
         exit(0)
 
-    if parsed.testpath:
-        gOutputTestPath = parsed.testpath[0]
+    if parsed.resume and not parsed.checkpoint:
+        gParser.error("--resume requires --checkpoint")
+
+    if parsed.retireiids and not parsed.uuidindex:
+        gParser.error("--retire-iids requires --uuid-index")
+
+    if parsed.shadow and parsed.engine == IIDChecker.kLegacyEngine:
+        gParser.error("--shadow requires an --engine other than '" + IIDChecker.kLegacyEngine + "'")
+
+    if parsed.progressinterval is not None and parsed.progressinterval <= 0:
+        gParser.error("--progress-interval must be positive")
+
+    if parsed.watch or parsed.attribute or parsed.scanuuids:
+        # none of these modes reads a patch
+        return (None, parsed.repo[0], parsed)
 
     if parsed.inputfile == 'stdin':
-        return (sys.stdin, parsed.repo[0])
+        if aPatchData is not None:
+            return (PatchBuffer(aPatchData), parsed.repo[0], parsed)
+
+        return (PatchBuffer.fromStream(sys.stdin.buffer), parsed.repo[0], parsed)
 
     try:
-        inputFile = open(parsed.inputfile)
+        inputFile = PatchBuffer.fromFile(parsed.inputfile)
     except:
         gParser.print_help()
         print("ERROR: Unable to open file '" + str(parsed.inputfile) + "'!")
         exit(0)
 
-    return (inputFile, parsed.repo[0])
+    return (inputFile, parsed.repo[0], parsed)
 
 
 def createParser():
     global gParser
 
     if not gParser:
+        import argparse
         gParser = argparse.ArgumentParser(description='''
             Check changed interfaces in a given diff output, verifying that all
             interfaces that were changed have an associated IID change.
@@ -837,72 +2130,126 @@ def createParser():
         gParser.add_argument('inputfile', help='Path to a patch file on which to operate', nargs='?', default="stdin")
         gParser.add_argument('-n', '--no-color', action="store_true", dest="nocolor",
                              help='Disable output of colored ANSI text (helpful for scripts)')
-
-
-def main(aRootPath, aFile):
-    global gPrinter, gOutputTestPath
-
-    # initialization stage
-    implicitJs = IDLDescriptor("implicit_jscontext", True)
-    nostdcall = IDLDescriptor("nostdcall", True)
-    notxpcom = IDLDescriptor("notxpcom", True)
-    optionalArgc = IDLDescriptor("optional_argc", True)
-    IDLDescriptor.kDescriptorList = [implicitJs, nostdcall, notxpcom, optionalArgc]
+        gParser.add_argument('--verdict-cache', metavar='<cache file>', action='store', dest="verdictcache",
+                             help="Store the verdicts for each IDL file section in <cache file>, and reuse them for sections that haven't changed.")
+        gParser.add_argument('-w', '--watch', action='store_true', dest='watch',
+                             help="Watch the IDL files in the repository, and re-check each one whenever it changes. The input file is ignored.")
+        gParser.add_argument('-a', '--attribute', metavar=('<startrev>', '<endrev>'), action='store',
+                             dest="attribute", nargs=2,
+                             help="Check the range of hg revisions from <startrev> to <endrev>, and report which changesets caused each finding. The input file is ignored.")
+        gParser.add_argument('--uuid-index', metavar='<index file>', action='store', dest="uuidindex",
+                             help="Index every IID in the repository in <index file>, and report IIDs added by the patch that are already in use, or were retired by an earlier patch (see --retire-iids).")
+        gParser.add_argument('--retire-iids', action='store_true', dest='retireiids',
+                             help="Record the IIDs the patch removes as retired in the --uuid-index, so that adding them again is reported. Only use this for patches that are being pushed, e.g. from a push hook: retirements are permanent, so a patch that is only being tried out would have its own IIDs reported when it's backed out or landed again.")
+        gParser.add_argument('--log-file', metavar='<log file>', action='store', dest="logfile",
+                             help="Write all output to <log file> instead of the console.")
+        gParser.add_argument('--log-json-fd', metavar='<fd>', action='store', dest="logjsonfd", type=int,
+                             help="Write all output to file descriptor <fd> as JSON lines, instead of to the console. Takes precedence over --log-file.")
+        gParser.add_argument('--events-json-fd', metavar='<fd>', action='store', dest="eventsjsonfd", type=int,
+                             help="Write an event to file descriptor <fd>, as a line of JSON, whenever the parser flags or clears an interface, sees an IID change or finishes an IDL file section.")
+        gParser.add_argument('--deadline', metavar='<seconds>', action='store', dest="deadline", type=float,
+                             help="Stop checking after <seconds>, and report partial results along with the IDL files that weren't checked.")
+        gParser.add_argument('--metrics-file', metavar='<metrics file>', action='store', dest="metricsfile",
+                             help="After checking, write metrics about the run (lines processed, cache hits, time per phase, findings, ...) to <metrics file> in the OpenMetrics text format.")
+        gParser.add_argument('--interface-graph', metavar='<graph file>', action='store', dest="interfacegraph",
+                             help="Cache the inheritance graph of the interfaces in the repository in <graph file>, and report interfaces derived from changed interfaces as needing a new IID, too.")
+        gParser.add_argument('--only-file', metavar='<idl file>', action='append', dest="onlyfiles",
+                             help="Check only the sections of the patch that change <idl file>, found through a sidecar index of the patch file (<inputfile>.idx), which is written if it's missing or out of date. May be given more than once.")
+        gParser.add_argument('--only-interface', metavar='<interface>', action='append', dest="onlyinterfaces",
+                             help="Check only the sections of the patch that mention <interface>, found through the patch's sidecar index, and (unless --only-file is also given) report only on <interface>. May be given more than once.")
+        gParser.add_argument('--checkpoint', metavar='<checkpoint file>', action='store', dest="checkpoint",
+                             help="Save the state of the check in <checkpoint file> every so often, so that an interrupted check can be resumed with --resume. The file is deleted once the check finishes.")
+        gParser.add_argument('--checkpoint-interval', metavar='<seconds>', action='store', dest="checkpointinterval", type=float, default=60.0,
+                             help="Save a checkpoint at most every <seconds> (default: 60).")
+        gParser.add_argument('--resume', action='store_true', dest='resume',
+                             help="Resume the check from the state saved in the --checkpoint file, skipping the part of the patch that was already checked. The same patch must be given again.")
+        gParser.add_argument('--verify-tree', action='store_true', dest='verifytree',
+                             help="Before checking, verify that each IDL file the patch changes matches the last version of it in the patch (through git blob hashes, where the patch has them, or else the lines of its hunks), and stop with a report of the files that don't if the repository isn't at the revision the patch ends at.")
+        gParser.add_argument('--consolidate', action='store_true', dest='consolidate',
+                             help="Replace the sections of the patch for each IDL file that has more than one (e.g. in the output of 'hg export' or 'git log -p' over a range of changesets) with a single section holding the net change, worked out from the file in the repository, which must be at the newest revision in the patch. The changesets may be listed oldest or newest first. Files whose sections don't apply to it are checked section by section, with a warning.")
+        gParser.add_argument('--engine', action='store', dest="engine", default=IIDChecker.kLegacyEngine,
+                             choices=[IIDChecker.kLegacyEngine, IIDChecker.kVectorEngine],
+                             help="The engine with which to parse the patch: '" + IIDChecker.kLegacyEngine + "' (line by line, the default), or '" + IIDChecker.kVectorEngine + "' (with array operations, which needs NumPy). Checks with --deadline or --checkpoint always parse line by line.")
+        gParser.add_argument('--shadow', action='store_true', dest='shadow',
+                             help="Parse the patch with both the legacy engine and the --engine one, use the legacy engine's results, and warn about any differences between them. How long each took is reported with -V, and in the --metrics-file.")
+        gParser.add_argument('--progress-interval', metavar='<seconds>', action='store', dest="progressinterval", type=float,
+                             help="Report the progress of the check (position in the patch, IDL file and interface being parsed, lines per second, cache sizes, time per phase) as a line of JSON every <seconds>. A report is also made whenever the process receives SIGUSR1.")
+        gParser.add_argument('--progress-file', metavar='<progress file>', action='store', dest="progressfile",
+                             help="Write progress reports to <progress file>, replacing the previous one, instead of to stderr.")
+        gParser.add_argument('--scan-uuids', action='store_true', dest='scanuuids',
+                             help="Scan the whole repository for IIDs used by more than one interface. The input file is ignored.")
+
+
+# Run a check over a patch and report the results.
+#
+# @param aChecker The IIDChecker with which to check the patch.
+# @param aFile A file object containing the diff output to check.
+# @param aOutputTestPath An optional path to a reference "output" file. If given,
+#        the output is compared against this file instead of being reported
+#        (unit test mode), and the process exits with the outcome.
+#
+# @returns The IIDCheckResult of the check.
+def main(aChecker, aFile, aOutputTestPath=None):
+    printer = aChecker.getPrinter()
 
     # parsing stage
-    (interfacesRequiringNewIID, revvedInterfaces, interfaceNameIDLMap) = parsePatch(aFile, aRootPath)
-    unrevvedInterfaces = []
+    result = aChecker.check(aFile)
+
+    aChecker.startPhase('report')
 
     # checking stage
-    # for each interface in required revs list:
-    for interface in interfacesRequiringNewIID:
-        # if the interface name is in revved interface list:
-        if interface in revvedInterfaces:
+    for record in result.getResultTable().getRecordsRequiringNewIID():
+        if not result.getResultTable().isUnrevved(record):
             # report that we saw the interface and that it has an IID change
+            printer.info("Interface '" + str(record.getInterfaceName()) + "' has changes and a modified IID. Looks good.")
 
-            gPrinter.info("Interface '" + str(interface) + "' has changes and a modified IID. Looks good.")
+    unrevvedRecords = result.getUnrevvedRecords()
 
-            # then just continue, because this interface change is good
-            continue
+    for conflict in result.getIIDConflicts():
+        printer.error(conflict.getMessage())
 
-        else:
-            # add interface name to unrevved interface list
-            unrevvedInterfaces.append(interface)
+    for fileName in result.getDegradedIDLFiles():
+        printer.warn("'" + fileName + "' was checked without reading it, to meet the deadline. Changes to comments in it may be reported as needing a new IID.")
+
+    for fileName in result.getUncheckedIDLFiles():
+        printer.warn("'" + fileName + "' was not fully checked before the deadline. Interfaces in it may need a new IID.")
 
     # reporting stage
     # if there is at least one interface that has an unrevved IID:
-    if len(unrevvedInterfaces) > 0:
-        if gOutputTestPath:
-            tempFile = tempfile.TemporaryFile(prefix="checkiid-test-file-log")
+    if len(unrevvedRecords) > 0:
+        if aOutputTestPath:
+            import tempfile
+            tempFile = tempfile.TemporaryFile(mode="w+", prefix="checkiid-test-file-log")
 
-        for interface in unrevvedInterfaces:
+        for record in unrevvedRecords:
             # report that interface and the file that it's a part of
-            interfaceFilename = interfaceNameIDLMap[interface]
-            message = "Interface '" + str(interface) + "', in file '" + interfaceFilename + "' may need a new IID. Check on:\n"
-            message += "http://dxr.mozilla.org/mozilla-central/search?q=" + interfaceFilename + "&redirect=true"
-
+            message = createFindingMessage(record.getInterfaceName(), record.getIDLFileName())
+            for baseName in record.getChangedBases():
+                message += "\nIt inherits from '" + baseName + "', which was changed."
 
-            if not gOutputTestPath:
-                gPrinter.error(message)
+            if not aOutputTestPath:
+                printer.error(message)
             else:
-                gPrinter.debug("Printing '" + str(message) + "' to tempFile...")
+                printer.debug("Printing '" + str(message) + "' to tempFile...")
                 tempFile.write(message + "\n")
 
+    aChecker.endPhase('report')
+
     # OPTIONAL Unit Test Mode
-    if gOutputTestPath:
+    if aOutputTestPath:
         try:
             tempFile.seek(0)
             tempLines = tempFile.readlines()
-            gPrinter.debug("tempFile lines: " + str(tempLines))
+            printer.debug("tempFile lines: " + str(tempLines))
             tempFile.close()  # this deletes the temporary file
 
         except:
             tempLines = []
 
-        refFile = open(gOutputTestPath, "r")
-        gPrinter.debug("Opening '" + str(gOutputTestPath) + "' as reference file")
+        refFile = open(aOutputTestPath, "r")
+        printer.debug("Opening '" + str(aOutputTestPath) + "' as reference file")
         refLines = refFile.readlines()
-        gPrinter.debug("RefLines: " + str(refLines))
+        printer.debug("RefLines: " + str(refLines))
         refFile.close()
 
         invalidCompFound = False
@@ -913,25 +2260,30 @@ def main(aRootPath, aFile):
         for curRefLine in refLines:
             match = re.search("^#", curRefLine)
             if (match):
-                gPrinter.debug("Removing line from refFile: " + str(curRefLine))
+                printer.debug("Removing line from refFile: " + str(curRefLine))
                 refLinesToRemove.append(curRefLine)
 
         for lineToRemove in refLinesToRemove:
             refLines.remove(lineToRemove)
 
         for curInputLine in tempLines:
-            gPrinter.debug("input line: " + curInputLine)
-        gPrinter.debug("Number of input lines: " + str(len(tempLines)))
-        gPrinter.debug("Number of reference lines: " + str(len(refLines)))
+            printer.debug("input line: " + curInputLine)
+        printer.debug("Number of input lines: " + str(len(tempLines)))
+        printer.debug("Number of reference lines: " + str(len(refLines)))
+
+        # the results below are printed directly, so write out everything the
+        # printer has buffered first
+        printer.flush()
+
         if len(tempLines) != len(refLines):
             invalidCompFound = True
             print("Expected " + str(len(refLines)) + " lines of output, Found: " + str(len(tempLines)) + " lines of output.")
         else:
-            gPrinter.debug("Comparing line-by-line...")
+            printer.debug("Comparing line-by-line...")
             for line1 in refLines:
-                gPrinter.debug("Reference line was: " + str(line1))
+                printer.debug("Reference line was: " + str(line1))
                 line2 = tempLines[reftestLineNo]
-                gPrinter.debug("Input line was: " + str(line2))
+                printer.debug("Input line was: " + str(line2))
                 if line1 is line2:
                     invalidCompFound = True
                     print("Expected: " + str(line1) + ", Found: " + str(line2))
@@ -944,20 +2296,220 @@ def main(aRootPath, aFile):
             print("TEST-PASS")
             sys.exit(0)
 
+    return result
 
-def runMain():
-    global gPrinter
 
-    (patchFile, rootPath) = parseArguments()
+# Record the statistics of a checker's caches and printer in its metrics, and
+# write the metrics out.
+#
+# @param aChecker The IIDChecker whose metrics to write. It must have been
+#        created with a CheckMetrics object.
+# @param aMetricsPath The path of the OpenMetrics file to write.
+def writeMetrics(aChecker, aMetricsPath):
+    metrics = aChecker.getMetrics()
 
-    # setup our printing utility vehicle
-    gPrinter = PrettyPrinter(COLOR, DEBUG, VERBOSE)
+    (hits, misses, charactersRead) = aChecker.getRangeCache().getStatistics()
+    metrics.set('range_cache_hits', hits)
+    metrics.set('range_cache_misses', misses)
+    metrics.set('file_bytes_read', charactersRead)
+
+    if aChecker.getVerdictCache() is not None:
+        (hits, misses) = aChecker.getVerdictCache().getStatistics()
+        metrics.set('verdict_cache_hits', hits)
+        metrics.set('verdict_cache_misses', misses)
+
+    parseSeconds = metrics.get('phase_seconds', {'phase': 'parse'})
+    if parseSeconds > 0:
+        metrics.set('patch_lines_per_second', metrics.get('patch_lines') / parseSeconds)
+
+    for (messageType, count) in aChecker.getPrinter().getMessageCounts().items():
+        metrics.set('messages', count, {'level': messageType})
 
-    main(rootPath, patchFile)
+    metrics.write(aMetricsPath)
 
-    if not patchFile == sys.stdin:
+
+# Entry point for the checkiid script.
+#
+# @param aPatchData An optional bytes object containing a patch that was already
+#        read from stdin by the caller.
+#
+# @returns The exit status of the script, to be passed to exitProcess().
+def runMain(aPatchData=None):
+    (patchFile, rootPath, options) = parseArguments(aPatchData)
+
+    # setup our printing utility vehicle
+    sink = None
+    colorEnabled = not options.nocolor
+    if options.logjsonfd is not None:
+        from prettyprinter import JSONLinesSink
+        sink = JSONLinesSink(options.logjsonfd)
+        colorEnabled = False
+    elif options.logfile:
+        from prettyprinter import FileSink
+        sink = FileSink(options.logfile)
+        colorEnabled = False
+
+    printer = PrettyPrinter(colorEnabled, options.debug, options.verbose, sink)
+
+    # every return below flushes the printer; this writes out what was printed
+    # before an exception, too
+    if sink is not None:
+        import atexit
+        atexit.register(sink.flush)
+
+    if options.watch:
+        from watcher import IDLTreeWatcher
+        IDLTreeWatcher(rootPath, printer).run()
+        printer.flush()
+        return 0
+
+    if options.attribute:
+        (startRev, endRev) = options.attribute
+        (rangeResult, attribution) = attributeRevisionRange(rootPath, startRev, endRev, printer)
+        for record in rangeResult.getUnrevvedRecords():
+            message = createFindingMessage(record.getInterfaceName(), record.getIDLFileName())
+            message += "\nChanged without an IID change in: " + ", ".join(attribution[record.getKey()])
+            printer.error(message)
+        printer.flush()
+        return 0
+
+    uuidIndex = None
+    if options.uuidindex or options.scanuuids:
+        from uuidindex import UUIDIndex
+        if options.uuidindex:
+            uuidIndex = UUIDIndex.load(rootPath, options.uuidindex)
+        else:
+            uuidIndex = UUIDIndex(rootPath)
+        filesRead = uuidIndex.refresh()
+        printer.debug("Read " + str(filesRead) + " IDL files while indexing IIDs.")
+
+    if options.scanuuids:
+        collisions = uuidIndex.findCollisions()
+        for iid in sorted(collisions.keys()):
+            users = ["'" + str(interfaceName) + "' in '" + path + "'" for (path, interfaceName) in collisions[iid]]
+            printer.error("IID '" + iid + "' is used more than once: by " + ", ".join(users) + ".")
+        if options.uuidindex:
+            uuidIndex.save(options.uuidindex)
+        printer.flush()
+        return 1 if collisions else 0
+
+    verdictCache = None
+    if options.verdictcache:
+        from verdictcache import VerdictCache
+        verdictCache = VerdictCache(options.verdictcache)
+
+    # metrics are always collected, for progress reports, but only written out
+    # with --metrics-file
+    from metrics import CheckMetrics
+    metrics = CheckMetrics()
+    metrics.startPhase('total')
+
+    interfaceGraph = None
+    if options.interfacegraph:
+        from interfacegraph import InterfaceGraph
+        interfaceGraph = InterfaceGraph.load(rootPath, options.interfacegraph)
+        filesRead = interfaceGraph.refresh()
+        printer.debug("Read " + str(filesRead) + " IDL files while updating the interface graph.")
+        interfaceGraph.save(options.interfacegraph)
+
+    interfaceNames = None
+    if options.onlyfiles or options.onlyinterfaces:
+        from patchindex import selectPatchSections
+        patchPath = None
+        if options.inputfile != 'stdin':
+            patchPath = options.inputfile
+
+        selectedPatch = selectPatchSections(patchFile, patchPath, options.onlyfiles or [], options.onlyinterfaces or [], printer)
         patchFile.close()
+        patchFile = selectedPatch
+
+        if options.onlyinterfaces and not options.onlyfiles:
+            interfaceNames = options.onlyinterfaces
+
+    if options.verifytree:
+        from treeverify import WorkingTreeVerifier
+        metrics.startPhase('verify')
+        mismatches = WorkingTreeVerifier(FileContentProvider(rootPath)).verify(patchFile)
+        metrics.endPhase('verify')
+
+        if mismatches:
+            for mismatch in mismatches:
+                printer.error(mismatch.getMessage())
+            printer.error("The repository at '" + rootPath + "' is not at the revision the patch ends at. Please update it and check again.")
+            printer.flush()
+            return 1
+
+    if options.consolidate:
+        from netdiff import consolidatePatch
+        metrics.startPhase('consolidate')
+        consolidatedPatch = consolidatePatch(patchFile, FileContentProvider(rootPath), printer)
+        if consolidatedPatch is not patchFile:
+            patchFile.close()
+            patchFile = consolidatedPatch
+        metrics.endPhase('consolidate')
+
+    checkpointFile = None
+    if options.checkpoint:
+        from checkpoint import CheckpointFile
+        checkpointFile = CheckpointFile(options.checkpoint, options.checkpointinterval)
+        if options.resume and not checkpointFile.loadResumeState():
+            printer.warn("No checkpoint was found in '" + options.checkpoint + "'. Checking from the beginning.")
+
+    checker = IIDChecker(rootPath, printer, aVerdictCache=verdictCache, aUUIDIndex=uuidIndex, aTimeBudget=options.deadline, aMetrics=metrics, aInterfaceGraph=interfaceGraph, aInterfaceNames=interfaceNames, aCheckpointFile=checkpointFile, aEngine=options.engine, aShadow=options.shadow, aRetireIIDs=options.retireiids)
+
+    if options.eventsjsonfd is not None:
+        from checkevents import JSONLinesEventWriter
+        checker.addEventListener(JSONLinesEventWriter(options.eventsjsonfd))
+
+    if options.metricsfile:
+        from checkevents import EventCounter
+        checker.addEventListener(EventCounter(metrics))
+
+    outputTestPath = None
+    if options.testpath:
+        outputTestPath = options.testpath[0]
+
+    from progress import ProgressReporter
+    progressReporter = ProgressReporter(checker, options.progressfile, options.progressinterval)
+    progressReporter.start()
+
+    result = main(checker, patchFile, outputTestPath)
+
+    progressReporter.stop()
+
+    if checkpointFile is not None and not result.isPartial():
+        checkpointFile.remove()
+
+    if uuidIndex is not None:
+        uuidIndex.save(options.uuidindex)
+
+    patchFile.close()
+
+    metrics.endPhase('total')
+    if options.metricsfile:
+        writeMetrics(checker, options.metricsfile)
+
+    if result.isPartial() or result.getDegradedIDLFiles():
+        # don't start reading any more files in the background (see
+        # exitProcess())
+        checker.getRangeCache().cancelPrefetches()
+
+    printer.flush()
+    return 0
+
+
+# Exit the checkiid script. Files that are still being read in the background,
+# e.g. after a check ran out of time, would hold up a normal exit (and so the
+# hook) until they're done, so the process is ended without waiting for them,
+# or running atexit handlers. runMain() writes out all of its output before it
+# returns. Only the script's entry points should call this.
+#
+# @param aStatus The exit status, as returned by runMain().
+def exitProcess(aStatus):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(aStatus)
 
 
 if __name__ == '__main__':
-    runMain()
+    exitProcess(runMain())
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+#
+# IID Checker Hook Entry Point
+#
+# Lightweight front end for the checkiid console script. Most pushes don't touch
+# any .idl files at all, so before paying for the imports and setup of the full
+# checker, this scans the patch for 'diff --git' headers naming an IDL file and
+# exits successfully right away if there aren't any.
+#
+# Only the standard library module 'sys' is imported up front. The checkiid
+# module (and everything it pulls in) is imported only once we know there is
+# something to check, or if the command line asks for anything other than a
+# plain check.
+#
+import sys
+
+# The token that starts the header of each file section in git-style diff output.
+kFileHeaderToken = b"diff --git "
+
+# Command-line switches that don't change the outcome of a check with no IDL
+# files in it. Anything else (help, debug output, test mode, ...) is handed to
+# the full checker untouched.
+kFastPathSwitches = ['-n', '--no-color', '-V', '--verbose']
+
+# Number of bytes to read at a time from an input patch file.
+kReadChunkSize = 1 << 20
+
+
+# Determine whether a patch contains any file sections for IDL files.
+#
+# @param aPatchData A bytes object containing the diff output to check.
+#
+# @returns True, if at least one 'diff --git' header in aPatchData names a file
+#          ending in '.idl'; False, otherwise.
+def doesPatchTouchIDLFiles(aPatchData):
+    position = aPatchData.find(kFileHeaderToken)
+    while position != -1:
+        endOfLine = aPatchData.find(b"\n", position)
+        if endOfLine == -1:
+            endOfLine = len(aPatchData)
+
+        atStartOfLine = position == 0 or aPatchData[position - 1:position] == b"\n"
+        if atStartOfLine and aPatchData[position:endOfLine].rstrip().endswith(b".idl"):
+            return True
+
+        position = aPatchData.find(kFileHeaderToken, endOfLine)
+
+    return False
+
+
+# Read all of a patch from a file on disk.
+#
+# @param aPath The path of the patch file.
+#
+# @returns A bytes object with the contents of the file, or None, if the file
+#          could not be read (the full checker will report the error).
+def readPatchFile(aPath):
+    try:
+        patchFile = open(aPath, 'rb')
+    except:
+        return None
+
+    chunks = []
+    chunk = patchFile.read(kReadChunkSize)
+    while chunk:
+        chunks.append(chunk)
+        chunk = patchFile.read(kReadChunkSize)
+    patchFile.close()
+
+    return b"".join(chunks)
+
+
+def runHook():
+    positionalArgs = []
+    for arg in sys.argv[1:]:
+        if arg in kFastPathSwitches:
+            continue
+
+        if arg.startswith('-'):
+            positionalArgs = None
+            break
+
+        positionalArgs.append(arg)
+
+    patchData = None
+    if positionalArgs and len(positionalArgs) <= 2:
+        if len(positionalArgs) == 2 and positionalArgs[1] != 'stdin':
+            patchData = readPatchFile(positionalArgs[1])
+            if patchData is not None and not doesPatchTouchIDLFiles(patchData):
+                sys.exit(0)
+
+            # the full checker will re-open the file itself
+            patchData = None
+        else:
+            patchData = sys.stdin.buffer.read()
+            if not doesPatchTouchIDLFiles(patchData):
+                sys.exit(0)
+
+    import checkiid
+    checkiid.exitProcess(checkiid.runMain(patchData))
+
+
+if __name__ == '__main__':
+    runHook()
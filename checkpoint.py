@@ -0,0 +1,88 @@
+import os
+import json
+import time
+
+# Checkpoints of long checks, such as audits of years of history piped in from
+# 'hg log -p' or 'git log -p', so that an interrupted check can be resumed
+# instead of started over.
+#
+# A checkpoint holds the byte offset, in the patch, of the file section at
+# which parsing would continue, along with everything the parser carries over
+# from one IDL file section to the next: the InterfaceResultTable (see
+# InterfaceResultTable.toList()), the missing IDL files and IID changes found
+# so far, and a few counters.
+
+
+# @class CheckpointFile A file in which the state of a check is saved
+#        periodically.
+class CheckpointFile:
+
+    # Version of the on-disk format. Bump this whenever the state saved by
+    # IIDChecker.parsePatch() changes.
+    kFormatVersion = 1
+
+    # Default number of seconds between checkpoints.
+    kDefaultInterval = 60.0
+
+    # Create a new CheckpointFile.
+    #
+    # @param aPath The path of the file.
+    # @param aInterval The minimum number of seconds between checkpoints.
+    def __init__(self, aPath, aInterval=kDefaultInterval):
+        self.mPath = aPath
+        self.mInterval = aInterval
+        self.mLastSaveTime = time.monotonic()
+        self.mResumeState = None
+
+    # @returns The path of the file.
+    def getPath(self):
+        return self.mPath
+
+    # Determine whether it's time to save another checkpoint.
+    def isDue(self):
+        return time.monotonic() - self.mLastSaveTime >= self.mInterval
+
+    # Save a checkpoint, replacing the previous one atomically, so an
+    # interruption while saving leaves the previous checkpoint intact.
+    #
+    # @param aState A dict holding the state, which must be JSON-serializable.
+    def save(self, aState):
+        contents = dict(aState)
+        contents['version'] = self.kFormatVersion
+
+        temporaryPath = self.mPath + ".tmp" + str(os.getpid())
+        checkpointFile = open(temporaryPath, "w")
+        json.dump(contents, checkpointFile)
+        checkpointFile.close()
+        os.replace(temporaryPath, self.mPath)
+        self.mLastSaveTime = time.monotonic()
+
+    # Load the last checkpoint, so that the next check resumes from it (see
+    # getResumeState()).
+    #
+    # @returns True, if a checkpoint was loaded; False, if there is none, or it
+    #          was written by a different version.
+    def loadResumeState(self):
+        try:
+            checkpointFile = open(self.mPath)
+            contents = json.load(checkpointFile)
+            checkpointFile.close()
+        except:
+            return False
+
+        if not isinstance(contents, dict) or contents.get('version') != self.kFormatVersion:
+            return False
+
+        self.mResumeState = contents
+        return True
+
+    # @returns The state loaded by loadResumeState(), or None.
+    def getResumeState(self):
+        return self.mResumeState
+
+    # Delete the checkpoint, once the check it belongs to has finished.
+    def remove(self):
+        try:
+            os.remove(self.mPath)
+        except OSError:
+            pass
@@ -0,0 +1,116 @@
+import io
+import os.path
+import subprocess
+from idlutils import FileContentProvider
+
+# Utilities for retrieving patches and file contents from an hg repository, so
+# that checks can be run against revisions other than the one checked out in
+# the working tree.
+
+
+# @class HgError An error raised when an hg command fails.
+class HgError(Exception):
+    pass
+
+
+# Run an hg command in a given repository.
+#
+# @param aRootPath The path to the root of the hg repository.
+# @param aArgs A list of arguments to pass to hg (not including 'hg' itself).
+#
+# @returns The standard output of the command, as a string.
+#
+# @throws HgError If hg could not be run, or exited with a non-zero status.
+def runHg(aRootPath, aArgs):
+    try:
+        process = subprocess.Popen(['hg', '--cwd', aRootPath] + aArgs,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as error:
+        raise HgError("Unable to run hg: " + str(error))
+
+    (output, errors) = process.communicate()
+    if process.returncode != 0:
+        raise HgError("'hg " + " ".join(aArgs) + "' failed: " + errors.decode('utf-8', 'replace').strip())
+
+    return output.decode('utf-8', 'replace')
+
+
+# Retrieve the changesets that make up a revision range, in order: the
+# ancestors of the end revision (and the end revision itself) that aren't
+# ancestors of the start revision. Those include changesets merged in from
+# branches that forked before the start revision, so between them they make the
+# changes in 'hg diff -r <startrev> -r <endrev>'. Merge changesets are left out,
+# as their diffs against their first parents repeat the changes merged in.
+#
+# @param aRootPath The path to the root of the hg repository.
+# @param aStartRev The revision at which the range starts.
+# @param aEndRev The revision at which the range ends.
+# @param aIncludePattern An optional hg file pattern. If given, only changesets
+#        touching files matching the pattern are returned.
+#
+# @returns A list of changeset ids.
+def getRevisionsInRange(aRootPath, aStartRev, aEndRev, aIncludePattern=None):
+    revset = "sort(only(" + aEndRev + ", " + aStartRev + ") - merge())"
+    args = ['log', '-r', revset, '--template', '{node|short}\n']
+    if aIncludePattern:
+        args = args + ['-I', aIncludePattern]
+
+    output = runHg(aRootPath, args)
+    return [rev for rev in output.splitlines() if rev]
+
+
+# Retrieve the git-style diff of the IDL files changed between two revisions.
+#
+# @param aRootPath The path to the root of the hg repository.
+# @param aStartRev The revision at which the diff starts.
+# @param aEndRev The revision at which the diff ends.
+#
+# @returns A list of the lines of the diff.
+def getIDLDiff(aRootPath, aStartRev, aEndRev):
+    output = runHg(aRootPath, ['diff', '--git', '-r', aStartRev, '-r', aEndRev, '-I', '**.idl'])
+    return output.splitlines(True)
+
+
+# Retrieve the git-style diff of the IDL files changed by a single changeset,
+# against its first parent. ('hg export' takes no file patterns.)
+#
+# @param aRootPath The path to the root of the hg repository.
+# @param aRev The changeset to export.
+#
+# @returns A list of the lines of the diff.
+def exportIDLChanges(aRootPath, aRev):
+    output = runHg(aRootPath, ['diff', '--git', '-c', aRev, '-I', '**.idl'])
+    return output.splitlines(True)
+
+
+# @class HgRevisionContentProvider Provides the contents of files in an hg
+#        repository as of a given revision, rather than from the working tree.
+class HgRevisionContentProvider(FileContentProvider):
+
+    # Create a new HgRevisionContentProvider.
+    #
+    # @param aRootPath The path to the root of the hg repository.
+    # @param aRev The revision at which to read files.
+    def __init__(self, aRootPath, aRev):
+        FileContentProvider.__init__(self, aRootPath)
+        self.mRev = aRev
+
+    # @returns The revision at which files are read.
+    def getRevision(self):
+        return self.mRev
+
+    # Open a file as it was at this provider's revision.
+    #
+    # @param aFilePath The full path of the file (i.e. including the root path).
+    #
+    # @returns A file-like object opened in text mode.
+    #
+    # @throws IOError If the file does not exist at this provider's revision.
+    def openFile(self, aFilePath):
+        relativePath = os.path.relpath(aFilePath, self.getRootPath())
+        try:
+            contents = runHg(self.getRootPath(), ['cat', '-r', self.mRev, relativePath])
+        except HgError as error:
+            raise IOError(str(error))
+
+        return io.StringIO(contents)
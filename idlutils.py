@@ -1,4 +1,7 @@
+import os
 import re
+import bisect
+import threading
 
 # @class IDLDescriptor A descriptor that may be found prefixing an attribute or
 #        method in an IDL interface.
@@ -9,7 +12,8 @@ import re
 #
 # This class also holds a list of all the current descriptors loaded, so that
 # the list can be searched quickly. This list is a singleton (i.e. static)
-# across all IDLDescriptor objects.
+# across all IDLDescriptor objects. Code that needs a registry of its own (such
+# as IIDChecker) can instead pass its own list to the static methods below.
 
 
 class IDLDescriptor:
@@ -76,6 +80,8 @@ class IDLDescriptor:
     # @param aLine The line to check, presumably from an IDL file or patch file.
     # @param aPrinter An optional argument of type PrettyPrinter to route debug
     #        output from this method through.
+    # @param aDescriptorList An optional list of IDLDescriptor objects to check
+    #        against, in place of kDescriptorList.
     #
     # @returns True, if any known IDLDescriptor object in kDescriptorList appears
     #          in aLine (checked by calling isInLine() repeatedly); False, if
@@ -84,8 +90,11 @@ class IDLDescriptor:
     #
     # @note This is a static function, so it should be called as:
     #       IDLDescriptor.hasDescriptorsInLine(...)
-    def hasDescriptorsInLine(aLine, aPrinter=None):
-        for desc in IDLDescriptor.kDescriptorList:
+    def hasDescriptorsInLine(aLine, aPrinter=None, aDescriptorList=None):
+        if aDescriptorList is None:
+            aDescriptorList = IDLDescriptor.kDescriptorList
+
+        for desc in aDescriptorList:
             if desc.isInLine(aLine, aPrinter):
                 return True
         return False
@@ -95,6 +104,8 @@ class IDLDescriptor:
     # @param aLine The line to check, presumably from an IDL file or patch file.
     # @param aPrinter An optional argument of type PrettyPrinter to route debug
     #        output from this method through.
+    # @param aDescriptorList An optional list of IDLDescriptor objects to check
+    #        against, in place of kDescriptorList.
     #
     # @returns True, if hasDescriptorsInLine() returns true for aLine AND one of
     #          the descriptors in kDescriptorList for which isInLine(aLine)
@@ -102,8 +113,11 @@ class IDLDescriptor:
     #
     # @note This is a static function, so it should be called as:
     #       IDLDescriptor.areDescriptorsInLineAffectingBinaryCompat(...)
-    def areDescriptorsInLineAffectingBinaryCompat(aLine, aPrinter=None):
-        for desc in IDLDescriptor.kDescriptorList:
+    def areDescriptorsInLineAffectingBinaryCompat(aLine, aPrinter=None, aDescriptorList=None):
+        if aDescriptorList is None:
+            aDescriptorList = IDLDescriptor.kDescriptorList
+
+        for desc in aDescriptorList:
             if desc.isInLine(aLine, aPrinter) and desc.affectsBinaryCompatibility:
                 if aPrinter:
                     aPrinter.debug("Descriptor: " + desc.getToken() + " affects binary compatibility.")
@@ -117,94 +131,202 @@ class IDLDescriptor:
     hasDescriptorsInLine = staticmethod(hasDescriptorsInLine)
 
 
-# @class SpecialBlockType An object representing a type of special block. A
-#        special block is a section of code that needs to be interpreted
-#        differently than other code. A comment block is an example of a special
-#        block.
+# @class LineStateMap The state of each line of an IDL file, as determined by an
+#        IDLLexer: whether the line holds IDL code, is entirely within a comment,
+#        is entirely within a C++ block ('%{C++' ... '%}'), or holds code along
+#        with a comment or C++ block.
 #
-#        Each special block type consists of two strings: the string token
-#        identifying the start of the block (e.g. "/*" for a comment block)
-#        and a string token identifying the end of the block (e.g. "*/" for a
-#        comment block).
-class SpecialBlockType:
-
-    # Create a new special block type with a given start and end token.
-    #
-    # @param aStartToken The string that indicates the start of the special block
-    #        of the new type.
-    # @param aEndToken The string that indicates the end of the special block of
-    #        the new type.
-    def __init__(self, aStartToken, aEndToken):
-        self.mStartToken = aStartToken
-        self.mEndToken = aEndToken
-
-    # Retrieve the string representing the start token of the special block.
-    def getStartToken(self):
-        return self.mStartToken
-
-    # Retrieve the string representing the end token of the special block.
-    def getEndToken(self):
-        return self.mEndToken
-
-    # Convert this special block type to a string. This is used for debugging
-    # output, mostly.
-    def __str__(self):
-        return "[SpecialBlockType (" + str(self.mStartToken) + ")]"
+# States are stored one byte per line, so the map stays small even for very
+# large files.
+class LineStateMap:
 
-    # Compare one special block type to another.
+    # The possible states of a line.
+    kCode = 0
+    kComment = 1
+    kCpp = 2
+    kMixed = 3
+
+    # Create a new LineStateMap.
     #
-    # @param aOther Another object of type SpecialBlockType to compare to.
+    # @param aStates A bytearray holding the state of each line, where the state
+    #        of line n (starting at 1) is at index n - 1.
+    # @param aCharacterCount The number of characters in the file.
+    def __init__(self, aStates, aCharacterCount=0):
+        self.mStates = aStates
+        self.mCharacterCount = aCharacterCount
+
+    # @returns The number of characters in the file.
+    def getCharacterCount(self):
+        return self.mCharacterCount
+
+    # @returns The number of lines in the file.
+    def getLineCount(self):
+        return len(self.mStates)
+
+    # @returns The bytearray holding the state of each line, where the state of
+    #          line n (starting at 1) is at index n - 1.
+    def getStates(self):
+        return self.mStates
+
+    # Retrieve the state of a line.
     #
-    # @returns True, if and only if both the start token and the end token are
-    #          equal between this SpecialBlockType and aOther; False, otherwise.
-    def __equals__(self, aOther):
-        if self.mStartToken == aOther.mStartToken and self.mEndToken == aOther.mEndToken:
-            return True
-        return False
-
-    # Determines whether a line is the start of an IDL block that requires special
-    # handling (e.g. a comment or language specific code block).
+    # @param aLineNo The line number, starting at 1.
     #
-    # @param aLine The line to check
+    # @returns One of kCode, kComment, kCpp or kMixed. Lines outside the file are
+    #          reported as kCode.
+    def getState(self, aLineNo):
+        if aLineNo < 1 or aLineNo > len(self.mStates):
+            return self.kCode
+        return self.mStates[aLineNo - 1]
+
+    # Determine whether a line is entirely within a special block (a comment or a
+    # C++ block), so that changing it can't change the interface.
     #
-    # @returns True, if the line is the start of an IDL block of a given type,
-    #          False otherwise
-    def isStartOfSpecialBlock(self, aLine):
-        # a line is a start of a block comment if it has the start token at the
-        # beginning of the line
-        match = re.match("^(\s)*" + self.mStartToken, aLine)
-        if match:
-            return True
-        return False
+    # @param aLineNo The line number, starting at 1.
+    def isSpecialLine(self, aLineNo):
+        state = self.getState(aLineNo)
+        return state == self.kComment or state == self.kCpp
 
-    # Determines whether a line contains a block of this SpecialBlockType
-    # completely within it.
+    # Build the SpecialBlockRange objects for this map: one for each run of
+    # consecutive lines that are entirely within special blocks.
     #
-    # @param aLine The line to check.
+    # @param aFilePath The path of the file the map describes.
     #
-    # @returns True, if aLine contains both the start and end of this
-    #          SpecialBlockType; False, otherwise.
-    def containsSpecialBlock(self, aLine):
-        match = re.match("^(\s)*(.*)" + self.mStartToken + "(.*)" + self.mEndToken + "(\s)*(.*)", aLine)
-        if match:
-            return True
-        return False
+    # @returns A list of SpecialBlockRange objects, in order.
+    def getRanges(self, aFilePath):
+        ranges = []
+        startLine = None
+        lineNo = 0
+        for state in self.mStates:
+            lineNo = lineNo + 1
+            isSpecial = state == self.kComment or state == self.kCpp
+            if isSpecial and startLine is None:
+                startLine = lineNo
+            elif not isSpecial and startLine is not None:
+                ranges.append(SpecialBlockRange(startLine, lineNo - 1, aFilePath))
+                startLine = None
+
+        if startLine is not None:
+            ranges.append(SpecialBlockRange(startLine, lineNo, aFilePath))
+
+        return ranges
 
-    # Determines whether a line is the end of an IDL block that requires special
-    # handling (e.g. a comment or language specific code block)
+
+# @class IDLLexer A state machine that classifies each line of an IDL file in a
+#        single pass over its characters.
+#
+# The lexer knows about block comments ('/*' ... '*/'), line comments ('//') and
+# C++ blocks ('%{' ... '%}'). Blocks may start and end anywhere within a line,
+# several may appear on the same line, and comment tokens inside a C++ block
+# (or C++ block tokens inside a comment) are ignored, as they are by xpidl.
+class IDLLexer:
+
+    # The states the lexer can be in between tokens.
+    kInCode = 0
+    kInComment = 1
+    kInCpp = 2
+
+    # Create a new IDLLexer.
     #
-    # @param aLine The line to check
+    # @param aKeepCode True, if the code of each line (the text outside of
+    #        comments and C++ blocks) should be kept for getLastCode().
+    def __init__(self, aKeepCode=False):
+        self.mState = self.kInCode
+        self.mStates = bytearray()
+        self.mCharacterCount = 0
+        self.mKeepCode = aKeepCode
+        self.mLastCode = ""
+
+    # Classify the next line of the file.
     #
-    # @returns True, if the line is the end of an IDL block of a given type,
-    #          False otherwise
-    def isEndOfSpecialBlock(self, aLine):
-        # a line is the end of a block comment if it has */ at the
-        # end of the line
-        regex = "(.*)" + self.mEndToken + "(\s)*$"
-        match = re.match(regex, aLine)
-        if match:
-            return True
-        return False
+    # @param aLine The text of the line.
+    #
+    # @returns The LineStateMap state of the line.
+    def addLine(self, aLine):
+        self.mCharacterCount = self.mCharacterCount + len(aLine)
+        line = aLine.rstrip("\r\n")
+        stateAtStart = self.mState
+        hasCode = False
+        hasComment = False
+        hasCpp = False
+        position = 0
+        length = len(line)
+        codeSegments = []
+
+        while position < length:
+            if self.mState == self.kInComment:
+                hasComment = True
+                end = line.find("*/", position)
+                if end == -1:
+                    break
+                position = end + 2
+                self.mState = self.kInCode
+            elif self.mState == self.kInCpp:
+                hasCpp = True
+                end = line.find("%}", position)
+                if end == -1:
+                    break
+                position = end + 2
+                self.mState = self.kInCode
+            else:
+                # find whichever token comes first
+                token = None
+                tokenStart = length
+                for candidate in ("/*", "//", "%{"):
+                    candidateStart = line.find(candidate, position, tokenStart + 1)
+                    if candidateStart != -1:
+                        token = candidate
+                        tokenStart = candidateStart
+
+                if not hasCode and line[position:tokenStart].strip():
+                    hasCode = True
+
+                if self.mKeepCode:
+                    codeSegments.append(line[position:tokenStart])
+
+                if token is None:
+                    break
+                elif token == "//":
+                    hasComment = True
+                    break
+                elif token == "/*":
+                    hasComment = True
+                    self.mState = self.kInComment
+                else:
+                    hasCpp = True
+                    self.mState = self.kInCpp
+                position = tokenStart + 2
+
+        if hasCode and (hasComment or hasCpp):
+            state = LineStateMap.kMixed
+        elif hasCpp:
+            state = LineStateMap.kCpp
+        elif hasComment:
+            state = LineStateMap.kComment
+        elif hasCode:
+            state = LineStateMap.kCode
+        elif stateAtStart == self.kInComment:
+            state = LineStateMap.kComment
+        elif stateAtStart == self.kInCpp:
+            state = LineStateMap.kCpp
+        else:
+            state = LineStateMap.kCode
+
+        if self.mKeepCode:
+            self.mLastCode = " ".join(codeSegments)
+
+        self.mStates.append(state)
+        return state
+
+    # @returns The code of the last line added, with its comments and C++ blocks
+    #          removed, if the lexer was created to keep it; otherwise, an empty
+    #          string.
+    def getLastCode(self):
+        return self.mLastCode
+
+    # @returns A LineStateMap of all lines added to the lexer.
+    def getLineStates(self):
+        return LineStateMap(self.mStates, self.mCharacterCount)
 
 
 # A SpecialBlockRange is composed of two numerals indicating lines at which
@@ -215,13 +337,18 @@ class SpecialBlockType:
 # Block comment range: StartingToken: /*, Ending token: */
 # C++-specific range: Starting token {%C++, Ending token: %}
 #
-# @todo Currently, SpecialBlockRange objects only operate on lines of a file,
-#       not on individual chracters within a line. It should be modified to
-#       be more granular in the future.
+# Ranges are built from the LineStateMap of a file, which IDLLexer computes at
+# the level of characters: a range covers a run of lines that lie entirely
+# within special blocks. Lines that mix code with a special block are never part
+# of a range.
 class SpecialBlockRange:
 
-    # A mapping of file paths to special block range objects.
-    kFilePathToCommentRangeMap = {}
+    # The cache used by the static getRangesForFilePath(),
+    # prefetchRangesForFilePath() and findAllSpecialBlocksForFile() methods. This
+    # is shared by everything in the process that uses those methods; code that
+    # needs caches of its own (e.g. IIDChecker) should create a
+    # SpecialBlockRangeCache instead.
+    kDefaultCache = None
 
     # Create a new object of type SpecialBlockRange.
     #
@@ -265,21 +392,29 @@ class SpecialBlockRange:
     def getFilePath(self):
         return self.mFilePath
 
-    # Create a set of objects representing ranges in a given IDL file.
+    # Create a set of objects representing ranges in a given IDL file, using the
+    # shared default cache.
     #
-    # @param aFilePath The location on disk of the IDL file for which to construct
-    #        ranges of special blocks.
-    # @param aPrinter An optional argument of type PrettyPrinter to route debug
-    #        output from this method through.
+    # @see SpecialBlockRangeCache.getRangesForFilePath
     def getRangesForFilePath(aFilePath, aPrinter=None):
-        if aFilePath not in SpecialBlockRange.kFilePathToCommentRangeMap:
-            SpecialBlockRange.findAllSpecialBlocksForFile(aFilePath, aPrinter)
+        return SpecialBlockRange.kDefaultCache.getRangesForFilePath(aFilePath, aPrinter)
 
-        return SpecialBlockRange.kFilePathToCommentRangeMap[aFilePath]
+    # Start scanning a file for special blocks in the background, using the
+    # shared default cache.
+    #
+    # @see SpecialBlockRangeCache.prefetchRangesForFilePath
+    def prefetchRangesForFilePath(aFilePath, aPrinter=None):
+        SpecialBlockRange.kDefaultCache.prefetchRangesForFilePath(aFilePath, aPrinter)
 
-    # Find all the special block ranges for a file, given the file path.aFilePath
-    # This method does not return anything, instead it populates the
-    # SpecialBlockRange.kFilePathToCommentRangeMap static member variable.
+    # Find all the special block ranges for a file, and store them in the shared
+    # default cache.
+    #
+    # @see SpecialBlockRangeCache.findAllSpecialBlocksForFile
+    def findAllSpecialBlocksForFile(aFilePath, aPrinter=None):
+        SpecialBlockRange.kDefaultCache.findAllSpecialBlocksForFile(aFilePath, aPrinter)
+
+    # Read a file and collect all of its special block ranges, without touching
+    # any cache. This is safe to call from a worker thread.
     #
     # This will raise an IOError if aFilePath cannot be found. This usually only
     # happens if the hg repository is in a different state/commit than what the
@@ -289,87 +424,600 @@ class SpecialBlockRange:
     #        check.
     # @param aPrinter An optional argument of type PrettyPrinter to route debug
     #        output from this method through.
-    def findAllSpecialBlocksForFile(aFilePath, aPrinter=None):
-
-        aPrinter.debug("Starting findAllSpecialBlocksForFile")
-
-        if aFilePath not in SpecialBlockRange.kFilePathToCommentRangeMap.keys():
-            SpecialBlockRange.kFilePathToCommentRangeMap[aFilePath] = []
-
-        parseFile = open(aFilePath)
+    # @param aContentProvider An optional FileContentProvider used to open
+    #        aFilePath. If not given, the file is read from disk.
+    # @param aInterfaceIndex An optional InterfaceSpanIndex, which is filled in
+    #        with the interfaces of aFilePath during the same pass over the file.
+    #
+    # @returns A list of SpecialBlockRange objects for aFilePath.
+    def scanSpecialBlocksForFile(aFilePath, aPrinter=None, aContentProvider=None, aInterfaceIndex=None):
+        lineStates = SpecialBlockRange.lexFile(aFilePath, aPrinter, aContentProvider, aInterfaceIndex)
+        return lineStates.getRanges(aFilePath)
 
+    # Read a file and classify each of its lines with an IDLLexer, without
+    # touching any cache. This is safe to call from a worker thread.
+    #
+    # This will raise an IOError if aFilePath cannot be found.
+    #
+    # @param aFilePath A string representing the path on disk of the file to
+    #        check.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    # @param aContentProvider An optional FileContentProvider used to open
+    #        aFilePath. If not given, the file is read from disk.
+    # @param aInterfaceIndex An optional InterfaceSpanIndex, which is filled in
+    #        with the interfaces of aFilePath during the same pass over the file.
+    #
+    # @returns A LineStateMap for aFilePath.
+    def lexFile(aFilePath, aPrinter=None, aContentProvider=None, aInterfaceIndex=None):
+        if aContentProvider:
+            parseFile = aContentProvider.openFile(aFilePath)
+        else:
+            parseFile = open(aFilePath)
+
+        lexer = IDLLexer(aInterfaceIndex is not None)
         lineNo = 0
-        commentType = SpecialBlockType("\/\*", "\*\/")
-        cppType = SpecialBlockType("\%{\s*C\+\+", "\%\}")
-
-        # This is a stack of (SpecialBlockType, integer) tuples that represents
-        # the last type seen along with the line number at which it was seen, so
-        # we can correctly handle nested types.
-        blockStack = []
 
         # for each line in the file path
         for line in parseFile:
             lineNo = lineNo + 1
 
-            # if the line contains a comment block, then we just ignore it right now
-            # because we're not smart enough to handle offsets within a comment block.
-            if commentType.containsSpecialBlock(line):
-                aPrinter.debug("(" + aFilePath + ", Line " + str(lineNo) + "): A comment block starts and ends on this line.")
-                continue
+            lexer.addLine(line)
 
-            # if the line is the start of a special block range, document it
-            if (commentType.isStartOfSpecialBlock(line)):
-                aPrinter.debug("Pushing to stack: " + str(commentType) + ", lastLineNo: " + str(lineNo))
+            if aInterfaceIndex is not None:
+                aInterfaceIndex.addLine(lineNo, line, lexer.getLastCode())
 
-                blockStack.append((commentType, lineNo))
+        parseFile.close()
 
-            # if the line is the end of a block comment, create a SpecialBlockRange
-            # and add it to the map
-            if (commentType.isEndOfSpecialBlock(line)):
-                if len(blockStack) == 0:
-                    aPrinter.debug("(" + aFilePath + ", Line " + str(lineNo) + "): An error occurred while trying to pop from the stack.")
+        if aInterfaceIndex is not None:
+            aInterfaceIndex.finish(lineNo)
 
-                    # Right now, we just skip this line because we don't know what to do with it otherwise.
-                    # Once Ticket #90 (http://www.glasstowerstudios.com/trac/JMozTools/ticket/90)
-                    # is fixed, we can do something more intelligent here.
-                    continue
+        if aPrinter:
+            aPrinter.debug("(" + aFilePath + "): Classified " + str(lineNo) + " lines.")
 
-                (lastSeenType, lastLineNo) = blockStack.pop()
+        return lexer.getLineStates()
 
-                aPrinter.debug("Popped from stack. Last seen type: " + str(lastSeenType) + ", lastLineNo: " + str(lastLineNo))
+    # Make the getRanges and findAllComments methods static.
+    findAllSpecialBlocksForFile = staticmethod(findAllSpecialBlocksForFile)
+    scanSpecialBlocksForFile = staticmethod(scanSpecialBlocksForFile)
+    lexFile = staticmethod(lexFile)
+    getRangesForFilePath = staticmethod(getRangesForFilePath)
+    prefetchRangesForFilePath = staticmethod(prefetchRangesForFilePath)
 
-                if lastSeenType == commentType:
-                    blockRange = SpecialBlockRange(lastLineNo, lineNo, aFilePath)
-                    SpecialBlockRange.kFilePathToCommentRangeMap[aFilePath].append(blockRange)
-                else:
-                    aPrinter.debug("Pushing to stack: " + str(lastSeenType) + ", lastLineNo: " + str(lastLineNo))
 
-                    blockStack.push((lastSeenType, lastLineNo))
+# @class InterfaceSpan The location of a single interface definition within an
+#        IDL file.
+#
+# An InterfaceSpan records the name of the interface, the line with its uuid(...)
+# annotation (if one was seen), the line on which the interface is defined, and
+# the line on which its body ends. All line numbers start at 1.
+class InterfaceSpan:
 
-            # if the line is the start of a cpp-specific code block
-            if cppType.isStartOfSpecialBlock(line):
+    # Create a new InterfaceSpan.
+    #
+    # @param aName The name of the interface.
+    # @param aUUIDLine The line number of the uuid(...) annotation for the
+    #        interface, or None, if none was seen.
+    # @param aStartLine The line number of the interface definition line.
+    # @param aEndLine The line number of the end of the interface's body.
+    def __init__(self, aName, aUUIDLine, aStartLine, aEndLine):
+        self.mName = aName
+        self.mUUIDLine = aUUIDLine
+        self.mStartLine = aStartLine
+        self.mEndLine = aEndLine
 
-                aPrinter.debug("Pushing to stack: " + str(cppType) + ", lastLineNo: " + str(lineNo))
+    def __str__(self):
+        return "[InterfaceSpan " + str(self.mName) + " (" + str(self.mStartLine) + ", " + str(self.mEndLine) + ")]"
 
-                blockStack.append((cppType, lineNo))
+    # An InterfaceSpan CONTAINS a line number, l, iff l lies between its uuid
+    # line (or definition line, if there is no uuid line) and its end line.
+    def __contains__(self, x):
+        start = self.mStartLine
+        if self.mUUIDLine:
+            start = self.mUUIDLine
+        return x >= start and x <= self.mEndLine
 
-            if cppType.isEndOfSpecialBlock(line):
-                if len(blockStack) == 0:
-                    aPrinter.debug("(" + aFilePath + ", Line " + str(lineNo) + "): An error occurred while trying to pop from the stack.")
+    # @returns The name of the interface.
+    def getName(self):
+        return self.mName
 
-                (lastSeenType, lastLineNo) = blockStack.pop()
+    # @returns The line number of the uuid(...) annotation of the interface, or
+    #          None, if none was seen.
+    def getUUIDLine(self):
+        return self.mUUIDLine
 
-                aPrinter.debug("Popped from stack. Last seen type: " + str(lastSeenType) + ", lastLineNo: " + str(lastLineNo))
+    # @returns The line number of the interface definition line.
+    def getStartLine(self):
+        return self.mStartLine
 
-                if lastSeenType == cppType:
-                    blockRange = SpecialBlockRange(lastLineNo, lineNo, aFilePath)
-                    SpecialBlockRange.kFilePathToCommentRangeMap[aFilePath].append(blockRange)
-                else:
-                    aPrinter.debug("Pushing to stack: " + str(lastSeenType) + ", lastLineNo: " + str(lastLineNo))
-                    blockStack.push((lastSeenType, lastLineNo))
+    # @returns The line number of the end of the interface's body.
+    def getEndLine(self):
+        return self.mEndLine
 
-        parseFile.close()
 
-    # Make the getRanges and findAllComments methods static.
-    findAllSpecialBlocksForFile = staticmethod(findAllSpecialBlocksForFile)
-    getRangesForFilePath = staticmethod(getRangesForFilePath)
+# @class InterfaceSpanIndex An index of the interfaces defined in an IDL file.
+#
+# The index is filled in one line at a time by
+# SpecialBlockRange.scanSpecialBlocksForFile(), during the same pass over the
+# file that finds the special block ranges, so the file text never needs to be
+# read again to answer questions about which interfaces are where.
+class InterfaceSpanIndex:
+
+    def __init__(self):
+        # InterfaceSpan objects, in the order in which they're defined.
+        self.mSpans = []
+
+        # The start lines of the objects in mSpans, for bisection.
+        self.mStartLines = []
+
+        # The text of each line of the file, for isNameMentionedInLines().
+        self.mLines = []
+
+        # The number of lines in the file, once finish() has been called.
+        self.mLineCount = 0
+
+        # State used while the index is being filled in.
+        self.mLastUUIDLine = None
+        self.mOpenSpan = None
+        self.mBraceDepth = 0
+        self.mSeenOpenBrace = False
+
+    # Add a line of the IDL file to the index. Lines must be added in order.
+    #
+    # @param aLineNo The line number of aLine, starting at 1.
+    # @param aLine The text of the line.
+    # @param aCode The code of the line, with its comments and C++ blocks
+    #        removed (see IDLLexer.getLastCode()), so that braces and
+    #        declarations within them aren't counted.
+    def addLine(self, aLineNo, aLine, aCode):
+        self.mLines.append(aLine)
+
+        if "uuid(" in aCode:
+            self.mLastUUIDLine = aLineNo
+
+        if "interface" in aCode:
+            match = re.match("^(\s)*interface(\s)+([A-Za-z0-9_]+)", aCode)
+            if match and not self.mOpenSpan and not aCode.rstrip().endswith(';'):
+                self.mOpenSpan = InterfaceSpan(match.group(3), self.mLastUUIDLine, aLineNo, aLineNo)
+                self.mBraceDepth = 0
+                self.mSeenOpenBrace = False
+                self.mLastUUIDLine = None
+
+        if self.mOpenSpan:
+            opening = aCode.count("{")
+            if opening:
+                self.mSeenOpenBrace = True
+            self.mBraceDepth = self.mBraceDepth + opening - aCode.count("}")
+
+            if self.mSeenOpenBrace and self.mBraceDepth <= 0:
+                self.closeOpenSpan(aLineNo)
+
+    # Close the interface span currently being filled in, if there is one.
+    def closeOpenSpan(self, aEndLine):
+        if not self.mOpenSpan:
+            return
+
+        self.mOpenSpan.mEndLine = aEndLine
+        self.mSpans.append(self.mOpenSpan)
+        self.mStartLines.append(self.mOpenSpan.getStartLine())
+        self.mOpenSpan = None
+
+    # Indicate that all lines of the file have been added.
+    #
+    # @param aLineCount The number of lines in the file.
+    def finish(self, aLineCount):
+        self.mLineCount = aLineCount
+        self.closeOpenSpan(aLineCount)
+
+    # @returns The number of lines in the indexed file.
+    def getLineCount(self):
+        return self.mLineCount
+
+    # @returns A list of all InterfaceSpan objects in the file, in order.
+    def getSpans(self):
+        return self.mSpans
+
+    # Find the interface whose definition encloses a given line.
+    #
+    # @param aLineNo The line number to look up.
+    #
+    # @returns The InterfaceSpan containing aLineNo, or None, if the line is not
+    #          within any interface.
+    def getEnclosingInterface(self, aLineNo):
+        # the uuid line comes before the definition line, so also consider the
+        # span that starts just after aLineNo
+        position = bisect.bisect_right(self.mStartLines, aLineNo)
+        for candidate in (position - 1, position):
+            if candidate >= 0 and candidate < len(self.mSpans) and aLineNo in self.mSpans[candidate]:
+                return self.mSpans[candidate]
+        return None
+
+    # Determine whether an interface name appears anywhere in the text of the
+    # lines between two lines, including in comments and as part of a longer
+    # name.
+    #
+    # @param aName The interface name to look for.
+    # @param aStartLine The first line to consider.
+    # @param aEndLine The last line to consider.
+    #
+    # @returns True, if aName appears on a line in [aStartLine, aEndLine];
+    #          False, otherwise.
+    def isNameMentionedInLines(self, aName, aStartLine, aEndLine):
+        for line in self.mLines[max(aStartLine, 1) - 1:aEndLine]:
+            if aName in line:
+                return True
+        return False
+
+
+# @class SpecialBlockRangeCache A thread-safe cache of the special block ranges
+#        found in IDL files, keyed by file path.
+#
+# Files can be scanned on demand (getRangesForFilePath), or ahead of time on a
+# pool of worker threads (prefetchRangesForFilePath). A single cache may be
+# shared by several IIDChecker objects working on the same repository.
+class SpecialBlockRangeCache:
+
+    # Number of files that may be read and scanned concurrently while prefetching.
+    kPrefetchWorkers = 8
+
+    # Create a new, empty SpecialBlockRangeCache.
+    #
+    # @param aContentProvider An optional FileContentProvider through which files
+    #        are read. If not given, files are read straight from disk.
+    def __init__(self, aContentProvider=None):
+        self.mContentProvider = aContentProvider
+
+        # A mapping of file paths to lists of SpecialBlockRange objects.
+        self.mFilePathToRangeMap = {}
+
+        # A mapping of file paths to InterfaceSpanIndex objects, filled in by the
+        # same scans.
+        self.mFilePathToInterfaceIndexMap = {}
+
+        # A mapping of file paths to LineStateMap objects, from which the ranges
+        # above are built.
+        self.mFilePathToLineStateMap = {}
+
+        # A mapping of file paths to the errors raised while trying to read them.
+        self.mFilePathToScanErrorMap = {}
+
+        # A mapping of file paths to scans that have been started in the
+        # background, but not yet picked up.
+        self.mFilePathToPendingScanMap = {}
+
+        # Lock guarding the maps above, since prefetched scans complete on
+        # worker threads.
+        self.mLock = threading.Lock()
+
+        # Statistics: the number of lookups answered from the cache, the number
+        # that had to wait for a file to be scanned, and the number of characters
+        # read while scanning files.
+        self.mHits = 0
+        self.mMisses = 0
+        self.mCharactersRead = 0
+
+        # Thread pool used for prefetching, created lazily on first use.
+        self.mPrefetchPool = None
+        self.mPrefetchingCancelled = False
+
+    # Retrieve the list of special block ranges in a given IDL file, scanning the
+    # file if it hasn't been scanned already.
+    #
+    # If a scan of aFilePath was started by prefetchRangesForFilePath(), this
+    # waits for that scan to complete rather than starting a new one. Any IOError
+    # raised while reading the file is re-raised here, and again on every later
+    # call for the same file (without trying to read it again).
+    #
+    # @param aFilePath The location on disk of the IDL file for which to construct
+    #        ranges of special blocks.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    #
+    # @returns A list of SpecialBlockRange objects.
+    def getRangesForFilePath(self, aFilePath, aPrinter=None):
+        self.ensureFileScanned(aFilePath, aPrinter)
+        return self.mFilePathToRangeMap[aFilePath]
+
+    # Retrieve the state of each line in a given IDL file, scanning the file if it
+    # hasn't been scanned already.
+    #
+    # As with getRangesForFilePath(), any IOError raised while reading the file
+    # is re-raised here.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    #
+    # @returns A LineStateMap.
+    def getLineStatesForFilePath(self, aFilePath, aPrinter=None):
+        self.ensureFileScanned(aFilePath, aPrinter)
+        return self.mFilePathToLineStateMap[aFilePath]
+
+    # Retrieve the index of interfaces defined in a given IDL file, scanning the
+    # file if it hasn't been scanned already.
+    #
+    # As with getRangesForFilePath(), any IOError raised while reading the file
+    # is re-raised here.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    #
+    # @returns An InterfaceSpanIndex.
+    def getInterfaceIndexForFilePath(self, aFilePath, aPrinter=None):
+        self.ensureFileScanned(aFilePath, aPrinter)
+        return self.mFilePathToInterfaceIndexMap[aFilePath]
+
+    # Make sure a file has been scanned and its results stored in this cache,
+    # either by picking up a prefetched scan or by scanning the file now.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    def ensureFileScanned(self, aFilePath, aPrinter=None):
+        with self.mLock:
+            if aFilePath in self.mFilePathToRangeMap:
+                self.mHits = self.mHits + 1
+                return
+            if aFilePath in self.mFilePathToScanErrorMap:
+                self.mHits = self.mHits + 1
+                raise self.mFilePathToScanErrorMap[aFilePath]
+            self.mMisses = self.mMisses + 1
+            pendingScan = self.mFilePathToPendingScanMap.pop(aFilePath, None)
+
+        if not pendingScan:
+            self.findAllSpecialBlocksForFile(aFilePath, aPrinter)
+            return
+
+        try:
+            scanResult = pendingScan.result()
+        except Exception as error:
+            with self.mLock:
+                self.mFilePathToScanErrorMap.setdefault(aFilePath, error)
+            raise
+
+        with self.mLock:
+            if aFilePath not in self.mFilePathToRangeMap:
+                self.storeScanResult(aFilePath, scanResult)
+
+    # Store the result of a scan. The caller must hold mLock.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aScanResult The tuple returned by scanFile().
+    def storeScanResult(self, aFilePath, aScanResult):
+        (ranges, interfaceIndex, lineStates) = aScanResult
+        self.mFilePathToRangeMap[aFilePath] = ranges
+        self.mFilePathToInterfaceIndexMap[aFilePath] = interfaceIndex
+        self.mFilePathToLineStateMap[aFilePath] = lineStates
+        self.mCharactersRead = self.mCharactersRead + lineStates.getCharacterCount()
+
+    # Determine whether a file's scan is complete, so that getRangesForFilePath()
+    # and getInterfaceIndexForFilePath() can answer for it without waiting.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    #
+    # @returns True, if the file has been scanned (or failed to be read); False,
+    #          if it hasn't been, or its prefetched scan is still running.
+    def isFileScanned(self, aFilePath):
+        with self.mLock:
+            if aFilePath in self.mFilePathToRangeMap or aFilePath in self.mFilePathToScanErrorMap:
+                return True
+            pendingScan = self.mFilePathToPendingScanMap.get(aFilePath)
+            return pendingScan is not None and pendingScan.done()
+
+    # Wait for a prefetched scan of a file to complete.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aTimeout The maximum number of seconds to wait.
+    #
+    # @returns True, if the file's scan is complete; False, if it wasn't done in
+    #          time, or no scan of the file was started.
+    def waitForFileScan(self, aFilePath, aTimeout):
+        with self.mLock:
+            pendingScan = self.mFilePathToPendingScanMap.get(aFilePath)
+        if pendingScan is None:
+            return self.isFileScanned(aFilePath)
+
+        from concurrent.futures import wait
+        wait([pendingScan], timeout=max(aTimeout, 0))
+        return pendingScan.done()
+
+    # Read a file and collect its line states, special block ranges and interface
+    # index in a single pass, without storing anything in this cache.
+    #
+    # @param aFilePath The location on disk of the IDL file.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    #
+    # @returns A tuple, (ranges, interfaceIndex, lineStates), of the list of
+    #          SpecialBlockRange objects, the InterfaceSpanIndex and the
+    #          LineStateMap for aFilePath.
+    def scanFile(self, aFilePath, aPrinter=None):
+        interfaceIndex = InterfaceSpanIndex()
+        lineStates = SpecialBlockRange.lexFile(aFilePath, aPrinter, self.mContentProvider, interfaceIndex)
+        return (lineStates.getRanges(aFilePath), interfaceIndex, lineStates)
+
+    # Start reading and scanning a file for special blocks in the background, so
+    # that a later call to getRangesForFilePath() does not have to wait on disk
+    # I/O. Calling this more than once for the same file, or for a file that has
+    # already been scanned, does nothing.
+    #
+    # @param aFilePath The location on disk of the IDL file to scan.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    def prefetchRangesForFilePath(self, aFilePath, aPrinter=None):
+        if not aFilePath:
+            return
+
+        with self.mLock:
+            if aFilePath in self.mFilePathToRangeMap:
+                return
+
+            if aFilePath in self.mFilePathToPendingScanMap or self.mPrefetchingCancelled:
+                return
+
+            if not self.mPrefetchPool:
+                from concurrent.futures import ThreadPoolExecutor
+                self.mPrefetchPool = ThreadPoolExecutor(max_workers=self.kPrefetchWorkers)
+
+            pendingScan = self.mPrefetchPool.submit(self.scanFile, aFilePath, aPrinter)
+            self.mFilePathToPendingScanMap[aFilePath] = pendingScan
+
+    # Find all the special block ranges for a file, given the file path.
+    # This method does not return anything, instead it populates this cache.
+    #
+    # This will raise an IOError if aFilePath cannot be found.
+    #
+    # @param aFilePath A string representing the path on disk of the file to
+    #        check.
+    # @param aPrinter An optional argument of type PrettyPrinter to route debug
+    #        output from this method through.
+    def findAllSpecialBlocksForFile(self, aFilePath, aPrinter=None):
+
+        aPrinter.debug("Starting findAllSpecialBlocksForFile")
+
+        try:
+            scanResult = self.scanFile(aFilePath, aPrinter)
+        except Exception as error:
+            with self.mLock:
+                self.mFilePathToScanErrorMap[aFilePath] = error
+            raise
+
+        with self.mLock:
+            self.storeScanResult(aFilePath, scanResult)
+
+    # Forget everything known about a given file, so that it is scanned again the
+    # next time it's needed.
+    #
+    # @param aFilePath The location on disk of the IDL file to forget.
+    def invalidate(self, aFilePath):
+        with self.mLock:
+            self.mFilePathToRangeMap.pop(aFilePath, None)
+            self.mFilePathToInterfaceIndexMap.pop(aFilePath, None)
+            self.mFilePathToLineStateMap.pop(aFilePath, None)
+            self.mFilePathToScanErrorMap.pop(aFilePath, None)
+            self.mFilePathToPendingScanMap.pop(aFilePath, None)
+
+    # Cancel all prefetched scans that haven't started yet, and stop accepting
+    # new ones. Scans that are already running are left to finish on their own.
+    def cancelPrefetches(self):
+        with self.mLock:
+            pool = self.mPrefetchPool
+            self.mFilePathToPendingScanMap = {}
+            self.mPrefetchingCancelled = True
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # @returns A tuple, (hits, misses, charactersRead), of the number of lookups
+    #          answered from this cache, the number that had to wait for a file to
+    #          be scanned, and the number of characters of files scanned.
+    def getStatistics(self):
+        with self.mLock:
+            return (self.mHits, self.mMisses, self.mCharactersRead)
+
+    # @returns The number of files for which ranges are currently cached.
+    def __len__(self):
+        with self.mLock:
+            return len(self.mFilePathToRangeMap)
+
+
+SpecialBlockRange.kDefaultCache = SpecialBlockRangeCache()
+
+
+# @class FileContentProvider Provides the contents of files in a repository.
+#
+# The default implementation reads files from the working tree on disk. Other
+# implementations (e.g. one reading files at a given hg revision) can be passed
+# to IIDChecker or SpecialBlockRangeCache in its place.
+class FileContentProvider:
+
+    # Create a new FileContentProvider.
+    #
+    # @param aRootPath The path to the root of the repository.
+    def __init__(self, aRootPath):
+        self.mRootPath = aRootPath
+
+    # @returns The path to the root of the repository.
+    def getRootPath(self):
+        return self.mRootPath
+
+    # Open a file for reading.
+    #
+    # This will raise an IOError if the file cannot be found.
+    #
+    # @param aFilePath The full path of the file (i.e. including the root path).
+    #
+    # @returns A file object opened in text mode.
+    def openFile(self, aFilePath):
+        return open(aFilePath)
+
+    # Read all of the lines of a file.
+    #
+    # @param aFilePath The full path of the file (i.e. including the root path).
+    #
+    # @returns A list of the lines in the file.
+    def readLines(self, aFilePath):
+        fileToRead = self.openFile(aFilePath)
+        lines = fileToRead.readlines()
+        fileToRead.close()
+        return lines
+
+    # Read the raw contents of a file.
+    #
+    # This will raise an IOError if the file cannot be found.
+    #
+    # @param aFilePath The full path of the file (i.e. including the root path).
+    #
+    # @returns A bytes object.
+    def readBytes(self, aFilePath):
+        fileToRead = open(aFilePath, 'rb')
+        data = fileToRead.read()
+        fileToRead.close()
+        return data
+
+
+# Names of directories that are never searched for IDL files.
+kIgnoredDirectoryNames = ['.hg', '.git']
+
+# Name of the file that the build's configure step writes at the top of an
+# object directory.
+kObjectDirectoryMarker = 'config.status'
+
+
+# Determine whether a directory is never searched for IDL files: a version
+# control directory, or an object directory (obj-*, or any directory that
+# configure was run in), whose dist/idl copies of the tree's IDL files would be
+# taken for interfaces of their own.
+#
+# @param aParentPath The path of the directory that contains the directory.
+# @param aName The name of the directory.
+#
+# @returns True, if the directory is ignored; False, otherwise.
+def isIgnoredDirectory(aParentPath, aName):
+    if aName in kIgnoredDirectoryNames or aName.startswith('obj-'):
+        return True
+    return os.path.isfile(os.path.join(aParentPath, aName, kObjectDirectoryMarker))
+
+
+# Find all IDL files in a tree, along with their modification times and sizes,
+# so that caches of information about them can tell which ones changed.
+# Directories for which isIgnoredDirectory() is True aren't searched.
+#
+# @param aRootPath The path to the root of the tree.
+#
+# @returns A map from the path of each IDL file, relative to aRootPath, to its
+#          [mtime, size] stamp.
+def findIDLFileStamps(aRootPath):
+    stamps = {}
+    for (directory, subdirectories, files) in os.walk(aRootPath):
+        subdirectories[:] = [name for name in subdirectories if not isIgnoredDirectory(directory, name)]
+        for name in files:
+            if not name.endswith('.idl'):
+                continue
+            fullPath = os.path.join(directory, name)
+            try:
+                fileStat = os.stat(fullPath)
+            except OSError:
+                continue
+            stamps[os.path.relpath(fullPath, aRootPath)] = [fileStat.st_mtime_ns, fileStat.st_size]
+    return stamps
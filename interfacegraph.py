@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import threading
+from idlutils import findIDLFileStamps
+
+# A graph of the inheritance relationships between the interfaces defined in
+# the IDL files of a repository, used to find every interface whose layout
+# changes along with that of a base interface.
+#
+# The vtable of a derived interface starts with that of its base, so a change to
+# a base interface that requires a new IID requires new IIDs for all of the
+# interfaces derived from it, directly or indirectly, too.
+
+# Matches the comments and %{ ... %} blocks of an IDL file, none of which can
+# contain interface definitions or includes.
+kIgnoredTextPattern = re.compile(r"/\*.*?\*/|//[^\n]*|%\{.*?%\}", re.DOTALL)
+
+# Matches an interface definition (but not a forward declaration), capturing
+# the name of the interface and the name of its base, if it has one.
+kInterfaceDefinitionPattern = re.compile(r"\binterface\s+([A-Za-z0-9_]+)\s*(?::\s*([A-Za-z0-9_:]+)\s*)?\{")
+
+# Matches an #include directive, capturing the path of the included file.
+kIncludePattern = re.compile(r"^\s*#include\s+[\"<]([^\">]+)[\">]", re.MULTILINE)
+
+
+# Extract the interfaces and includes from the text of an IDL file.
+#
+# @param aText The contents of the IDL file.
+#
+# @returns A tuple, (interfaces, includes), of a list of [interfaceName,
+#          baseName] lists, in the order in which the interfaces are defined,
+#          where baseName is None for an interface without a base, and a list of
+#          the names (without directories) of the files the IDL file includes.
+def extractDependenciesFromText(aText):
+    text = kIgnoredTextPattern.sub(" ", aText)
+
+    interfaces = []
+    for match in kInterfaceDefinitionPattern.finditer(text):
+        interfaces.append([match.group(1), match.group(2)])
+
+    includes = []
+    for match in kIncludePattern.finditer(text):
+        includes.append(os.path.basename(match.group(1)))
+
+    return (interfaces, includes)
+
+
+# @class InterfaceGraph The inheritance graph of all interfaces in the IDL files
+#        of a repository.
+#
+# Interfaces are identified by (idlFileName, interfaceName) tuples, where
+# idlFileName is the name of the IDL file without its directory, as in an
+# InterfaceResultTable. When a base interface is defined in more than one file,
+# the definitions in the derived interface's own file, or in the files it
+# (transitively) includes, are preferred.
+#
+# Like a UUIDIndex, the graph can be saved to, and loaded from, a JSON cache
+# file, along with the modification time and size of each file, so that
+# refreshing a loaded graph only needs to re-read the files that changed.
+class InterfaceGraph:
+
+    # Version of the on-disk format.
+    kFormatVersion = 1
+
+    # Number of files read concurrently while scanning a tree.
+    kScanWorkers = 16
+
+    # Create a new, empty InterfaceGraph.
+    #
+    # @param aRootPath The path to the root of the repository.
+    def __init__(self, aRootPath):
+        self.mRootPath = aRootPath
+        self.mLock = threading.Lock()
+
+        # A mapping of paths (relative to the root) to (stamp, interfaces,
+        # includes) tuples, where stamp is the [mtime, size] of the file when it
+        # was read, and interfaces and includes are the lists returned by
+        # extractDependenciesFromText().
+        self.mFileEntries = {}
+
+        # Whether mFileEntries changed since the graph was loaded.
+        self.mDirty = False
+
+        # A mapping of (idlFileName, interfaceName) keys to the list of keys of
+        # the interfaces directly derived from them. This is derived from
+        # mFileEntries.
+        self.mChildren = {}
+
+    # Load a graph from a cache file.
+    #
+    # @param aRootPath The path to the root of the repository.
+    # @param aCachePath The path of the cache file.
+    #
+    # @returns An InterfaceGraph. If the cache file can't be read, or was written
+    #          by a different version or for a different root, the graph is
+    #          empty.
+    def load(aRootPath, aCachePath):
+        graph = InterfaceGraph(aRootPath)
+        try:
+            cacheFile = open(aCachePath)
+            contents = json.load(cacheFile)
+            cacheFile.close()
+        except:
+            return graph
+
+        if not isinstance(contents, dict) or contents.get('version') != InterfaceGraph.kFormatVersion:
+            return graph
+
+        if contents.get('root') != os.path.abspath(aRootPath):
+            return graph
+
+        for (path, (stamp, interfaces, includes)) in contents.get('files', {}).items():
+            graph.mFileEntries[path] = (stamp, interfaces, includes)
+        graph.rebuildEdges()
+        return graph
+
+    # Save this graph to a cache file, replacing it atomically, if it changed
+    # since it was loaded.
+    #
+    # @param aCachePath The path of the cache file.
+    def save(self, aCachePath):
+        with self.mLock:
+            if not self.mDirty:
+                return
+
+            contents = {'version': self.kFormatVersion,
+                        'root': os.path.abspath(self.mRootPath),
+                        'files': self.mFileEntries}
+
+            temporaryPath = aCachePath + ".tmp" + str(os.getpid())
+            cacheFile = open(temporaryPath, "w")
+            json.dump(contents, cacheFile)
+            cacheFile.close()
+            os.replace(temporaryPath, aCachePath)
+            self.mDirty = False
+
+    # Bring the graph up to date with the IDL files in the tree: files that were
+    # added or whose modification time or size changed are read (in parallel),
+    # and files that no longer exist are dropped.
+    #
+    # @returns The number of files that were read.
+    def refresh(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        currentStamps = findIDLFileStamps(self.mRootPath)
+
+        stalePaths = []
+        for (path, stamp) in currentStamps.items():
+            entry = self.mFileEntries.get(path)
+            if not entry or entry[0] != stamp:
+                stalePaths.append(path)
+
+        removedPaths = [path for path in self.mFileEntries if path not in currentStamps]
+        if not stalePaths and not removedPaths:
+            return 0
+
+        pool = ThreadPoolExecutor(max_workers=self.kScanWorkers)
+        scannedDependencies = list(pool.map(self.readDependenciesForFile, stalePaths))
+        pool.shutdown()
+
+        with self.mLock:
+            for path in removedPaths:
+                del self.mFileEntries[path]
+
+            for (path, (interfaces, includes)) in zip(stalePaths, scannedDependencies):
+                self.mFileEntries[path] = (currentStamps[path], interfaces, includes)
+            self.mDirty = True
+
+        self.rebuildEdges()
+        return len(stalePaths)
+
+    # Read the interfaces and includes of a single file.
+    #
+    # @param aRelativePath The path of the file, relative to the root.
+    #
+    # @returns The tuple returned by extractDependenciesFromText(), which holds
+    #          two empty lists if the file can't be read.
+    def readDependenciesForFile(self, aRelativePath):
+        try:
+            idlFile = open(os.path.join(self.mRootPath, aRelativePath), errors='replace')
+            text = idlFile.read()
+            idlFile.close()
+        except IOError:
+            return ([], [])
+        return extractDependenciesFromText(text)
+
+    # Rebuild the inheritance edges from the per-file entries.
+    def rebuildEdges(self):
+        with self.mLock:
+            entries = list(self.mFileEntries.items())
+
+        # interface name -> names of the files defining it, and file name ->
+        # names of the files it includes
+        definitions = {}
+        includesByFile = {}
+        for (path, (stamp, interfaces, includes)) in entries:
+            fileName = os.path.basename(path)
+            includesByFile.setdefault(fileName, set()).update(includes)
+            for (interfaceName, baseName) in interfaces:
+                definingFiles = definitions.setdefault(interfaceName, [])
+                if fileName not in definingFiles:
+                    definingFiles.append(fileName)
+
+        children = {}
+        for (path, (stamp, interfaces, includes)) in entries:
+            fileName = os.path.basename(path)
+            for (interfaceName, baseName) in interfaces:
+                if not baseName:
+                    continue
+                for baseFileName in self.resolveBase(fileName, baseName, definitions, includesByFile):
+                    derivedKeys = children.setdefault((baseFileName, baseName), [])
+                    if (fileName, interfaceName) not in derivedKeys:
+                        derivedKeys.append((fileName, interfaceName))
+
+        self.mChildren = children
+
+    # Find the file(s) defining the base of an interface.
+    #
+    # @param aFileName The name of the file defining the derived interface.
+    # @param aBaseName The name of the base interface.
+    # @param aDefinitions A map from interface names to the names of the files
+    #        defining them.
+    # @param aIncludesByFile A map from file names to the set of names of the
+    #        files they include.
+    #
+    # @returns A list of the names of the files defining the base, which is
+    #          empty if it isn't defined anywhere in the tree.
+    def resolveBase(self, aFileName, aBaseName, aDefinitions, aIncludesByFile):
+        candidates = aDefinitions.get(aBaseName, [])
+        if len(candidates) <= 1:
+            return candidates
+
+        if aFileName in candidates:
+            return [aFileName]
+
+        # search the files included by aFileName, nearest first
+        visited = set([aFileName])
+        pending = [aFileName]
+        while pending:
+            reachable = []
+            for fileName in pending:
+                for includedName in aIncludesByFile.get(fileName, ()):
+                    if includedName not in visited:
+                        visited.add(includedName)
+                        reachable.append(includedName)
+
+            found = [fileName for fileName in candidates if fileName in reachable]
+            if found:
+                return found
+            pending = reachable
+
+        return candidates
+
+    # Find all interfaces derived, directly or indirectly, from an interface.
+    # This takes time proportional to the number of such interfaces.
+    #
+    # @param aIDLFileName The name of the IDL file defining the interface.
+    # @param aInterfaceName The name of the interface.
+    #
+    # @returns A list of (idlFileName, interfaceName) tuples, nearest
+    #          descendants first.
+    def getDescendants(self, aIDLFileName, aInterfaceName):
+        children = self.mChildren
+        startKey = (aIDLFileName, aInterfaceName)
+        visited = set([startKey])
+        descendants = []
+        index = 0
+        pending = [startKey]
+        while index < len(pending):
+            for childKey in children.get(pending[index], ()):
+                if childKey not in visited:
+                    visited.add(childKey)
+                    descendants.append(childKey)
+                    pending.append(childKey)
+            index = index + 1
+        return descendants
+
+    def __len__(self):
+        return len(self.mFileEntries)
+
+    load = staticmethod(load)
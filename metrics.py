@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+
+# Collection of metrics about a checkiid run, and export of them as an
+# OpenMetrics (Prometheus text format) file, e.g. for node-exporter's textfile
+# collector.
+#
+# Every metric describes a single run, and the file is rewritten after each
+# run, so all metrics are exported as gauges.
+
+
+# @class CheckMetrics A thread-safe set of named, optionally labelled, values
+#        describing a single run of the checker.
+class CheckMetrics:
+
+    # Prefix of the names of all exported metrics.
+    kPrefix = "checkiid_"
+
+    # The help text of each known metric, by name (without the prefix). Metrics
+    # are exported in this order; unknown metrics are exported after these.
+    kDescriptions = [
+        ('patch_lines', "Lines of the patch parsed."),
+        ('patch_bytes', "Bytes of patch input."),
+        ('idl_sections', "IDL file sections in the patch."),
+        ('decided_lines', "Lines of the patch skipped because the verdict for their interface was already decided."),
+        ('skipped_sections', "File sections of the patch skipped without being decoded."),
+        ('events', "Events dispatched by the parser, by type."),
+        ('interfaces_examined', "Distinct interfaces seen in the patch."),
+        ('range_cache_hits', "IDL file lookups answered from the range cache."),
+        ('range_cache_misses', "IDL file lookups that had to read and scan the file."),
+        ('verdict_cache_hits', "File sections whose verdicts were found in the verdict cache."),
+        ('verdict_cache_misses', "File sections whose verdicts were not in the verdict cache."),
+        ('file_bytes_read', "Characters of IDL files read while scanning them."),
+        ('phase_seconds', "Wall-clock time spent in each phase of the run, in seconds."),
+        ('shadow_parse_seconds', "Time spent parsing in shadow mode, by engine, in seconds."),
+        ('shadow_differing_parses', "Parses in shadow mode whose results differed between the engines."),
+        ('patch_lines_per_second', "Lines of the patch parsed per second of parsing."),
+        ('findings', "Findings of the run, by kind."),
+        ('messages', "Messages printed, by level."),
+        ('last_run_timestamp_seconds', "Time at which the run finished, in seconds since the epoch."),
+    ]
+
+    def __init__(self):
+        self.mLock = threading.Lock()
+
+        # A mapping of (name, labels) pairs to values, where labels is a tuple of
+        # (label, value) pairs.
+        self.mValues = {}
+
+        # A mapping of phase names to the times at which they were started.
+        self.mPhaseStartTimes = {}
+
+    # Add to the value of a metric, which starts out at 0.
+    #
+    # @param aName The name of the metric, without the prefix.
+    # @param aAmount The amount to add.
+    # @param aLabels An optional dict of label names to values.
+    def add(self, aName, aAmount=1, aLabels=None):
+        key = (aName, self.createLabelKey(aLabels))
+        with self.mLock:
+            self.mValues[key] = self.mValues.get(key, 0) + aAmount
+
+    # Set the value of a metric.
+    #
+    # @param aName The name of the metric, without the prefix.
+    # @param aValue The value.
+    # @param aLabels An optional dict of label names to values.
+    def set(self, aName, aValue, aLabels=None):
+        key = (aName, self.createLabelKey(aLabels))
+        with self.mLock:
+            self.mValues[key] = aValue
+
+    # Retrieve the value of a metric.
+    #
+    # @returns The value, or 0, if it was never set.
+    def get(self, aName, aLabels=None):
+        with self.mLock:
+            return self.mValues.get((aName, self.createLabelKey(aLabels)), 0)
+
+    # Start timing a phase of the run.
+    #
+    # @param aPhase The name of the phase.
+    def startPhase(self, aPhase):
+        with self.mLock:
+            self.mPhaseStartTimes[aPhase] = time.monotonic()
+
+    # Stop timing a phase of the run, and add the time spent in it to the
+    # 'phase_seconds' metric. Phases may be timed several times.
+    #
+    # @param aPhase The name of the phase.
+    #
+    # @returns The number of seconds the phase took this time.
+    def endPhase(self, aPhase):
+        with self.mLock:
+            startTime = self.mPhaseStartTimes.pop(aPhase, None)
+        if startTime is None:
+            return 0
+
+        elapsed = time.monotonic() - startTime
+        self.add('phase_seconds', elapsed, {'phase': aPhase})
+        return elapsed
+
+    # Retrieve the time spent in each phase so far, including the time spent in
+    # phases that haven't ended yet.
+    #
+    # @returns A dict mapping phase names to seconds.
+    def getPhaseSeconds(self):
+        now = time.monotonic()
+        phaseSeconds = {}
+        with self.mLock:
+            for ((name, labels), value) in self.mValues.items():
+                if name == 'phase_seconds':
+                    phaseSeconds[dict(labels)['phase']] = value
+            for (phase, startTime) in self.mPhaseStartTimes.items():
+                phaseSeconds[phase] = phaseSeconds.get(phase, 0) + now - startTime
+        return phaseSeconds
+
+    def createLabelKey(self, aLabels):
+        if not aLabels:
+            return ()
+        return tuple(sorted(aLabels.items()))
+
+    # Format all metrics in the OpenMetrics text format.
+    #
+    # @returns The text, as a string.
+    def formatOpenMetrics(self):
+        with self.mLock:
+            values = dict(self.mValues)
+
+        names = [name for (name, description) in self.kDescriptions]
+        descriptions = dict(self.kDescriptions)
+        for (name, labels) in sorted(values.keys()):
+            if name not in names:
+                names.append(name)
+
+        lines = []
+        for name in names:
+            samples = sorted([(labels, value) for ((sampleName, labels), value) in values.items() if sampleName == name])
+            if not samples:
+                continue
+
+            fullName = self.kPrefix + name
+            lines.append("# TYPE " + fullName + " gauge")
+            if name in descriptions:
+                lines.append("# HELP " + fullName + " " + descriptions[name])
+
+            for (labels, value) in samples:
+                labelText = ""
+                if labels:
+                    labelText = "{" + ",".join([label + '="' + self.escapeLabelValue(str(labelValue)) + '"' for (label, labelValue) in labels]) + "}"
+                lines.append(fullName + labelText + " " + self.formatValue(value))
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def escapeLabelValue(self, aValue):
+        return aValue.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def formatValue(self, aValue):
+        if isinstance(aValue, float):
+            return repr(aValue)
+        return str(aValue)
+
+    # Write all metrics to a file in the OpenMetrics text format. The file is
+    # replaced atomically, so a collector never sees a partially written file.
+    #
+    # @param aPath The path of the file.
+    def write(self, aPath):
+        self.set('last_run_timestamp_seconds', time.time())
+
+        temporaryPath = aPath + ".tmp" + str(os.getpid())
+        metricsFile = open(temporaryPath, "w")
+        metricsFile.write(self.formatOpenMetrics())
+        metricsFile.close()
+        os.replace(temporaryPath, aPath)
@@ -0,0 +1,293 @@
+import os
+import re
+import difflib
+from patchinput import PatchBuffer
+from patchinput import decodePatchLine
+from patchinput import decodeFileLines
+from checkiid import extractIDLFilePath
+from checkiid import doesLineSignifyCreation
+
+# Consolidation of patches made of many changesets (e.g. the output of
+# 'hg export' or 'git log -p' over a long range) into the net change to each
+# IDL file.
+#
+# In such a patch, an IDL file may have many sections, one per changeset that
+# touched it, and each of them is checked, even when a later one backs it out.
+# Given the file as it is in the working tree, which is the post-image of its
+# newest section, the sections are applied in reverse, newest first, to recover
+# the pre-image of its oldest section, and replaced by a single section holding
+# the difference between the two. The changesets may be listed oldest first
+# (e.g. 'hg export', 'git log -p --reverse') or newest first (e.g. 'git log
+# -p'), so both orders are tried. Files whose sections can't be applied in
+# reverse in either order (e.g. because the working tree isn't at the newest
+# revision in the patch) are left as they are, with a warning.
+
+# Matches the header of a git-style file section, capturing the paths of the
+# pre-image and the post-image.
+kSectionHeaderPattern = re.compile(r"^diff --git a/(\S+) b/(\S+)")
+
+# Matches a hunk header, capturing the first line and number of lines of the
+# pre-image and of the post-image.
+kHunkHeaderPattern = re.compile(r"^@@ -([0-9]+)(?:,([0-9]+))? \+([0-9]+)(?:,([0-9]+))? @@")
+
+# Number of lines of context around each change in consolidated sections, as in
+# the default output of 'hg diff' and 'git diff'.
+kContextLineCount = 3
+
+# Matches the lines git shows in hunk headers by default, to say where in the
+# file a hunk is (for IDL files, usually the interface it's in).
+kFunctionContextPattern = re.compile(r"^[A-Za-z_$]")
+
+# Longest text shown after a hunk header, as in git.
+kMaxFunctionContextLength = 80
+
+
+# Split the body of a file section into hunks.
+#
+# @param aSectionLines The lines of the file section, including its header.
+#
+# @returns A list of (oldStart, oldCount, newStart, newCount, lines) tuples, where
+#          lines are the lines of the hunk, after its header.
+def parseHunks(aSectionLines):
+    hunks = []
+    oldRemaining = 0
+    newRemaining = 0
+    for line in aSectionLines:
+        if oldRemaining <= 0 and newRemaining <= 0:
+            match = kHunkHeaderPattern.match(line)
+            if match:
+                oldRemaining = int(match.group(2) or 1)
+                newRemaining = int(match.group(4) or 1)
+                hunks.append((int(match.group(1)), oldRemaining, int(match.group(3)), newRemaining, []))
+            continue
+
+        if line.startswith("-"):
+            oldRemaining = oldRemaining - 1
+        elif line.startswith("+"):
+            newRemaining = newRemaining - 1
+        elif line.startswith(" "):
+            oldRemaining = oldRemaining - 1
+            newRemaining = newRemaining - 1
+        else:
+            # e.g. '\ No newline at end of file'
+            continue
+        hunks[-1][4].append(line)
+    return hunks
+
+
+# Determine whether a file section creates its file, i.e. whether its header
+# has a '--- /dev/null' line.
+#
+# @param aSectionLines The lines of the file section.
+def doesSectionCreateFile(aSectionLines):
+    for line in aSectionLines:
+        if line.startswith("@@"):
+            break
+        if doesLineSignifyCreation(line):
+            return True
+    return False
+
+
+# Find the index of the first line of a hunk, in the lines of one side of it.
+#
+# @param aStart The first line number given in the hunk header for that side.
+# @param aCount The number of lines given for that side.
+def getHunkIndex(aStart, aCount):
+    # an empty side is given as the line before it
+    if aCount == 0:
+        return aStart
+    return aStart - 1
+
+
+# Apply the hunks of a file section in reverse, to recover its pre-image from
+# its post-image.
+#
+# @param aSectionLines The lines of the file section.
+# @param aPostImage The lines of the post-image, without line endings.
+#
+# @returns The lines of the pre-image, or None, if the hunks don't apply.
+def unapplySection(aSectionLines, aPostImage):
+    preImage = []
+    position = 0
+    for (oldStart, oldCount, newStart, newCount, lines) in parseHunks(aSectionLines):
+        newIndex = getHunkIndex(newStart, newCount)
+        if newIndex < position:
+            return None
+        preImage.extend(aPostImage[position:newIndex])
+        if len(preImage) != getHunkIndex(oldStart, oldCount):
+            return None
+
+        newLines = [line[1:].rstrip("\n") for line in lines if not line.startswith("-")]
+        if aPostImage[newIndex:newIndex + len(newLines)] != newLines:
+            return None
+
+        preImage.extend([line[1:].rstrip("\n") for line in lines if not line.startswith("+")])
+        position = newIndex + len(newLines)
+
+    preImage.extend(aPostImage[position:])
+    return preImage
+
+
+# Find the text git would show after the header of a hunk: the nearest line
+# before the hunk that starts with a letter, '_' or '$'.
+#
+# @param aLines The lines of the pre-image.
+# @param aIndex The index of the first line of the hunk in aLines.
+#
+# @returns The text, or None, if there is no such line.
+def findFunctionContext(aLines, aIndex):
+    for index in range(min(aIndex, len(aLines)) - 1, -1, -1):
+        if kFunctionContextPattern.match(aLines[index]):
+            return aLines[index][:kMaxFunctionContextLength].rstrip()
+    return None
+
+
+# Format one side of a hunk header, as 'diff -u' does.
+#
+# @param aIndex The index of the first line of the side.
+# @param aCount The number of lines of the side.
+def formatHunkRange(aIndex, aCount):
+    if aCount == 0:
+        return str(aIndex) + ",0"
+    if aCount == 1:
+        return str(aIndex + 1)
+    return str(aIndex + 1) + "," + str(aCount)
+
+
+# Create a file section holding the difference between two versions of a file.
+#
+# @param aPath The path of the file, relative to the root of the repository.
+# @param aPreImage The lines of the old version, or None, if the file didn't
+#        exist.
+# @param aPostImage The lines of the new version.
+#
+# @returns A list of the lines of the section, or an empty list, if the versions
+#          are the same.
+def createSection(aPath, aPreImage, aPostImage):
+    oldLines = aPreImage or []
+    if aPreImage is not None and oldLines == aPostImage:
+        return []
+
+    sectionLines = ["diff --git a/" + aPath + " b/" + aPath + "\n"]
+    if aPreImage is None:
+        sectionLines.append("new file mode 100644\n")
+        sectionLines.append("--- /dev/null\n")
+    else:
+        sectionLines.append("--- a/" + aPath + "\n")
+    sectionLines.append("+++ b/" + aPath + "\n")
+
+    matcher = difflib.SequenceMatcher(None, oldLines, aPostImage, autojunk=False)
+    for group in matcher.get_grouped_opcodes(kContextLineCount):
+        oldIndex = group[0][1]
+        oldCount = group[-1][2] - oldIndex
+        newIndex = group[0][3]
+        newCount = group[-1][4] - newIndex
+
+        header = "@@ -" + formatHunkRange(oldIndex, oldCount) + " +" + formatHunkRange(newIndex, newCount) + " @@"
+        context = findFunctionContext(oldLines, oldIndex)
+        if context:
+            header += " " + context
+        sectionLines.append(header + "\n")
+
+        for (tag, oldFirst, oldLast, newFirst, newLast) in group:
+            if tag == 'equal':
+                sectionLines.extend([" " + line + "\n" for line in oldLines[oldFirst:oldLast]])
+                continue
+            sectionLines.extend(["-" + line + "\n" for line in oldLines[oldFirst:oldLast]])
+            sectionLines.extend(["+" + line + "\n" for line in aPostImage[newFirst:newLast]])
+
+    return sectionLines
+
+
+# Apply the sections of a file in reverse, newest first, to recover the
+# pre-image of the oldest one.
+#
+# @param aSectionLines A list of the lines of each section, newest first.
+# @param aPostImage The lines of the post-image of the newest section.
+#
+# @returns A tuple, (preImage, created), where preImage is the lines of the
+#          pre-image, or None, if the sections don't apply, and created is True
+#          if the oldest section creates the file.
+def unapplySections(aSectionLines, aPostImage):
+    image = aPostImage
+    for sectionLines in aSectionLines:
+        image = unapplySection(sectionLines, image)
+        if image is None:
+            return (None, False)
+    return (image, doesSectionCreateFile(aSectionLines[-1]))
+
+
+# Consolidate the sections of a patch for each IDL file that has more than one
+# into a single section holding the net change (see above).
+#
+# @param aPatchBuffer The PatchBuffer containing the patch.
+# @param aContentProvider The FileContentProvider through which to read the
+#        files of the repository.
+# @param aPrinter The PrettyPrinter through which to report progress.
+#
+# @returns A new PatchBuffer, in which each consolidated file's section takes
+#          the place of its last section in the patch, or aPatchBuffer, if no
+#          file was consolidated.
+def consolidatePatch(aPatchBuffer, aContentProvider, aPrinter):
+    # the sections of each IDL file, and the files that are renamed or copied,
+    # which are left alone
+    sectionsByPath = {}
+    renamedPaths = set()
+    for (start, headerEnd, end) in aPatchBuffer.iterSections():
+        if headerEnd == start:
+            continue
+        header = decodePatchLine(aPatchBuffer.getBytes(start, headerEnd))
+        path = extractIDLFilePath(header, '')
+        if path is None:
+            continue
+
+        match = kSectionHeaderPattern.match(header)
+        if match and match.group(1) != match.group(2):
+            renamedPaths.update(match.groups())
+        sectionsByPath.setdefault(path, []).append((start, end))
+
+    # section start -> lines of the section replacing it, for the last section
+    # of each consolidated file; its other sections are dropped
+    replacements = {}
+    droppedStarts = set()
+    for (path, sections) in sectionsByPath.items():
+        if len(sections) < 2:
+            continue
+
+        if path in renamedPaths:
+            aPrinter.warn("Not consolidating the " + str(len(sections)) + " sections of the patch for '" + path + "', which is renamed in it. They're checked one by one.")
+            continue
+
+        try:
+            postImage = decodeFileLines(aContentProvider.readBytes(os.path.join(aContentProvider.getRootPath(), path)))
+        except (IOError, OSError):
+            aPrinter.warn("Not consolidating the " + str(len(sections)) + " sections of the patch for '" + path + "', which isn't in the repository. They're checked one by one.")
+            continue
+
+        # oldest first, then newest first
+        sectionLines = [list(aPatchBuffer.decodeLines(start, end)) for (start, end) in sections]
+        (image, created) = unapplySections(sectionLines[::-1], postImage)
+        if image is None:
+            (image, created) = unapplySections(sectionLines, postImage)
+
+        if image is None:
+            aPrinter.warn("Not consolidating the " + str(len(sections)) + " sections of the patch for '" + path + "', which don't apply to it in reverse in either order (the repository may not be at the newest revision in the patch). They're checked one by one.")
+            continue
+
+        replacements[sections[-1][0]] = createSection(path, None if created else image, postImage)
+        droppedStarts.update([start for (start, end) in sections[:-1]])
+
+    if not replacements:
+        return aPatchBuffer
+
+    data = bytearray()
+    for (start, headerEnd, end) in aPatchBuffer.iterSections():
+        if start in droppedStarts:
+            continue
+        if start in replacements:
+            data += "".join(replacements[start]).encode('utf-8', 'surrogateescape')
+            continue
+        data += aPatchBuffer.getBytes(start, end)
+
+    aPrinter.debug("Consolidated " + str(len(droppedStarts) + len(replacements)) + " sections of the patch for " + str(len(replacements)) + " IDL files.")
+    return PatchBuffer(data)
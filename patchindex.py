@@ -0,0 +1,216 @@
+import os
+import re
+import json
+from patchinput import decodePatchLine
+from checkiid import extractIDLFileName
+
+# A sidecar index of a patch file, holding the byte offsets of each of its file
+# sections and hunks, and the names of the interfaces mentioned in each hunk, so
+# that a check of a few files or interfaces in a very large patch can seek
+# straight to the sections it needs instead of reading the whole patch.
+
+# Matches the start of each hunk in the body of a file section.
+kHunkToken = b"\n@@"
+
+# Matches a mention of an interface (in a definition, a forward declaration, a
+# hunk header or even a comment), capturing its name.
+kInterfaceMentionPattern = re.compile(rb"\binterface\s+([A-Za-z0-9_]+)")
+
+
+# Retrieve the path of the sidecar index of a patch file.
+#
+# @param aPatchPath The path of the patch file.
+#
+# @returns The path of the index file.
+def getIndexPath(aPatchPath):
+    return aPatchPath + ".idx"
+
+
+# Retrieve the stamp of a patch file, used to tell whether an index is stale.
+#
+# @returns The [mtime, size] of the file, or None, if it can't be found.
+def getPatchStamp(aPatchPath):
+    try:
+        fileStat = os.stat(aPatchPath)
+    except OSError:
+        return None
+    return [fileStat.st_mtime_ns, fileStat.st_size]
+
+
+# @class PatchIndex The file sections and hunks of a patch, by byte offset.
+#
+# Each section is stored as a [start, end, idlFileName, hunks] list, where
+# idlFileName is None for sections that aren't IDL files, and hunks is a list
+# of [start, end, interfaceNames] lists. Offsets are from the start of the
+# patch, and each end is exclusive.
+#
+# On disk, the index is a header line followed by one line of JSON per section,
+# so that finding the sections for a file or interface only needs to decode the
+# lines that mention it.
+class PatchIndex:
+
+    # Version of the on-disk format.
+    kFormatVersion = 1
+
+    # Create a new PatchIndex.
+    #
+    # @param aSections The list of sections, as described above.
+    # @param aStamp The stamp of the patch file (see getPatchStamp()), or None,
+    #        if the patch isn't a file.
+    # @param aSectionLines Optionally, a list of the JSON-encoded sections, in
+    #        place of aSections, which are then only decoded when needed.
+    def __init__(self, aSections, aStamp=None, aSectionLines=None):
+        self.mSections = aSections
+        self.mStamp = aStamp
+        self.mSectionLines = aSectionLines
+
+    # Build the index of a patch.
+    #
+    # @param aPatchBuffer The PatchBuffer containing the patch.
+    # @param aStamp The stamp of the patch file, if it is one.
+    #
+    # @returns A new PatchIndex.
+    def build(aPatchBuffer, aStamp=None):
+        sections = []
+        for (start, headerEnd, end) in aPatchBuffer.iterSections():
+            if headerEnd == start:
+                continue
+
+            header = decodePatchLine(aPatchBuffer.getBytes(start, headerEnd))
+            hunks = []
+            hunkStart = aPatchBuffer.find(kHunkToken, headerEnd - 1, end)
+            while hunkStart != -1:
+                hunkStart = hunkStart + 1
+                hunkEnd = aPatchBuffer.find(kHunkToken, hunkStart, end)
+                hunkEnd = end if hunkEnd == -1 else hunkEnd + 1
+
+                interfaceNames = []
+                for match in kInterfaceMentionPattern.finditer(aPatchBuffer.getBytes(hunkStart, hunkEnd)):
+                    name = match.group(1).decode('ascii')
+                    if name not in interfaceNames:
+                        interfaceNames.append(name)
+
+                hunks.append([hunkStart, hunkEnd, interfaceNames])
+                hunkStart = hunkEnd - 1 if hunkEnd < end else -1
+
+            sections.append([start, end, extractIDLFileName(header), hunks])
+
+        return PatchIndex(sections, aStamp)
+
+    # Load the index of a patch file from its sidecar file.
+    #
+    # @param aPatchPath The path of the patch file.
+    #
+    # @returns A PatchIndex, or None, if there is no index, or it was written by a
+    #          different version or for a different version of the patch.
+    def load(aPatchPath):
+        try:
+            indexFile = open(getIndexPath(aPatchPath))
+            header = json.loads(indexFile.readline())
+            sectionLines = indexFile.read().splitlines()
+            indexFile.close()
+        except:
+            return None
+
+        if not isinstance(header, dict) or header.get('version') != PatchIndex.kFormatVersion:
+            return None
+
+        stamp = getPatchStamp(aPatchPath)
+        if stamp is None or header.get('stamp') != stamp:
+            return None
+
+        return PatchIndex(None, stamp, sectionLines)
+
+    # Write this index to the sidecar file of a patch file, replacing it
+    # atomically.
+    #
+    # @param aPatchPath The path of the patch file.
+    def save(self, aPatchPath):
+        indexPath = getIndexPath(aPatchPath)
+        temporaryPath = indexPath + ".tmp" + str(os.getpid())
+        indexFile = open(temporaryPath, "w")
+        indexFile.write(json.dumps({'version': self.kFormatVersion, 'stamp': self.mStamp}) + "\n")
+        for section in self.getSections():
+            indexFile.write(json.dumps(section) + "\n")
+        indexFile.close()
+        os.replace(temporaryPath, indexPath)
+
+    # @returns The list of sections, as described above.
+    def getSections(self):
+        if self.mSections is None:
+            self.mSections = [json.loads(line) for line in self.mSectionLines]
+        return self.mSections
+
+    # Find the file sections that need to be checked to check some IDL files and
+    # interfaces. Interfaces are found through the hunks that mention them, but
+    # whole sections are always checked, since which interface a hunk changes
+    # can depend on the hunks before it.
+    #
+    # @param aIDLFileNames A list of the names of IDL files (without their
+    #        directories).
+    # @param aInterfaceNames A list of the names of interfaces.
+    #
+    # @returns A list of (start, end) tuples, in the order in which the sections
+    #          appear in the patch.
+    def findSections(self, aIDLFileNames, aInterfaceNames):
+        fileNames = set(aIDLFileNames)
+        interfaceNames = set(aInterfaceNames)
+
+        if self.mSections is None:
+            # only decode the sections that mention one of the names
+            needles = [json.dumps(name) for name in fileNames.union(interfaceNames)]
+            sections = [json.loads(line) for line in self.mSectionLines if any(needle in line for needle in needles)]
+        else:
+            sections = self.mSections
+
+        ranges = []
+        for (start, end, idlFileName, hunks) in sections:
+            if idlFileName is None:
+                continue
+
+            if idlFileName in fileNames or any(interfaceNames.intersection(names) for (hunkStart, hunkEnd, names) in hunks):
+                ranges.append((start, end))
+        return ranges
+
+    def __len__(self):
+        if self.mSections is None:
+            return len(self.mSectionLines)
+        return len(self.mSections)
+
+    build = staticmethod(build)
+    load = staticmethod(load)
+
+
+# Reduce a patch to the file sections needed to check some IDL files and
+# interfaces, using the patch file's sidecar index. If the index is missing or
+# stale, it's rebuilt, and written for later runs.
+#
+# @param aPatchBuffer The PatchBuffer containing the whole patch.
+# @param aPatchPath The path of the patch file, or None, if the patch was read
+#        from a stream (in which case the index is built, but not saved).
+# @param aIDLFileNames A list of the names (or paths) of IDL files.
+# @param aInterfaceNames A list of the names of interfaces.
+# @param aPrinter The PrettyPrinter through which to report progress.
+#
+# @returns A new PatchBuffer, holding only the selected sections.
+def selectPatchSections(aPatchBuffer, aPatchPath, aIDLFileNames, aInterfaceNames, aPrinter):
+    index = None
+    if aPatchPath is not None:
+        index = PatchIndex.load(aPatchPath)
+
+    if index is None:
+        stamp = None
+        if aPatchPath is not None:
+            stamp = getPatchStamp(aPatchPath)
+
+        index = PatchIndex.build(aPatchBuffer, stamp)
+        aPrinter.debug("Indexed " + str(len(index)) + " file sections of the patch.")
+        if aPatchPath is not None:
+            try:
+                index.save(aPatchPath)
+            except (IOError, OSError) as error:
+                aPrinter.warn("Unable to write the patch index '" + getIndexPath(aPatchPath) + "': " + str(error))
+
+    ranges = index.findSections([os.path.basename(name) for name in aIDLFileNames], aInterfaceNames)
+    aPrinter.debug("Checking " + str(len(ranges)) + " of " + str(len(index)) + " file sections of the patch.")
+    return aPatchBuffer.select(ranges)
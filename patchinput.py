@@ -0,0 +1,194 @@
+import mmap
+
+# Bytes-level access to patch input.
+#
+# Patch files are memory-mapped (and stdin is read in large chunks) rather than
+# read through a text-mode file object, so that sections of the patch the
+# checker doesn't need to look at are never decoded into Python strings, and so
+# that bytes which aren't valid UTF-8 can't stop a patch from being checked.
+
+# The token that starts the header of each file section in diff output.
+kFileHeaderToken = b"diff "
+
+# Number of bytes to read at a time from a stream.
+kReadChunkSize = 1 << 20
+
+
+# Decode a single line of patch input.
+#
+# Bytes that aren't valid UTF-8 are decoded as lone surrogates, so decoding
+# never fails, and '\r\n' line endings are translated to '\n', as they would be
+# by a file object opened in text mode.
+#
+# @param aLine A bytes-like object containing the line.
+#
+# @returns The line, as a string.
+def decodePatchLine(aLine):
+    line = str(aLine, 'utf-8', 'surrogateescape')
+    if line.endswith("\r\n"):
+        line = line[:-2] + "\n"
+    return line
+
+
+# Decode the contents of a file in the repository into lines that can be
+# compared with the lines of a patch (after their first character).
+#
+# @param aData A bytes object with the contents of the file.
+#
+# @returns A list of strings, one per line, without line endings.
+def decodeFileLines(aData):
+    lines = aData.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    return [decodePatchLine(line).rstrip("\r") for line in lines]
+
+
+# @class PatchBuffer The contents of a patch, held as bytes.
+#
+# The buffer is split into lines and file sections by searching the underlying
+# bytes directly. Lines are handed out as memoryview slices, so nothing is
+# copied until a line is actually decoded.
+class PatchBuffer:
+
+    # Create a new PatchBuffer.
+    #
+    # @param aData A bytes, bytearray or mmap object containing the patch.
+    # @param aMap The mmap object backing aData, if there is one, so that it can
+    #        be closed by close().
+    def __init__(self, aData, aMap=None):
+        self.mData = aData
+        self.mMap = aMap
+        self.mView = memoryview(aData)
+
+    # Create a PatchBuffer for a file on disk, by memory-mapping it.
+    #
+    # @param aPath The path of the patch file.
+    #
+    # @returns A new PatchBuffer.
+    #
+    # @throws IOError If the file can't be opened.
+    def fromFile(aPath):
+        patchFile = open(aPath, 'rb')
+        try:
+            patchMap = mmap.mmap(patchFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            # empty files (and some special files) can't be mapped
+            data = patchFile.read()
+            patchFile.close()
+            return PatchBuffer(data)
+
+        patchFile.close()
+        return PatchBuffer(patchMap, patchMap)
+
+    # Create a PatchBuffer from a binary stream, such as sys.stdin.buffer.
+    #
+    # @param aStream The stream, which is read until it's exhausted.
+    #
+    # @returns A new PatchBuffer.
+    def fromStream(aStream):
+        data = bytearray()
+        chunk = aStream.read(kReadChunkSize)
+        while chunk:
+            data += chunk
+            chunk = aStream.read(kReadChunkSize)
+        return PatchBuffer(data)
+
+    # @returns The number of bytes in the patch.
+    def __len__(self):
+        return len(self.mView)
+
+    # Search part of the patch for a sequence of bytes.
+    #
+    # @param aBytes The bytes to search for.
+    # @param aStart The offset at which to start searching.
+    # @param aEnd The offset at which to stop searching.
+    #
+    # @returns The offset of the first occurrence, or -1, if there is none.
+    def find(self, aBytes, aStart, aEnd):
+        return self.mData.find(aBytes, aStart, aEnd)
+
+    # Find the end of the line starting at a given offset.
+    #
+    # @returns The offset just past the line's '\n', or aEnd, if the line isn't
+    #          terminated before aEnd.
+    def findEndOfLine(self, aStart, aEnd):
+        lineEnd = self.mData.find(b"\n", aStart, aEnd)
+        if lineEnd == -1:
+            return aEnd
+        return lineEnd + 1
+
+    # Split the patch into file sections.
+    #
+    # @returns A generator of (start, headerEnd, end) offset tuples, one for the
+    #          text before the first section (if any), with headerEnd equal to
+    #          start, and one for each section, whose header line runs from start
+    #          to headerEnd.
+    def iterSections(self):
+        length = len(self.mView)
+        if self.mView[:len(kFileHeaderToken)] == kFileHeaderToken:
+            start = 0
+        else:
+            start = self.mData.find(b"\n" + kFileHeaderToken)
+            start = length if start == -1 else start + 1
+            if start > 0:
+                yield (0, 0, start)
+
+        while start < length:
+            headerEnd = self.findEndOfLine(start, length)
+            end = self.mData.find(b"\n" + kFileHeaderToken, headerEnd - 1)
+            end = length if end == -1 else end + 1
+            yield (start, headerEnd, end)
+            start = end
+
+    # @returns A memoryview of part of the patch, from aStart up to aEnd.
+    def getBytes(self, aStart, aEnd):
+        return self.mView[aStart:aEnd]
+
+    # Iterate over the lines in part of the patch.
+    #
+    # @returns A generator of memoryview objects, one per line, each including
+    #          its line ending.
+    def iterLines(self, aStart, aEnd):
+        position = aStart
+        while position < aEnd:
+            lineEnd = self.findEndOfLine(position, aEnd)
+            yield self.getBytes(position, lineEnd)
+            position = lineEnd
+
+    # Count the lines in part of the patch, as iterLines() would return them.
+    def countLines(self, aStart, aEnd):
+        if aEnd <= aStart:
+            return 0
+        lineCount = self.mData[aStart:aEnd].count(b"\n")
+        if self.mView[aEnd - 1] != ord("\n"):
+            lineCount = lineCount + 1
+        return lineCount
+
+    # Decode the lines in part of the patch.
+    #
+    # @returns A generator of strings, one per line.
+    def decodeLines(self, aStart, aEnd):
+        for line in self.iterLines(aStart, aEnd):
+            yield decodePatchLine(line)
+
+    # Create a PatchBuffer holding only some parts of this one, e.g. a few of its
+    # file sections.
+    #
+    # @param aRanges A list of (start, end) offset tuples, of the parts to copy.
+    #
+    # @returns A new PatchBuffer.
+    def select(self, aRanges):
+        data = bytearray()
+        for (start, end) in aRanges:
+            data += self.mView[start:end]
+        return PatchBuffer(data)
+
+    # Release the buffer, unmapping the patch file if it was memory-mapped.
+    def close(self):
+        self.mView.release()
+        if self.mMap is not None:
+            self.mMap.close()
+            self.mMap = None
+
+    fromFile = staticmethod(fromFile)
+    fromStream = staticmethod(fromStream)
@@ -1,6 +1,165 @@
 # This is a class that allows us to print prettier output to the command line.
 # It's designed so that you can create a single object of type PrettyPrinter,
 # then use that printer throughout your script.
+#
+# Output is written through a sink, which buffers messages and writes them out
+# in batches. Sinks are provided for the console, for a file, and for JSON-lines
+# output to a file descriptor, along with one that discards all output.
+
+import os
+import sys
+import json
+import atexit
+import threading
+
+
+# @class OutputSink The base class of all output sinks. Messages are collected in
+#        a buffer, and written out by writeBuffered() whenever the buffer grows
+#        past kBufferSize characters, and when flush() is called.
+#
+# Sinks don't flush themselves at exit: whoever creates a sink flushes it when
+# it's done with it (runMain() does so for the sink it creates, and the shared
+# default sink is flushed at exit).
+class OutputSink:
+
+    # Number of characters of output to collect before writing them out.
+    kBufferSize = 64 * 1024
+
+    def __init__(self):
+        self.mLock = threading.Lock()
+        self.mBuffer = []
+        self.mBufferedSize = 0
+
+    # Write a message to this sink.
+    #
+    # @param aType The type of message - one of debug, info, warn, or error, or
+    #        None for a message without a type.
+    # @param aPrefix The prefix that goes before the message when it's shown to a
+    #        person (e.g. 'ERROR: ', possibly with color codes).
+    # @param aMessage The message, as a string.
+    def write(self, aType, aPrefix, aMessage):
+        text = self.formatMessage(aType, aPrefix, aMessage)
+        with self.mLock:
+            self.mBuffer.append(text)
+            self.mBufferedSize = self.mBufferedSize + len(text)
+            if self.mBufferedSize >= self.kBufferSize:
+                self.flushLocked()
+
+    # Format a message for output. Subclasses override this to change the format.
+    #
+    # @returns The text to write, including its line ending.
+    def formatMessage(self, aType, aPrefix, aMessage):
+        return aPrefix + aMessage + "\n"
+
+    # Write out all buffered output.
+    def flush(self):
+        with self.mLock:
+            self.flushLocked()
+
+    def flushLocked(self):
+        if not self.mBuffer:
+            return
+        text = "".join(self.mBuffer)
+        self.mBuffer = []
+        self.mBufferedSize = 0
+        self.writeBuffered(text)
+
+    # Write a batch of output to the sink's destination. Subclasses override
+    # this; the base class has no destination, and discards the text.
+    #
+    # @param aText The text to write.
+    def writeBuffered(self, aText):
+        pass
+
+    # Write out all buffered output, and release the sink's destination.
+    def close(self):
+        self.flush()
+
+
+# @class ConsoleSink A sink that writes to the console (sys.stdout, by default).
+class ConsoleSink(OutputSink):
+
+    # Create a new ConsoleSink.
+    #
+    # @param aStream An optional text stream to write to. If not given, output
+    #        goes to whatever sys.stdout is at the time it's written out.
+    def __init__(self, aStream=None):
+        OutputSink.__init__(self)
+        self.mStream = aStream
+
+    def writeBuffered(self, aText):
+        stream = self.mStream or sys.stdout
+        stream.write(aText)
+        stream.flush()
+
+
+# @class FileSink A sink that writes to a file.
+class FileSink(OutputSink):
+
+    # Create a new FileSink.
+    #
+    # @param aPath The path of the file to write. It's created if it doesn't
+    #        exist, and truncated if it does.
+    def __init__(self, aPath):
+        OutputSink.__init__(self)
+        self.mFile = open(aPath, "w")
+
+    def writeBuffered(self, aText):
+        if self.mFile:
+            self.mFile.write(aText)
+            self.mFile.flush()
+
+    def close(self):
+        OutputSink.close(self)
+        if self.mFile:
+            self.mFile.close()
+            self.mFile = None
+
+
+# @class JSONLinesSink A sink that writes each message as a JSON object on a line
+#        of its own, e.g. {"level": "error", "message": "..."}, to a file
+#        descriptor. This is meant for log collectors, so no color codes or
+#        prefixes are included.
+class JSONLinesSink(OutputSink):
+
+    # Create a new JSONLinesSink.
+    #
+    # @param aFileDescriptor The file descriptor to write to. It is not closed by
+    #        the sink.
+    def __init__(self, aFileDescriptor):
+        OutputSink.__init__(self)
+        self.mFileDescriptor = aFileDescriptor
+
+    def formatMessage(self, aType, aPrefix, aMessage):
+        return json.dumps({'level': aType, 'message': aMessage}) + "\n"
+
+    def writeBuffered(self, aText):
+        data = aText.encode('utf-8', 'surrogateescape')
+        while data:
+            written = os.write(self.mFileDescriptor, data)
+            data = data[written:]
+
+
+# @class NullSink A sink that discards everything written to it.
+class NullSink(OutputSink):
+
+    def write(self, aType, aPrefix, aMessage):
+        pass
+
+
+# The sink used by PrettyPrinter objects that aren't given one of their own.
+gDefaultSink = None
+
+
+# @returns The sink used by PrettyPrinter objects that aren't given one of their
+#          own: a ConsoleSink shared between all of them, so their output stays
+#          in order. It's flushed at exit.
+def getDefaultSink():
+    global gDefaultSink
+    if gDefaultSink is None:
+        gDefaultSink = ConsoleSink()
+        atexit.register(gDefaultSink.flush)
+    return gDefaultSink
 
 
 class PrettyPrinter:
@@ -13,10 +172,25 @@ class PrettyPrinter:
     ERROR = '\033[91m'
     ENDCOLOR = '\033[0m'
 
-    def __init__(self, aEnableColor=False, aDebugEnabled=False, aVerboseEnabled=False):
+    # The types of message, in order of increasing severity.
+    kMessageTypes = ['debug', 'info', 'warn', 'error']
+
+    # @param aEnableColor If True, prefixes are colored.
+    # @param aDebugEnabled If True, debug output is printed.
+    # @param aVerboseEnabled If True, info output is printed.
+    # @param aSink An optional OutputSink to write to. If not given, output goes
+    #        to the console, through a sink shared by all such printers.
+    def __init__(self, aEnableColor=False, aDebugEnabled=False, aVerboseEnabled=False, aSink=None):
         self.mColorEnabled = aEnableColor
         self.mDebugEnabled = aDebugEnabled
         self.mVerboseEnabled = aVerboseEnabled
+        self.mSink = aSink or getDefaultSink()
+
+        # A mapping of message types to the number of messages of that type that
+        # were printed.
+        self.mMessageCounts = {}
+        for messageType in self.kMessageTypes:
+            self.mMessageCounts[messageType] = 0
 
     # Print debug output to the console, if debug output is enabled, or do
     # nothing. Most verbose.
@@ -38,6 +212,41 @@ class PrettyPrinter:
     def error(self, aMessage):
         self.printColor('error', aMessage)
 
+    # @returns True, if debug output is printed by this PrettyPrinter; False,
+    #          otherwise. Callers can check this before building expensive debug
+    #          messages.
+    def isDebugEnabled(self):
+        return self.mDebugEnabled
+
+    # @returns The OutputSink this PrettyPrinter writes to.
+    def getSink(self):
+        return self.mSink
+
+    # Retrieve the number of messages of a given type that were printed.
+    #
+    # @param aType One of debug, info, warn, or error.
+    def getMessageCount(self, aType):
+        return self.mMessageCounts.get(aType, 0)
+
+    # @returns A mapping of each message type to the number of messages of that
+    #          type that were printed.
+    def getMessageCounts(self):
+        return dict(self.mMessageCounts)
+
+    # Write out any output buffered by this PrettyPrinter's sink.
+    def flush(self):
+        self.mSink.flush()
+
+    # Write a message to this PrettyPrinter's sink, and count it.
+    #
+    # @param aType The type of message, or None.
+    # @param aPrefix The prefix that goes before the message.
+    # @param aMessage The message.
+    def emit(self, aType, aPrefix, aMessage):
+        if aType in self.mMessageCounts:
+            self.mMessageCounts[aType] = self.mMessageCounts[aType] + 1
+        self.mSink.write(aType, aPrefix, str(aMessage))
+
     # Determine if color printing is enabled or disabled.
     #
     # @returns True, if color output is disabled for this PrettyPrinter; False,
@@ -53,18 +262,18 @@ class PrettyPrinter:
     #        separate line.
     def printNoColor(self, aType, aMessage):
         if aType == 'warn':
-            print ("WARNING: " + str(aMessage))
+            self.emit(aType, "WARNING: ", aMessage)
         elif aType == 'error':
-            print ("ERROR: " + str(aMessage))
+            self.emit(aType, "ERROR: ", aMessage)
         elif aType == 'info':
             if self.mVerboseEnabled:
-                print ("INFO: " + str(aMessage))
+                self.emit(aType, "INFO: ", aMessage)
         elif aType == 'debug':
             if self.mDebugEnabled:
-                print ("DEBUG: " + str(aMessage))
+                self.emit(aType, "DEBUG: ", aMessage)
         else:
             # just print the message verbatim then, with no additions
-            print(aMessage)
+            self.emit(None, "", aMessage)
 
     # Print output with color to the console using this PrettyPrinter object.
     #
@@ -78,13 +287,13 @@ class PrettyPrinter:
             return
 
         if aType == 'warn':
-            print (self.WARNING + "WARNING: " + self.ENDCOLOR + str(aMessage))
+            self.emit(aType, self.WARNING + "WARNING: " + self.ENDCOLOR, aMessage)
         elif aType == 'error':
-            print (self.ERROR + "ERROR: " + self.ENDCOLOR + str(aMessage))
+            self.emit(aType, self.ERROR + "ERROR: " + self.ENDCOLOR, aMessage)
         elif aType == 'info':
             if (self.mVerboseEnabled):
-                print (self.INFO + "INFO: " + self.ENDCOLOR + str(aMessage))
+                self.emit(aType, self.INFO + "INFO: " + self.ENDCOLOR, aMessage)
         else:
             # we assume that the type was 'debug' then
             if self.mDebugEnabled:
-                print (self.DEBUG + "DEBUG: " + self.ENDCOLOR + str(aMessage))
+                self.emit('debug', self.DEBUG + "DEBUG: " + self.ENDCOLOR, aMessage)
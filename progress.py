@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import signal
+import threading
+
+# Reports of the progress and state of a long-running check, on demand (when
+# the process receives SIGUSR1) or at an interval, for finding out what a check
+# that seems stuck is doing.
+#
+# The reports are made by a thread of their own, which reads where the parse is
+# from the IIDChecker's mParseProgress, which parsePatch() replaces at the start
+# of each file section and interface, so almost nothing is added to the parse
+# loop. (The position reported is that of the start of the section or interface
+# being parsed.) The signal handler only wakes that thread, as it interrupts
+# the checking thread, which may be holding the locks the report needs.
+#
+# Each report is a JSON object. Reports written to stderr are appended, one per
+# line; a report file is replaced by each report, atomically, so it always holds
+# a whole one.
+
+
+# Find the innermost frame, on a thread's stack, of code in a module.
+#
+# @param aFrame The innermost frame of the thread.
+# @param aModuleName The name of the module, e.g. 'vectorparse'.
+#
+# @returns The frame, or None, if no code in the module is running on the
+#          thread.
+def findModuleFrame(aFrame, aModuleName):
+    frame = aFrame
+    while frame is not None:
+        if frame.f_globals.get('__name__') == aModuleName:
+            return frame
+        frame = frame.f_back
+    return None
+
+
+# @class ProgressReporter Reports the progress of an IIDChecker's check, made
+#        on the thread that starts the reporter.
+class ProgressReporter:
+
+    # Create a new ProgressReporter.
+    #
+    # @param aChecker The IIDChecker whose check to report on.
+    # @param aPath The path of the file to write reports to, or None, to write
+    #        them to stderr.
+    # @param aInterval The number of seconds between reports, or None, to report
+    #        only when asked to with SIGUSR1.
+    def __init__(self, aChecker, aPath=None, aInterval=None):
+        self.mChecker = aChecker
+        self.mPath = aPath
+        self.mInterval = aInterval
+        self.mThreadIdent = None
+        self.mStartTime = None
+        self.mThread = None
+        self.mWakeEvent = threading.Event()
+        self.mStopping = False
+        self.mPreviousHandler = None
+
+    # Start reporting, from a thread of its own. If the platform has SIGUSR1, a
+    # handler for it is installed, so this must be called on the main thread.
+    def start(self):
+        self.mThreadIdent = threading.get_ident()
+        self.mStartTime = time.monotonic()
+
+        if hasattr(signal, 'SIGUSR1'):
+            self.mPreviousHandler = signal.signal(signal.SIGUSR1, self.handleSignal)
+
+        self.mThread = threading.Thread(target=self.run, name="progress reporter", daemon=True)
+        self.mThread.start()
+
+    # Stop reporting, restoring the previous handler for SIGUSR1. A report that
+    # is being made is finished first.
+    def stop(self):
+        if self.mThread is None:
+            return
+
+        self.mStopping = True
+        self.mWakeEvent.set()
+        self.mThread.join()
+        self.mThread = None
+
+        if self.mPreviousHandler is not None:
+            signal.signal(signal.SIGUSR1, self.mPreviousHandler)
+            self.mPreviousHandler = None
+
+    def handleSignal(self, aSignalNumber, aFrame):
+        self.mWakeEvent.set()
+
+    def run(self):
+        while True:
+            self.mWakeEvent.wait(self.mInterval)
+            self.mWakeEvent.clear()
+            if self.mStopping:
+                return
+            self.writeReport(self.createReport())
+
+    # Describe the state of the check.
+    #
+    # @returns A dict, which can be stored as JSON.
+    def createReport(self):
+        elapsedSeconds = time.monotonic() - self.mStartTime
+        report = {'time': time.time(),
+                  'elapsedSeconds': elapsedSeconds,
+                  'offset': self.mChecker.mSectionOffset}
+
+        # the parse under way, if any
+        parseProgress = self.mChecker.mParseProgress
+        if parseProgress is not None:
+            report['engine'] = self.mChecker.kLegacyEngine
+            (report['patchLine'], report['idlFile'], report['interface'], report['interfacesSeen']) = parseProgress
+        else:
+            # the vectorized parser works on the whole patch at once, in stages
+            vectorFrame = findModuleFrame(sys._current_frames().get(self.mThreadIdent), 'vectorparse')
+            if vectorFrame is not None:
+                report['engine'] = self.mChecker.kVectorEngine
+                report['stage'] = vectorFrame.f_code.co_name
+
+        # time per phase, and throughput over the time spent parsing so far
+        metrics = self.mChecker.getMetrics()
+        if metrics is not None:
+            phaseSeconds = metrics.getPhaseSeconds()
+            report['phaseSeconds'] = phaseSeconds
+            report['patchBytes'] = metrics.get('patch_bytes')
+            linesParsed = metrics.get('patch_lines') + (report.get('patchLine') or 0)
+            if phaseSeconds.get('parse'):
+                report['linesPerSecond'] = linesParsed / phaseSeconds['parse']
+
+        cacheSizes = {}
+        rangeCache = self.mChecker.getRangeCache()
+        (hits, misses, charactersRead) = rangeCache.getStatistics()
+        cacheSizes['rangeCache'] = {'files': len(rangeCache), 'hits': hits, 'misses': misses, 'charactersRead': charactersRead}
+
+        verdictCache = self.mChecker.getVerdictCache()
+        if verdictCache is not None:
+            (hits, misses) = verdictCache.getStatistics()
+            cacheSizes['verdictCache'] = {'entries': len(verdictCache), 'hits': hits, 'misses': misses}
+
+        if self.mChecker.mInterfaceGraph is not None:
+            cacheSizes['interfaceGraph'] = {'files': len(self.mChecker.mInterfaceGraph)}
+        report['caches'] = cacheSizes
+
+        return report
+
+    # Write a report to stderr or to the report file.
+    #
+    # @param aReport A dict, as returned by createReport().
+    def writeReport(self, aReport):
+        contents = json.dumps(aReport)
+        if self.mPath is None:
+            sys.stderr.write(contents + "\n")
+            sys.stderr.flush()
+            return
+
+        temporaryPath = self.mPath + ".tmp" + str(os.getpid())
+        reportFile = open(temporaryPath, "w")
+        reportFile.write(contents + "\n")
+        reportFile.close()
+        os.replace(temporaryPath, self.mPath)
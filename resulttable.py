@@ -0,0 +1,293 @@
+# The per-interface bookkeeping of a check: for every interface a patch touches,
+# whether it was changed in a way that requires a new IID, whether its IID was
+# changed, and the lines on which each of those was seen.
+#
+# Interfaces are identified by the name of the IDL file they're in as well as
+# their own name, so that two interfaces with the same name in different files
+# are never confused with one another. All lookups and updates take constant
+# time, so the table stays cheap even for audits of long revision ranges, which
+# can touch tens of thousands of interfaces.
+#
+# The one place where interfaces are matched by name alone is in deciding
+# whether a change was covered by an IID change: an interface that is moved
+# from one IDL file to another gets its new IID in the file it moved to, which
+# also covers the changes (e.g. removals) made to it in the file it left.
+
+
+# @class InterfaceRecord What a check found out about a single interface.
+class InterfaceRecord:
+
+    # Create a new InterfaceRecord, for an interface that hasn't (yet) been seen
+    # to need, or get, a new IID.
+    #
+    # @param aIDLFileName The name of the IDL file in which the interface is
+    #        defined.
+    # @param aInterfaceName The name of the interface.
+    def __init__(self, aIDLFileName, aInterfaceName):
+        self.mIDLFileName = aIDLFileName
+        self.mInterfaceName = aInterfaceName
+        self.mRequiresNewIID = False
+        self.mRevved = False
+
+        # Line numbers, in the patched IDL file, of the changes that were found to
+        # require a new IID (the first since the interface last didn't require
+        # one), and of the interface definitions whose IIDs were changed.
+        self.mChangeLines = []
+        self.mRevLines = []
+
+        # Names of the base interfaces whose changes this interface inherits.
+        self.mChangedBases = []
+
+    def getIDLFileName(self):
+        return self.mIDLFileName
+
+    def getInterfaceName(self):
+        return self.mInterfaceName
+
+    # @returns The (idlFileName, interfaceName) tuple identifying the interface.
+    def getKey(self):
+        return (self.mIDLFileName, self.mInterfaceName)
+
+    # @returns True, if the interface was changed in a way that requires an IID
+    #          change, whether or not the IID was changed.
+    def requiresNewIID(self):
+        return self.mRequiresNewIID
+
+    # @returns True, if the interface's IID was changed in this IDL file.
+    def isRevved(self):
+        return self.mRevved
+
+    # @returns A list of the line numbers, in the patched IDL file, of the changes
+    #          that were found to require a new IID. Changes made after the
+    #          interface was found to require one aren't examined, so aren't
+    #          included.
+    def getChangeLines(self):
+        return self.mChangeLines
+
+    # @returns A list of the line numbers, in the patched IDL file, at which the
+    #          interface's IID was changed.
+    def getRevLines(self):
+        return self.mRevLines
+
+    # @returns A list of the names of the base interfaces (direct or indirect)
+    #          whose changes require this interface to get a new IID.
+    def getChangedBases(self):
+        return self.mChangedBases
+
+
+# @class InterfaceResultTable The InterfaceRecords of a check, keyed by
+#        (idlFileName, interfaceName).
+#
+# Records are kept in the order in which their interfaces were first seen, and
+# the interfaces requiring a new IID are also kept, separately, in the order in
+# which they were (last) found to require one, which is the order in which
+# findings are reported.
+class InterfaceResultTable:
+
+    def __init__(self):
+        self.mRecords = {}
+
+        # The keys of the records that require a new IID. Only the keys of this
+        # dict are used; it serves as an ordered set.
+        self.mRequiringKeys = {}
+
+        # A mapping of interface names to the list of keys of the records for
+        # interfaces with that name, in the order in which they were first seen.
+        self.mKeysByName = {}
+
+        # The names of the interfaces whose IIDs were changed, in any file.
+        self.mRevvedNames = set()
+
+    # Retrieve the record for an interface, creating it if it doesn't exist yet.
+    #
+    # @param aIDLFileName The name of the IDL file in which the interface is
+    #        defined.
+    # @param aInterfaceName The name of the interface.
+    #
+    # @returns The InterfaceRecord.
+    def addInterface(self, aIDLFileName, aInterfaceName):
+        key = (aIDLFileName, aInterfaceName)
+        record = self.mRecords.get(key)
+        if record is None:
+            record = InterfaceRecord(aIDLFileName, aInterfaceName)
+            self.mRecords[key] = record
+            self.mKeysByName.setdefault(aInterfaceName, []).append(key)
+        return record
+
+    # Retrieve the record for an interface.
+    #
+    # @returns The InterfaceRecord, or None, if the interface wasn't seen.
+    def getRecord(self, aIDLFileName, aInterfaceName):
+        return self.mRecords.get((aIDLFileName, aInterfaceName))
+
+    # Record that an interface was changed in a way that requires a new IID.
+    #
+    # @param aIDLFileName The name of the IDL file in which the interface is
+    #        defined.
+    # @param aInterfaceName The name of the interface.
+    # @param aLineNumber The line number of the change, in the patched file.
+    def markRequiresNewIID(self, aIDLFileName, aInterfaceName, aLineNumber):
+        record = self.addInterface(aIDLFileName, aInterfaceName)
+        record.mChangeLines.append(aLineNumber)
+        if not record.mRequiresNewIID:
+            record.mRequiresNewIID = True
+            self.mRequiringKeys[record.getKey()] = None
+
+    # Record that an interface requires a new IID because one of its base
+    # interfaces was changed in a way that requires one.
+    #
+    # @param aIDLFileName The name of the IDL file in which the interface is
+    #        defined.
+    # @param aInterfaceName The name of the interface.
+    # @param aBaseName The name of the base interface that was changed.
+    def markInheritsChange(self, aIDLFileName, aInterfaceName, aBaseName):
+        record = self.addInterface(aIDLFileName, aInterfaceName)
+        if aBaseName not in record.mChangedBases:
+            record.mChangedBases.append(aBaseName)
+        if not record.mRequiresNewIID:
+            record.mRequiresNewIID = True
+            self.mRequiringKeys[record.getKey()] = None
+
+    # Record that an interface no longer requires a new IID (e.g. because it's
+    # being removed entirely). Its evidence is kept.
+    def clearRequiresNewIID(self, aIDLFileName, aInterfaceName):
+        record = self.getRecord(aIDLFileName, aInterfaceName)
+        if record is not None and record.mRequiresNewIID:
+            record.mRequiresNewIID = False
+            del self.mRequiringKeys[record.getKey()]
+
+    # Record that an interface's IID was changed.
+    #
+    # @param aIDLFileName The name of the IDL file in which the interface is
+    #        defined.
+    # @param aInterfaceName The name of the interface.
+    # @param aLineNumber The line number of the interface's definition, in the
+    #        patched file.
+    def markRevved(self, aIDLFileName, aInterfaceName, aLineNumber):
+        record = self.addInterface(aIDLFileName, aInterfaceName)
+        record.mRevved = True
+        record.mRevLines.append(aLineNumber)
+        self.mRevvedNames.add(aInterfaceName)
+
+    # Determine whether an interface requires a new IID.
+    #
+    # @returns True, if the interface was seen, and requires a new IID.
+    def requiresNewIID(self, aIDLFileName, aInterfaceName):
+        return (aIDLFileName, aInterfaceName) in self.mRequiringKeys
+
+    # Determine whether nothing more in a patch can change the verdict for an
+    # interface: it requires a new IID, and its IID was changed in the same IDL
+    # file. (Only its removal can, and that starts with the removal of its IID.)
+    #
+    # @returns True, if the interface was seen, and its verdict is decided.
+    def isDecided(self, aIDLFileName, aInterfaceName):
+        record = self.mRecords.get((aIDLFileName, aInterfaceName))
+        return record is not None and record.mRequiresNewIID and record.mRevved
+
+    # @returns A list of all InterfaceRecords, in the order in which their
+    #          interfaces were first seen.
+    def getRecords(self):
+        return list(self.mRecords.values())
+
+    # @returns A list of the InterfaceRecords of interfaces requiring a new IID.
+    def getRecordsRequiringNewIID(self):
+        return [self.mRecords[key] for key in self.mRequiringKeys]
+
+    # Determine whether an interface requires a new IID that it didn't get,
+    # either in its own IDL file, or in a file it was moved to.
+    #
+    # @param aRecord The InterfaceRecord of the interface.
+    def isUnrevved(self, aRecord):
+        return aRecord.mRequiresNewIID and aRecord.mInterfaceName not in self.mRevvedNames
+
+    # @returns A list of the InterfaceRecords of interfaces that require a new
+    #          IID, but whose IIDs were not changed (see isUnrevved()).
+    def getUnrevvedRecords(self):
+        return [self.mRecords[key] for key in self.mRequiringKeys if key[1] not in self.mRevvedNames]
+
+    # @returns A list of the InterfaceRecords of interfaces whose IIDs were
+    #          changed.
+    def getRevvedRecords(self):
+        return [record for record in self.mRecords.values() if record.mRevved]
+
+    # Retrieve the records of all interfaces with a given name.
+    #
+    # @returns A list of InterfaceRecords, one per IDL file in which an interface
+    #          with the name was seen.
+    def getRecordsForInterface(self, aInterfaceName):
+        return [self.mRecords[key] for key in self.mKeysByName.get(aInterfaceName, [])]
+
+    # Create a table holding only the records of some interfaces. The records
+    # are shared with this table.
+    #
+    # @param aInterfaceNames A collection of the names of the interfaces.
+    #
+    # @returns A new InterfaceResultTable.
+    def selectInterfaces(self, aInterfaceNames):
+        names = set(aInterfaceNames)
+        table = InterfaceResultTable()
+        for (key, record) in self.mRecords.items():
+            if key[1] in names:
+                table.mRecords[key] = record
+                table.mKeysByName.setdefault(key[1], []).append(key)
+
+        table.mRevvedNames = self.mRevvedNames & names
+        for key in self.mRequiringKeys:
+            if key in table.mRecords:
+                table.mRequiringKeys[key] = None
+        return table
+
+    # Add the records of another table to this one. Flags are combined, and the
+    # evidence of records present in both tables is concatenated.
+    #
+    # @param aOtherTable The InterfaceResultTable to add.
+    def update(self, aOtherTable):
+        for otherRecord in aOtherTable.mRecords.values():
+            record = self.addInterface(otherRecord.mIDLFileName, otherRecord.mInterfaceName)
+            record.mChangeLines.extend(otherRecord.mChangeLines)
+            record.mRevLines.extend(otherRecord.mRevLines)
+            for baseName in otherRecord.mChangedBases:
+                if baseName not in record.mChangedBases:
+                    record.mChangedBases.append(baseName)
+            record.mRevved = record.mRevved or otherRecord.mRevved
+
+        self.mRevvedNames.update(aOtherTable.mRevvedNames)
+
+        for key in aOtherTable.mRequiringKeys:
+            record = self.mRecords[key]
+            if not record.mRequiresNewIID:
+                record.mRequiresNewIID = True
+                self.mRequiringKeys[key] = None
+
+    # Convert the table into a form that can be stored as JSON.
+    #
+    # @returns A list, with one list per record.
+    def toList(self):
+        records = []
+        for record in self.mRecords.values():
+            records.append([record.mIDLFileName, record.mInterfaceName, record.mRevved, record.mChangeLines, record.mRevLines])
+        return [records, [list(key) for key in self.mRequiringKeys]]
+
+    # Recreate a table from the output of toList().
+    #
+    # @returns A new InterfaceResultTable.
+    def fromList(aList):
+        table = InterfaceResultTable()
+        (records, requiringKeys) = aList
+        for (idlFileName, interfaceName, revved, changeLines, revLines) in records:
+            record = table.addInterface(idlFileName, interfaceName)
+            record.mRevved = revved
+            record.mChangeLines = list(changeLines)
+            record.mRevLines = list(revLines)
+            if revved:
+                table.mRevvedNames.add(interfaceName)
+
+        for (idlFileName, interfaceName) in requiringKeys:
+            table.mRecords[(idlFileName, interfaceName)].mRequiresNewIID = True
+            table.mRequiringKeys[(idlFileName, interfaceName)] = None
+        return table
+
+    def __len__(self):
+        return len(self.mRecords)
+
+    fromList = staticmethod(fromList)
@@ -2,7 +2,7 @@
 
 from setuptools import setup
 
-entryPoints = {'console_scripts': ['checkiid = checkiid:runMain']}
+entryPoints = {'console_scripts': ['checkiid = checkiidhook:runHook']}
 
 setup(name='CheckIID',
       version='1.0.4',
@@ -10,7 +10,8 @@ setup(name='CheckIID',
       author='Scott Johnson',
       author_email='sjohnson@mozilla.com',
       url='https://github.com/jwir3/checkiid',
-      py_modules=['idlutils', 'prettyprinter', 'checkiid'],
+      py_modules=['idlutils', 'prettyprinter', 'checkiid', 'checkiidhook', 'hgutils', 'verdictcache', 'watcher', 'uuidindex', 'patchinput', 'metrics', 'resulttable', 'vectorparse', 'interfacegraph', 'patchindex', 'checkpoint', 'checkevents', 'treeverify', 'netdiff', 'progress'],
       entry_points=entryPoints,
-      requires=['argparse', 'difflib']
+      requires=['argparse', 'difflib'],
+      extras_require={'numpy': ['numpy']}
       )
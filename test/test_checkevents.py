@@ -0,0 +1,103 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from metrics import CheckMetrics
+from patchinput import PatchBuffer
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+# A patch whose first file section isn't an IDL file, and has a body that can
+# be skipped when the patch is read into a PatchBuffer.
+kMixedPatch = """diff --git a/src/foo.cpp b/src/foo.cpp
+--- a/src/foo.cpp
++++ b/src/foo.cpp
+@@ -1,3 +1,4 @@
+ int a;
++int b;
+ int c;
+ int d;
+diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -1,6 +1,7 @@
+ #include "nsISupports.idl"
+
+ [scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+diff --git a/src/bar.cpp b/src/bar.cpp
+--- a/src/bar.cpp
++++ b/src/bar.cpp
+@@ -1,2 +1,3 @@
+ int e;
++int f;
+ int g;
+"""
+
+
+# Tests that the events dispatched by the parsers are the same whichever way a
+# patch is given to them.
+class CheckEventTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        self.mPatchPath = os.path.join(self.mRootPath, "mixed.diff")
+        patchFile = open(self.mPatchPath, "w")
+        patchFile.write(kMixedPatch)
+        patchFile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check the patch, and return the events dispatched and the 'patch_lines'
+    # metric.
+    def collectEvents(self, aEngine, aFromBuffer, aShadow=False):
+        metrics = CheckMetrics()
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aMetrics=metrics, aEngine=aEngine, aShadow=aShadow)
+        events = []
+        checker.addEventListener(lambda aEvent: events.append(aEvent.toDict()))
+
+        if aFromBuffer:
+            patchBuffer = PatchBuffer.fromFile(self.mPatchPath)
+            checker.check(patchBuffer)
+            patchBuffer.close()
+        else:
+            checker.check(kMixedPatch.splitlines(True))
+
+        return (events, metrics.get('patch_lines'))
+
+    def testBufferEventsMatchListEvents(self):
+        (listEvents, listLineCount) = self.collectEvents(IIDChecker.kLegacyEngine, False)
+        (bufferEvents, bufferLineCount) = self.collectEvents(IIDChecker.kLegacyEngine, True)
+
+        self.assertEqual(bufferEvents, listEvents)
+        self.assertEqual(bufferLineCount, listLineCount)
+        self.assertEqual(listLineCount, len(kMixedPatch.splitlines()))
+
+        # the added method, and the end of the section for nsIFoo.idl
+        self.assertEqual([(event['type'], event['patchLine']) for event in listEvents], [('flagged', 18), ('section', 20)])
+
+    def testVectorEngineEventsMatchListEvents(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy isn't installed")
+
+        (listEvents, listLineCount) = self.collectEvents(IIDChecker.kLegacyEngine, False)
+        for shadow in (False, True):
+            (bufferEvents, bufferLineCount) = self.collectEvents(IIDChecker.kVectorEngine, True, shadow)
+            self.assertEqual(bufferEvents, listEvents)
+            self.assertEqual(bufferLineCount, listLineCount)
+
+
+if __name__ == '__main__':
+    unittest.main()
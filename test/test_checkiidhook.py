@@ -0,0 +1,115 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+kPackageDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, kPackageDirectory)
+
+import checkiid
+import checkiidhook
+
+kCppPatch = b"""diff --git a/src/foo.cpp b/src/foo.cpp
+--- a/src/foo.cpp
++++ b/src/foo.cpp
+@@ -1,2 +1,3 @@
+ int a;
++int b;
+ int c;
+"""
+
+kIDLPatch = kCppPatch + b"""diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -4,4 +4,5 @@ interface nsIFoo : nsISupports
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the hook entry point, which skips the full checker for patches that
+# don't touch any IDL files.
+class RunHookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        self.mPatchPath = os.path.join(self.mRootPath, "change.diff")
+        self.mSavedArgv = sys.argv
+
+    def tearDown(self):
+        sys.argv = self.mSavedArgv
+        shutil.rmtree(self.mRootPath)
+
+    def writePatch(self, aPatchData):
+        patchFile = open(self.mPatchPath, "wb")
+        patchFile.write(aPatchData)
+        patchFile.close()
+
+    # Run the hook in this process, with the full checker's entry point
+    # replaced.
+    #
+    # @param aArguments The command-line arguments.
+    # @param aStdinData The bytes to give the hook on stdin.
+    #
+    # @returns A tuple, (exitCode, runMainArguments), of the code the hook
+    #          exited with, and the arguments runMain() was called with, or None,
+    #          if it wasn't.
+    def runHook(self, aArguments, aStdinData=b""):
+        sys.argv = ['checkiidhook'] + aArguments
+        stdin = mock.Mock()
+        stdin.buffer = io.BytesIO(aStdinData)
+        with mock.patch.object(sys, 'stdin', stdin), \
+             mock.patch.object(checkiid, 'runMain', return_value=1) as runMain, \
+             mock.patch.object(checkiid, 'exitProcess', side_effect=SystemExit) as exitProcess:
+            with self.assertRaises(SystemExit) as context:
+                checkiidhook.runHook()
+
+        if not runMain.called:
+            return (context.exception.code, None)
+
+        exitProcess.assert_called_once_with(1)
+        return (None, runMain.call_args[0])
+
+    def testPatchWithoutIDLFilesSkipsChecker(self):
+        self.assertEqual(self.runHook(['-n', self.mRootPath], kCppPatch), (0, None))
+
+        self.writePatch(kCppPatch)
+        self.assertEqual(self.runHook(['-n', '-V', self.mRootPath, self.mPatchPath]), (0, None))
+
+        # checkiid isn't even imported
+        process = subprocess.run([sys.executable, "-c", "import sys, checkiidhook\n"
+                                                        "try:\n"
+                                                        "    checkiidhook.runHook()\n"
+                                                        "except SystemExit as exception:\n"
+                                                        "    print(exception.code, 'checkiid' in sys.modules)\n",
+                                  self.mRootPath],
+                                 input=kCppPatch, stdout=subprocess.PIPE, cwd=kPackageDirectory)
+        self.assertEqual(process.stdout.split(), [b"0", b"False"])
+
+    def testPatchWithIDLFilesReachesChecker(self):
+        # the patch read from stdin is passed on as it was read
+        self.assertEqual(self.runHook(['-n', self.mRootPath], kIDLPatch), (None, (kIDLPatch, )))
+        self.assertEqual(self.runHook(['-n', self.mRootPath, 'stdin'], kIDLPatch), (None, (kIDLPatch, )))
+
+        # a patch file is opened again by the checker
+        self.writePatch(kIDLPatch)
+        self.assertEqual(self.runHook(['-n', self.mRootPath, self.mPatchPath]), (None, (None, )))
+
+    def testOtherSwitchesReachChecker(self):
+        self.writePatch(kCppPatch)
+        for switch in ['-d', '--help', '--only-file=nsIFoo.idl']:
+            self.assertEqual(self.runHook([switch, self.mRootPath, self.mPatchPath]), (None, (None, )), switch)
+
+        # too many arguments are an error for the checker to report
+        self.assertEqual(self.runHook([self.mRootPath, self.mPatchPath, self.mPatchPath]), (None, (None, )))
+
+
+if __name__ == '__main__':
+    unittest.main()
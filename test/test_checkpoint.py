@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from checkpoint import CheckpointFile
+from patchinput import PatchBuffer
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kTestDirectory = os.path.dirname(os.path.abspath(__file__))
+
+
+# @class RecordingCheckpointFile A CheckpointFile that saves a checkpoint at
+#        every opportunity, and keeps a copy of each one.
+class RecordingCheckpointFile(CheckpointFile):
+
+    def __init__(self, aPath):
+        CheckpointFile.__init__(self, aPath, 0)
+        self.mSavedStates = []
+
+    def save(self, aState):
+        CheckpointFile.save(self, aState)
+        self.mSavedStates.append(json.loads(json.dumps(aState)))
+
+
+# Tests that a check resumed from a checkpoint has the same outcome as one that
+# was never interrupted.
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        self.mCheckpointPath = os.path.join(self.mRootPath, "check.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check a patch, with the given CheckpointFile.
+    #
+    # @returns A tuple, (outcome, warningCount), where outcome holds everything
+    #          the check found.
+    def check(self, aPatchPath, aCheckpointFile):
+        printer = PrettyPrinter(False, False, False, NullSink())
+        checker = IIDChecker(self.mRootPath, printer, aCheckpointFile=aCheckpointFile)
+        patchBuffer = PatchBuffer.fromFile(aPatchPath)
+        result = checker.check(patchBuffer)
+        patchBuffer.close()
+
+        outcome = (result.getResultTable().toList(), result.getMissingIDLFiles(),
+                   [record.getKey() for record in result.getUnrevvedRecords()])
+        return (outcome, printer.getMessageCount('warn'))
+
+    def checkResumedPatch(self, aPatchName):
+        patchPath = os.path.join(kTestDirectory, aPatchName)
+        (expectedOutcome, expectedWarningCount) = self.check(patchPath, None)
+
+        recorder = RecordingCheckpointFile(self.mCheckpointPath)
+        self.assertEqual(self.check(patchPath, recorder), (expectedOutcome, expectedWarningCount))
+        self.assertTrue(recorder.mSavedStates)
+
+        # resume from the first, last and a few checkpoints in between, as if the
+        # check had been interrupted right after each of them was saved
+        savedStates = recorder.mSavedStates
+        for state in savedStates[::max(1, len(savedStates) // 8)] + savedStates[-1:]:
+            CheckpointFile(self.mCheckpointPath).save(state)
+            checkpointFile = CheckpointFile(self.mCheckpointPath)
+            self.assertTrue(checkpointFile.loadResumeState())
+            self.assertEqual(self.check(patchPath, checkpointFile), (expectedOutcome, expectedWarningCount))
+
+    def testResumedCheckMatchesUninterruptedCheck(self):
+        self.checkResumedPatch("firefox-22-idl-changes.diff")
+
+    def testResumedCheckOfSmallPatchMatchesUninterruptedCheck(self):
+        self.checkResumedPatch("interface-rename.diff")
+
+    def testCheckpointOfDifferentPatchIsIgnored(self):
+        recorder = RecordingCheckpointFile(self.mCheckpointPath)
+        self.check(os.path.join(kTestDirectory, "firefox-22-idl-changes.diff"), recorder)
+        CheckpointFile(self.mCheckpointPath).save(recorder.mSavedStates[-1])
+
+        patchPath = os.path.join(kTestDirectory, "interface-rename.diff")
+        (expectedOutcome, expectedWarningCount) = self.check(patchPath, None)
+        checkpointFile = CheckpointFile(self.mCheckpointPath)
+        checkpointFile.loadResumeState()
+        self.assertEqual(self.check(patchPath, checkpointFile), (expectedOutcome, expectedWarningCount + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
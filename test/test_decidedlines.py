@@ -0,0 +1,120 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkiid
+from checkiid import IIDChecker
+from metrics import CheckMetrics
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kTestDirectory = os.path.dirname(os.path.abspath(__file__))
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(33333333-3333-3333-3333-333333333333)]
+interface nsIFoo : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+# Revs nsIFoo's IID and adds a method to it, which decides its verdict. After
+# that come the removal of one of its methods and of its closing brace, which
+# would clear the interface if it were being removed, and then the removal of
+# nsIGone, which starts with an IID and so can't be skipped.
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -1,15 +1,8 @@
+ #include "nsISupports.idl"
+ 
+-[scriptable, uuid(11111111-1111-1111-1111-111111111111)]
++[scriptable, uuid(33333333-3333-3333-3333-333333333333)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+-  void qux();
+-};
+-
+-[scriptable, uuid(22222222-2222-2222-2222-222222222222)]
+-interface nsIGone : nsISupports
+-{
+-  void gone();
+ };
+"""
+
+
+# Tests that the lines skipped once an interface's verdict is decided can't
+# change the outcome of a check.
+class DecidedLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), "w")
+        idlFile.write(kIDLFileContents)
+        idlFile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check a patch with the legacy engine.
+    #
+    # @param aSkipLines False, to examine every line, even once the verdict for
+    #        its interface is decided.
+    #
+    # @returns A tuple, (outcome, decidedLineCount), of the records, missing
+    #          files and events of the check, and the number of lines skipped.
+    def check(self, aPatchLines, aRootPath, aSkipLines):
+        metrics = CheckMetrics()
+        checker = IIDChecker(aRootPath, PrettyPrinter(False, False, False, NullSink()), aMetrics=metrics)
+        events = []
+        checker.addEventListener(lambda aEvent: events.append(aEvent.toDict()))
+
+        if aSkipLines:
+            result = checker.check(aPatchLines)
+        else:
+            with mock.patch.object(checkiid, 'isPlainHunkLine', return_value=False):
+                result = checker.check(aPatchLines)
+
+        records = [(record.getKey(), record.mRequiresNewIID, record.mRevved) for record in result.getResultTable().getRecords()]
+        return ((records, result.getMissingIDLFiles(), [event for event in events if event['type'] in ('flagged', 'cleared')]),
+                metrics.get('decided_lines'))
+
+    # The closing brace can only clear an interface whose IID line was removed
+    # with no addition since, and an addition is what revs an interface, so
+    # the brace can't clear an interface whose verdict is decided. Lines that
+    # could start a removal mention an IID, and aren't skipped.
+    def testLaterRemovalsAreStillSeen(self):
+        (outcome, decidedLineCount) = self.check(kPatch.splitlines(True), self.mRootPath, True)
+        self.assertEqual(outcome, self.check(kPatch.splitlines(True), self.mRootPath, False)[0])
+
+        # the lines from ' void baz();' to the blank line were skipped, but
+        # nsIGone's removal wasn't
+        self.assertEqual(decidedLineCount, 4)
+        self.assertEqual(outcome[0], [(('nsIFoo.idl', 'nsIFoo'), True, True), (('nsIFoo.idl', 'nsIGone'), False, False)])
+        self.assertEqual([(event['type'], event['interface']) for event in outcome[2]], [('flagged', 'nsIFoo')])
+
+    def testFixtures(self):
+        for fileName in sorted(os.listdir(kTestDirectory)):
+            if not fileName.endswith(".diff"):
+                continue
+
+            patchFile = open(os.path.join(kTestDirectory, fileName), errors='surrogateescape')
+            patchLines = patchFile.readlines()
+            patchFile.close()
+
+            (outcome, decidedLineCount) = self.check(patchLines, self.mRootPath, True)
+            self.assertEqual(outcome, self.check(patchLines, self.mRootPath, False)[0], fileName)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import difflib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kOldIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(11111111-1111-1111-1111-111111111111)]
+interface nsIA : nsISupports
+{
+  void a1();
+  void a2();
+};
+
+[scriptable, uuid(22222222-2222-2222-2222-222222222222)]
+interface nsIB : nsISupports
+{
+  void b1();
+  void b2();
+  void b3();
+  void b4();
+};
+"""
+
+# nsIA gets a new IID and a new method; nsIB only a new method
+kNewIDLFileContents = kOldIDLFileContents.replace("11111111-1111-1111-1111-111111111111", "33333333-3333-3333-3333-333333333333") \
+                                         .replace("  void a2();\n", "  void a2();\n  void a3();\n") \
+                                         .replace("  void b2();\n", "  void b2();\n  void b5();\n")
+
+
+# Tests that the interface a hunk is in is looked up in the file when the hunk's
+# context line doesn't name one (as in diffs made without function context).
+class EnclosingInterfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        self.createPatch(kOldIDLFileContents, kNewIDLFileContents)
+
+    # Write the new contents of nsIAB.idl to the tree, and diff it against the
+    # old contents, into mPatchLines.
+    def createPatch(self, aOldContents, aNewContents):
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIAB.idl"), "w")
+        idlFile.write(aNewContents)
+        idlFile.close()
+
+        self.mPatchLines = ["diff --git a/dom/nsIAB.idl b/dom/nsIAB.idl\n"]
+        self.mPatchLines.extend(difflib.unified_diff(aOldContents.splitlines(True), aNewContents.splitlines(True),
+                                                     "a/dom/nsIAB.idl", "b/dom/nsIAB.idl", n=1))
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def check(self, aEngine):
+        result = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aEngine=aEngine).check(self.mPatchLines)
+        return ([record.getKey() for record in result.getUnrevvedRecords()], sorted(result.getRevvedInterfaces()))
+
+    def testHunkWithoutInterfaceContext(self):
+        # the last hunk's context line is bare, and it comes after one in nsIA
+        self.assertEqual([line for line in self.mPatchLines if line.startswith("@@")][-1].rstrip(), "@@ -14,2 +15,3 @@")
+        self.assertEqual(self.check(IIDChecker.kLegacyEngine), ([('nsIAB.idl', 'nsIB')], ['nsIA']))
+
+    def testBracesInSpecialBlocksAreIgnored(self):
+        # braces in a comment or C++ block in nsIA don't end its body early, or
+        # keep it open over nsIB
+        for (before, after) in [("  void a1();\n", "  void a1();\n  // a { in a comment\n"),
+                                ("  void a1();\n", "  void a1();\n  /* a } in a\n     comment { */\n"),
+                                ("};\n\n[scriptable, uuid(2222", "%{C++\n  struct S {\n%}\n};\n\n[scriptable, uuid(2222")]:
+            oldContents = kOldIDLFileContents.replace(before, after)
+            self.createPatch(oldContents, kNewIDLFileContents.replace(before, after))
+            self.assertNotIn(after, "".join(self.mPatchLines))
+            self.assertEqual(self.check(IIDChecker.kLegacyEngine), ([('nsIAB.idl', 'nsIB')], ['nsIA']), after)
+
+            printer = PrettyPrinter(False, False, False, NullSink())
+            index = IIDChecker(self.mRootPath, printer).getRangeCache().getInterfaceIndexForFilePath(os.path.join(self.mRootPath, "dom", "nsIAB.idl"), printer)
+            self.assertEqual([span.getName() for span in index.getSpans()], ['nsIA', 'nsIB'])
+
+    def testVectorEngineMatchesLegacyEngine(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy isn't installed")
+
+        self.assertEqual(self.check(IIDChecker.kVectorEngine), self.check(IIDChecker.kLegacyEngine))
+
+
+if __name__ == '__main__':
+    unittest.main()
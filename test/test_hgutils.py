@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hgutils
+from checkiid import attributeRevisionRange
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(%s)]
+interface %s : nsISupports
+{
+  void baz();
+%s};
+"""
+
+
+# Tests of revision ranges in an hg repository with a merge in them.
+class RevisionRangeTest(unittest.TestCase):
+
+    def setUp(self):
+        if shutil.which('hg') is None:
+            self.skipTest("hg isn't installed")
+
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+
+        # 0 adds nsIA and nsIB; 1 changes nsIA on a branch forked at 0; 2 (the
+        # start of the range) changes nsIB; 3 merges 1 into 2; 4 changes nsIB
+        self.runHg(['init'])
+        self.writeIDLFile("a.idl", "nsIA", "11111111-1111-1111-1111-111111111111", "")
+        self.writeIDLFile("b.idl", "nsIB", "22222222-2222-2222-2222-222222222222", "")
+        self.commit("add nsIA and nsIB", ['--addremove'])
+        self.writeIDLFile("a.idl", "nsIA", "11111111-1111-1111-1111-111111111111", "  void qux();\n")
+        self.commit("change nsIA on a branch")
+        self.runHg(['update', '0'])
+        self.writeIDLFile("b.idl", "nsIB", "33333333-3333-3333-3333-333333333333", "  void qux();\n")
+        self.commit("change nsIB, with a new IID")
+        self.runHg(['merge', '1'])
+        self.commit("merge the branch")
+        self.writeIDLFile("b.idl", "nsIB", "44444444-4444-4444-4444-444444444444", "  void qux();\n  void quux();\n")
+        self.commit("change nsIB again, with a new IID")
+
+        self.mNodes = hgutils.runHg(self.mRootPath, ['log', '-r', '0:4', '--template', '{node|short}\n']).split()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def runHg(self, aArgs):
+        subprocess.check_call(['hg', '--cwd', self.mRootPath] + aArgs, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def commit(self, aMessage, aExtraArgs=[]):
+        self.runHg(['commit', '-u', 'test', '-m', aMessage] + aExtraArgs)
+
+    def writeIDLFile(self, aName, aInterfaceName, aIID, aExtraLines):
+        idlFile = open(os.path.join(self.mRootPath, "dom", aName), "w")
+        idlFile.write(kIDLFileContents % (aIID, aInterfaceName, aExtraLines))
+        idlFile.close()
+
+    def testRangeIncludesMergedBranch(self):
+        # the merge itself is left out, but the changeset it merged in isn't
+        self.assertEqual(hgutils.getRevisionsInRange(self.mRootPath, '2', '4'), [self.mNodes[1], self.mNodes[4]])
+
+    def testFindingAttributedToMergedChangeset(self):
+        (rangeResult, attribution) = attributeRevisionRange(self.mRootPath, '2', '4', PrettyPrinter(False, False, False, NullSink()))
+
+        self.assertEqual([record.getKey() for record in rangeResult.getUnrevvedRecords()], [('a.idl', 'nsIA')])
+        self.assertEqual(attribution, {('a.idl', 'nsIA'): [self.mNodes[1]]})
+
+
+if __name__ == '__main__':
+    unittest.main()
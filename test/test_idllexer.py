@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from idlutils import IDLLexer
+from idlutils import LineStateMap
+
+kCode = LineStateMap.kCode
+kComment = LineStateMap.kComment
+kCpp = LineStateMap.kCpp
+kMixed = LineStateMap.kMixed
+
+
+# Tests of the classification of the lines of IDL files by IDLLexer.
+class IDLLexerTest(unittest.TestCase):
+
+    # Classify some lines with a new lexer.
+    #
+    # @returns The LineStateMap of the lines.
+    def lex(self, aText):
+        lexer = IDLLexer()
+        for line in aText.splitlines(True):
+            lexer.addLine(line)
+        return lexer.getLineStates()
+
+    def getStates(self, aText):
+        return list(self.lex(aText).getStates())
+
+    def testBlockCommentOnOneLine(self):
+        self.assertEqual(self.getStates("/* a comment */\n"
+                                        "  /* one */ /* two */\n"
+                                        "void a();\n"),
+                         [kComment, kComment, kCode])
+
+    def testCommentTokensInCppBlock(self):
+        self.assertEqual(self.getStates("%{C++\n"
+                                        "/* not a comment\n"
+                                        "%}\n"
+                                        "void a();\n"),
+                         [kCpp, kCpp, kCpp, kCode])
+
+    def testCppTokensInComment(self):
+        self.assertEqual(self.getStates("/* a comment\n"
+                                        "%{C++\n"
+                                        "*/\n"
+                                        "void a();\n"),
+                         [kComment, kComment, kComment, kCode])
+
+    def testCodeMixedWithComment(self):
+        self.assertEqual(self.getStates("void a(); // trailing\n"
+                                        "/* leading */ void b();\n"
+                                        "void c(); /* opens\n"
+                                        "closes */ void d();\n"
+                                        "void e(); %{C++ int f; %}\n"),
+                         [kMixed, kMixed, kMixed, kMixed, kMixed])
+
+    def testUnterminatedBlockAtEndOfFile(self):
+        lineStates = self.lex("void a();\n"
+                              "/* never\n"
+                              "\n"
+                              "closed")
+        self.assertEqual(list(lineStates.getStates()), [kCode, kComment, kComment, kComment])
+        self.assertEqual([(blockRange.getStartLine(), blockRange.getEndLine()) for blockRange in lineStates.getRanges("a.idl")], [(2, 4)])
+
+    def testRangesSkipMixedLines(self):
+        lineStates = self.lex("/* one\n"
+                              "   two */\n"
+                              "void a(); /* three */\n"
+                              "%{C++\n"
+                              "%}\n")
+        self.assertEqual([(blockRange.getStartLine(), blockRange.getEndLine()) for blockRange in lineStates.getRanges("a.idl")], [(1, 2), (4, 5)])
+        self.assertTrue(lineStates.isSpecialLine(2))
+        self.assertFalse(lineStates.isSpecialLine(3))
+        self.assertFalse(lineStates.isSpecialLine(6))
+
+    def testCodeIsKept(self):
+        lexer = IDLLexer(True)
+        codes = []
+        for line in ["interface nsIA { // a {\n", "  /* } */ void a(); %{C++ } %}\n", "};\n"]:
+            lexer.addLine(line)
+            codes.append(lexer.getLastCode().strip())
+        self.assertEqual(codes, ["interface nsIA {", "void a();", "};"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from interfacegraph import InterfaceGraph
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+# The text of an IDL file defining a single interface.
+kIDLFileTemplate = """#include "%(include)s"
+
+[scriptable, uuid(%(iid)s)]
+interface %(name)s : %(base)s
+{
+  void %(method)s();
+};
+"""
+
+# A patch that adds a method to nsIBase, without changing its IID.
+kPatch = """diff --git a/dom/nsIBase.idl b/dom/nsIBase.idl
+--- a/dom/nsIBase.idl
++++ b/dom/nsIBase.idl
+@@ -4,3 +4,4 @@
+ interface nsIBase : nsISupports
+ {
++  void added();
+   void base();
+"""
+
+
+# Tests of the inheritance graph of the interfaces in a tree, and of the
+# interfaces a check flags because one of their bases changed.
+class InterfaceGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+
+        # nsILeaf derives from nsIMid, which derives from nsIBase
+        self.writeInterface("nsIBase", "nsISupports", "11111111-1111-1111-1111-111111111111")
+        self.writeInterface("nsIMid", "nsIBase", "22222222-2222-2222-2222-222222222222")
+        self.writeInterface("nsILeaf", "nsIMid", "33333333-3333-3333-3333-333333333333")
+        self.writeInterface("nsIOther", "nsISupports", "44444444-4444-4444-4444-444444444444")
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def writeInterface(self, aName, aBaseName, aIID):
+        idlFile = open(os.path.join(self.mRootPath, "dom", aName + ".idl"), "w")
+        idlFile.write(kIDLFileTemplate % {'include': aBaseName + ".idl", 'iid': aIID, 'name': aName, 'base': aBaseName, 'method': aName[3:].lower()})
+        idlFile.close()
+
+    def createGraph(self):
+        graph = InterfaceGraph(self.mRootPath)
+        graph.refresh()
+        return graph
+
+    def testDescendantsAreFlagged(self):
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aInterfaceGraph=self.createGraph())
+        result = checker.check(kPatch.splitlines(True))
+
+        records = dict((record.getKey(), record) for record in result.getUnrevvedRecords())
+        self.assertEqual(sorted(records), [('nsIBase.idl', 'nsIBase'), ('nsILeaf.idl', 'nsILeaf'), ('nsIMid.idl', 'nsIMid')])
+        self.assertEqual(records[('nsIMid.idl', 'nsIMid')].getChangedBases(), ['nsIBase'])
+        self.assertEqual(records[('nsILeaf.idl', 'nsILeaf')].getChangedBases(), ['nsIBase'])
+
+        # without a graph, only the changed interface is
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+        self.assertEqual([record.getKey() for record in checker.check(kPatch.splitlines(True)).getUnrevvedRecords()], [('nsIBase.idl', 'nsIBase')])
+
+    def testCyclesAndMissingBasesEnd(self):
+        self.writeInterface("nsIA", "nsIB", "55555555-5555-5555-5555-555555555555")
+        self.writeInterface("nsIB", "nsIA", "66666666-6666-6666-6666-666666666666")
+        self.writeInterface("nsIOrphan", "nsIMissing", "77777777-7777-7777-7777-777777777777")
+
+        graph = self.createGraph()
+        self.assertEqual(graph.getDescendants("nsIA.idl", "nsIA"), [("nsIB.idl", "nsIB")])
+        self.assertEqual(graph.getDescendants("nsIB.idl", "nsIB"), [("nsIA.idl", "nsIA")])
+        self.assertEqual(graph.getDescendants("nsIMissing.idl", "nsIMissing"), [])
+        self.assertEqual(graph.getDescendants("nsIOrphan.idl", "nsIOrphan"), [])
+
+    def testChangedFilesAreReread(self):
+        self.writeInterface("nsIOuter", "nsISupports", "55555555-5555-5555-5555-555555555555")
+        cachePath = os.path.join(self.mRootPath, "graph.json")
+        self.createGraph().save(cachePath)
+
+        graph = InterfaceGraph.load(self.mRootPath, cachePath)
+        self.assertEqual(graph.refresh(), 0)
+        self.assertEqual(graph.getDescendants("nsIBase.idl", "nsIBase"), [("nsIMid.idl", "nsIMid"), ("nsILeaf.idl", "nsILeaf")])
+
+        # nsIMid now derives from nsIOther; the file's size changes, too
+        self.writeInterface("nsIMid", "nsIOther", "22222222-2222-2222-2222-222222222222")
+        self.assertEqual(graph.refresh(), 1)
+        self.assertEqual(graph.getDescendants("nsIBase.idl", "nsIBase"), [])
+        self.assertEqual(graph.getDescendants("nsIOther.idl", "nsIOther"), [("nsIMid.idl", "nsIMid"), ("nsILeaf.idl", "nsILeaf")])
+        graph.save(cachePath)
+
+        # a file whose size stays the same is re-read if it was modified since
+        midPath = os.path.join(self.mRootPath, "dom", "nsIMid.idl")
+        stat = os.stat(midPath)
+        self.writeInterface("nsIMid", "nsIOuter", "22222222-2222-2222-2222-222222222222")
+        self.assertEqual(os.stat(midPath).st_size, stat.st_size)
+        os.utime(midPath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        graph = InterfaceGraph.load(self.mRootPath, cachePath)
+        self.assertEqual(graph.refresh(), 1)
+        self.assertEqual(graph.getDescendants("nsIOther.idl", "nsIOther"), [])
+        self.assertEqual(graph.getDescendants("nsIOuter.idl", "nsIOuter"), [("nsIMid.idl", "nsIMid"), ("nsILeaf.idl", "nsILeaf")])
+
+
+if __name__ == '__main__':
+    unittest.main()
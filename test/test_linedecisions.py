@@ -0,0 +1,154 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from prettyprinter import PrettyPrinter
+from prettyprinter import ConsoleSink
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(11111111-1111-1111-1111-111111111111)]
+interface nsIKeep : nsISupports
+{
+  void keep();
+};
+"""
+
+# Removes nsIGone, which came before nsIKeep, from the file entirely.
+kRemovalPatch = """diff --git a/dom/nsIKeep.idl b/dom/nsIKeep.idl
+--- a/dom/nsIKeep.idl
++++ b/dom/nsIKeep.idl
+@@ -1,10 +1,3 @@
+ #include "nsISupports.idl"
+ 
+-[scriptable, uuid(22222222-2222-2222-2222-222222222222)]
+-interface nsIGone : nsISupports
+-{
+-  void gone();
+-  [notxpcom] void goneToo();
+-};
+-
+ [scriptable, uuid(11111111-1111-1111-1111-111111111111)]
+"""
+
+# Adds methods to nsIKeep, some with descriptors, after one without.
+kDescriptorPatch = """diff --git a/dom/nsIKeep.idl b/dom/nsIKeep.idl
+--- a/dom/nsIKeep.idl
++++ b/dom/nsIKeep.idl
+@@ -4,3 +4,6 @@
+ interface nsIKeep : nsISupports
+ {
++  void added();
++  [noscript] void hidden();
++  [notxpcom] void native();
+   void keep();
+"""
+
+# Changes nsIKeep, then an IDL file that isn't in the tree.
+kMissingPatch = """diff --git a/dom/nsIKeep.idl b/dom/nsIKeep.idl
+--- a/dom/nsIKeep.idl
++++ b/dom/nsIKeep.idl
+@@ -4,3 +4,4 @@
+ interface nsIKeep : nsISupports
+ {
++  void added();
+   void keep();
+diff --git a/dom/nsIMissing.idl b/dom/nsIMissing.idl
+--- a/dom/nsIMissing.idl
++++ b/dom/nsIMissing.idl
+@@ -4,3 +4,5 @@
+ interface nsIMissing : nsISupports
+ {
++  // a comment
++  void added();
+   void keep();
+"""
+
+kMissingWarning = "WARNING: 'nsIMissing.idl' was not found in local repository. Are you sure your repository is at the correct revision?\n"
+
+
+# Tests that deciding whether each line needs a new IID with a chain of tests
+# that stops at the first one that decides, and looking a file up at the end of
+# its section when no line needed it, give the verdicts and warnings that
+# running every test on every line gives.
+#
+# The expected results are those of the checker before the chain was
+# introduced.
+class LineDecisionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIKeep.idl"), "w")
+        idlFile.write(kIDLFileContents)
+        idlFile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check a patch with both engines, and make sure they agree.
+    #
+    # @returns A tuple, (unrevved, missing, output, events), of the keys of the
+    #          unrevved interfaces, the names of the missing files, the text
+    #          printed, and the (type, interface) of each flagged or cleared
+    #          event.
+    def check(self, aPatch):
+        outcomes = []
+        for engine in [IIDChecker.kLegacyEngine, IIDChecker.kVectorEngine]:
+            if engine == IIDChecker.kVectorEngine:
+                try:
+                    import numpy
+                except ImportError:
+                    continue
+
+            output = io.StringIO()
+            printer = PrettyPrinter(False, False, False, ConsoleSink(output))
+            checker = IIDChecker(self.mRootPath, printer, aEngine=engine)
+            events = []
+            checker.addEventListener(lambda aEvent: events.append((aEvent.toDict()['type'], aEvent.toDict()['interface'])))
+            result = checker.check(aPatch.splitlines(True))
+            printer.flush()
+
+            outcomes.append(([record.getKey() for record in result.getUnrevvedRecords()], result.getMissingIDLFiles(), output.getvalue(),
+                             [event for event in events if event[0] in ('flagged', 'cleared')]))
+
+        for outcome in outcomes[1:]:
+            self.assertEqual(outcome, outcomes[0])
+        return outcomes[0]
+
+    def testInterfaceRemoval(self):
+        # the interface is flagged by its first removed line, and cleared at the
+        # end of its definition
+        self.assertEqual(self.check(kRemovalPatch), ([], [], "", [('flagged', 'nsIGone'), ('cleared', 'nsIGone')]))
+
+    def testDescriptorsInFlaggedInterface(self):
+        self.assertEqual(self.check(kDescriptorPatch), ([('nsIKeep.idl', 'nsIKeep')], [], "", [('flagged', 'nsIKeep')]))
+
+    def testMissingFile(self):
+        self.assertEqual(self.check(kMissingPatch),
+                         ([('nsIKeep.idl', 'nsIKeep'), ('nsIMissing.idl', 'nsIMissing')], ['nsIMissing.idl'], kMissingWarning,
+                          [('flagged', 'nsIKeep'), ('flagged', 'nsIMissing')]))
+
+    def testMissingFileWithoutChangesToCheck(self):
+        # a comment doesn't need the file, so it isn't reported
+        commentPatch = kMissingPatch[kMissingPatch.index("diff --git a/dom/nsIMissing.idl"):].replace("+  void added();\n", "")
+        self.assertEqual(self.check(commentPatch), ([], [], "", []))
+
+        # nor do the lines of an interface being removed, but they do need it to
+        # be looked up
+        removalPatch = kRemovalPatch.replace("nsIKeep.idl", "nsIMissing.idl")
+        self.assertEqual(self.check(removalPatch), ([], ['nsIMissing.idl'], kMissingWarning, [('flagged', 'nsIGone'), ('cleared', 'nsIGone')]))
+
+        # nor does a descriptor that decides on its own
+        descriptorPatch = kMissingPatch[kMissingPatch.index("diff --git a/dom/nsIMissing.idl"):].replace("+  // a comment\n", "+  [notxpcom] void native();\n")
+        self.assertEqual(self.check(descriptorPatch), ([('nsIMissing.idl', 'nsIMissing')], ['nsIMissing.idl'], kMissingWarning, [('flagged', 'nsIMissing')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkiid
+from metrics import CheckMetrics
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -3,5 +3,6 @@
+ [scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the OpenMetrics files written with --metrics-file.
+class CheckMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        self.mMetricsPath = os.path.join(self.mRootPath, "checkiid.prom")
+        self.mSavedArgv = sys.argv
+
+    def tearDown(self):
+        sys.argv = self.mSavedArgv
+        shutil.rmtree(self.mRootPath)
+
+    def writeFile(self, aPath, aContents):
+        outputFile = open(aPath, "w")
+        outputFile.write(aContents)
+        outputFile.close()
+
+    def readMetrics(self):
+        metricsFile = open(self.mMetricsPath)
+        contents = metricsFile.read()
+        metricsFile.close()
+        return contents
+
+    def testFormat(self):
+        metrics = CheckMetrics()
+        metrics.add('unknown_metric', 2)
+        metrics.add('patch_lines', 10)
+        metrics.add('patch_lines', 5)
+        metrics.set('findings', 1, {'kind': 'unrevved'})
+        metrics.set('findings', 0, {'kind': 'conflict "a\\b"\n'})
+        metrics.set('phase_seconds', 0.5, {'phase': 'parse'})
+
+        # known metrics come in the order they're described, each with its help
+        # text, followed by the others, and every value is a gauge
+        self.assertEqual(metrics.formatOpenMetrics(),
+                         "# TYPE checkiid_patch_lines gauge\n"
+                         "# HELP checkiid_patch_lines Lines of the patch parsed.\n"
+                         "checkiid_patch_lines 15\n"
+                         "# TYPE checkiid_phase_seconds gauge\n"
+                         "# HELP checkiid_phase_seconds Wall-clock time spent in each phase of the run, in seconds.\n"
+                         "checkiid_phase_seconds{phase=\"parse\"} 0.5\n"
+                         "# TYPE checkiid_findings gauge\n"
+                         "# HELP checkiid_findings Findings of the run, by kind.\n"
+                         "checkiid_findings{kind=\"conflict \\\"a\\\\b\\\"\\n\"} 0\n"
+                         "checkiid_findings{kind=\"unrevved\"} 1\n"
+                         "# TYPE checkiid_unknown_metric gauge\n"
+                         "checkiid_unknown_metric 2\n"
+                         "# EOF\n")
+
+        # nothing but the end marker is written for a run without metrics
+        self.assertEqual(CheckMetrics().formatOpenMetrics(), "# EOF\n")
+
+    def testWriteReplacesFile(self):
+        self.writeFile(self.mMetricsPath, "checkiid_stale 1\n")
+
+        metrics = CheckMetrics()
+        metrics.set('patch_lines', 3)
+        metrics.write(self.mMetricsPath)
+
+        contents = self.readMetrics()
+        self.assertNotIn("checkiid_stale", contents)
+        self.assertIn("checkiid_patch_lines 3\n", contents)
+        self.assertIn("\ncheckiid_last_run_timestamp_seconds ", contents)
+        self.assertTrue(contents.endswith("# EOF\n"))
+
+        # and no temporary file is left behind
+        self.assertEqual(os.listdir(self.mRootPath), ["checkiid.prom"])
+
+    def testMetricsFileOption(self):
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents)
+        patchPath = os.path.join(self.mRootPath, "change.diff")
+        self.writeFile(patchPath, kPatch)
+
+        sys.argv = ['checkiid', '--log-file', os.path.join(self.mRootPath, "check.log"), '--metrics-file', self.mMetricsPath, self.mRootPath, patchPath]
+        self.assertEqual(checkiid.runMain(), 0)
+
+        lines = self.readMetrics().splitlines()
+        self.assertEqual(lines[-1], "# EOF")
+        self.assertIn("checkiid_patch_lines %d" % len(kPatch.splitlines()), lines)
+        self.assertIn("checkiid_idl_sections 1", lines)
+        self.assertIn("checkiid_range_cache_misses 1", lines)
+
+        # every sample belongs to a metric declared as a gauge before it
+        declaredNames = set()
+        for line in lines[:-1]:
+            if line.startswith("# TYPE "):
+                (name, metricType) = line[len("# TYPE "):].split(" ")
+                self.assertEqual(metricType, "gauge")
+                declaredNames.add(name)
+            elif not line.startswith("# HELP "):
+                self.assertIn(line.split("{")[0].split(" ")[0], declaredNames, line)
+
+
+if __name__ == '__main__':
+    unittest.main()
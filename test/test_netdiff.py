@@ -0,0 +1,89 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from idlutils import FileContentProvider
+from netdiff import consolidatePatch
+from patchinput import PatchBuffer
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+  void baz();
+%s};
+"""
+
+
+# Tests of the consolidation of the sections of 'git log -p' output, listed in
+# either order, for a change that is backed out.
+class ConsolidatePatchTest(unittest.TestCase):
+
+    def setUp(self):
+        if shutil.which('git') is None:
+            self.skipTest("git isn't installed")
+
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+
+        # a method is added to nsIFoo without a new IID, then backed out
+        self.runGit(['init', '-q'])
+        self.writeIDLFile("")
+        self.runGit(['add', '.'])
+        self.commit("add nsIFoo")
+        self.writeIDLFile("  void qux();\n")
+        self.commit("add nsIFoo.qux()")
+        self.writeIDLFile("")
+        self.commit("back out nsIFoo.qux()")
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def runGit(self, aArgs):
+        return subprocess.check_output(['git', '-C', self.mRootPath] + aArgs)
+
+    def commit(self, aMessage):
+        self.runGit(['-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-a', '-m', aMessage])
+
+    def writeIDLFile(self, aExtraLines):
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), "w")
+        idlFile.write(kIDLFileContents % aExtraLines)
+        idlFile.close()
+
+    # Check the log of the last two commits, consolidated or not.
+    #
+    # @returns A tuple, (findings, warningCount).
+    def checkLog(self, aLogArgs, aConsolidate):
+        printer = PrettyPrinter(False, False, False, NullSink())
+        patchBuffer = PatchBuffer(self.runGit(['log', '-p'] + aLogArgs + ['HEAD~2..HEAD']))
+        if aConsolidate:
+            patchBuffer = consolidatePatch(patchBuffer, FileContentProvider(self.mRootPath), printer)
+
+        result = IIDChecker(self.mRootPath, printer).check(patchBuffer)
+        return ([record.getKey() for record in result.getUnrevvedRecords()], printer.getMessageCount('warn'))
+
+    def testBackedOutChangeIsReportedWithoutConsolidation(self):
+        self.assertEqual(self.checkLog(['--reverse'], False)[0], [('nsIFoo.idl', 'nsIFoo')])
+
+    def testBackedOutChangeIsDroppedOldestFirst(self):
+        self.assertEqual(self.checkLog(['--reverse'], True), ([], 0))
+
+    def testBackedOutChangeIsDroppedNewestFirst(self):
+        self.assertEqual(self.checkLog([], True), ([], 0))
+
+    def testMismatchedTreeIsWarnedAbout(self):
+        self.writeIDLFile("  void quux();\n")
+        self.assertEqual(self.checkLog([], True), ([('nsIFoo.idl', 'nsIFoo')], 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from patchindex import PatchIndex
+from patchindex import getIndexPath
+from patchindex import selectPatchSections
+from patchinput import PatchBuffer
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kTestDirectory = os.path.dirname(os.path.abspath(__file__))
+
+
+# Tests that checks of selected files or interfaces of a patch (--only-file and
+# --only-interface) find what a check of the whole patch finds for them.
+class SelectPatchSectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+        # the sidecar index is written next to the patch
+        self.mPatchPath = os.path.join(self.mRootPath, "firefox-22-idl-changes.diff")
+        shutil.copyfile(os.path.join(kTestDirectory, "firefox-22-idl-changes.diff"), self.mPatchPath)
+
+        self.mAllFindings = self.check(None, None)
+        self.assertTrue(self.mAllFindings)
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check the patch, or the sections of it selected for some IDL files and
+    # interfaces.
+    #
+    # @param aIDLFileNames A list of the names of IDL files, or None.
+    # @param aInterfaceNames A list of the names of interfaces, or None.
+    #
+    # @returns A list of the (IDL file name, interface name) keys of the
+    #          findings.
+    def check(self, aIDLFileNames, aInterfaceNames):
+        printer = PrettyPrinter(False, False, False, NullSink())
+        patchBuffer = PatchBuffer.fromFile(self.mPatchPath)
+
+        interfaceNames = None
+        if aIDLFileNames is not None or aInterfaceNames is not None:
+            selectedPatch = selectPatchSections(patchBuffer, self.mPatchPath, aIDLFileNames or [], aInterfaceNames or [], printer)
+            patchBuffer.close()
+            patchBuffer = selectedPatch
+            if aIDLFileNames is None:
+                interfaceNames = aInterfaceNames
+
+        result = IIDChecker(self.mRootPath, printer, aInterfaceNames=interfaceNames).check(patchBuffer)
+        patchBuffer.close()
+        return [record.getKey() for record in result.getUnrevvedRecords()]
+
+    def testOnlyFile(self):
+        for fileName in sorted(set(key[0] for key in self.mAllFindings))[::4]:
+            self.assertEqual(self.check([fileName], None),
+                             [key for key in self.mAllFindings if key[0] == fileName],
+                             fileName)
+
+    def testOnlyInterface(self):
+        for interfaceName in sorted(set(key[1] for key in self.mAllFindings))[::4]:
+            self.assertEqual(self.check(None, [interfaceName]),
+                             [key for key in self.mAllFindings if key[1] == interfaceName],
+                             interfaceName)
+
+    def testIndexIsSavedAndReused(self):
+        expectedFindings = self.check(None, [self.mAllFindings[0][1]])
+        self.assertTrue(os.path.exists(getIndexPath(self.mPatchPath)))
+
+        index = PatchIndex.load(self.mPatchPath)
+        self.assertIsNotNone(index)
+        self.assertEqual(self.check(None, [self.mAllFindings[0][1]]), expectedFindings)
+
+        # an index of a patch that changed since is rebuilt
+        patchFile = open(self.mPatchPath, "a")
+        patchFile.write("\n")
+        patchFile.close()
+        self.assertIsNone(PatchIndex.load(self.mPatchPath))
+        self.assertEqual(self.check(None, [self.mAllFindings[0][1]]), expectedFindings)
+        self.assertIsNotNone(PatchIndex.load(self.mPatchPath))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from metrics import CheckMetrics
+from patchinput import PatchBuffer
+from patchinput import decodePatchLine
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+# A .cpp section that can't affect the check, one that mentions an interface
+# and so might, and an IDL section, with a byte that isn't valid UTF-8 in the
+# first and last.
+kPatchData = b"""preamble
+diff --git a/src/foo.cpp b/src/foo.cpp
+--- a/src/foo.cpp
++++ b/src/foo.cpp
+@@ -1,2 +1,3 @@
+ int a;
++int b = '\xff';
+ int c;
+diff --git a/src/bar.cpp b/src/bar.cpp
+--- a/src/bar.cpp
++++ b/src/bar.cpp
+@@ -1,2 +1,3 @@
+ // see interface nsIFoo
++int d;
+ int e;
+diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -4,4 +4,5 @@ interface nsIFoo : nsISupports
+ interface nsIFoo : nsISupports
+ {
++  void bar(); // caf\xe9
+   void baz();
+ };"""
+
+
+# Tests of reading patches as bytes, and of skipping the file sections that
+# can't affect a check.
+class PatchBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def testSectionsAndLines(self):
+        patchBuffer = PatchBuffer(kPatchData)
+        sections = list(patchBuffer.iterSections())
+        self.assertEqual([decodePatchLine(patchBuffer.getBytes(start, headerEnd)) for (start, headerEnd, end) in sections],
+                         ["", "diff --git a/src/foo.cpp b/src/foo.cpp\n", "diff --git a/src/bar.cpp b/src/bar.cpp\n", "diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl\n"])
+        self.assertEqual(sections[-1][2], len(kPatchData))
+
+        # every line is decoded, even where the bytes aren't UTF-8, and the last
+        # line needn't end in a line break
+        lines = list(patchBuffer.decodeLines(0, len(patchBuffer)))
+        self.assertEqual(len(lines), patchBuffer.countLines(0, len(patchBuffer)))
+        self.assertEqual("".join(lines).encode('utf-8', 'surrogateescape'), kPatchData)
+        self.assertEqual(lines[-1], " };")
+
+    def testStreamAndFileBuffersMatch(self):
+        patchPath = os.path.join(self.mRootPath, "change.diff")
+        patchFile = open(patchPath, "wb")
+        patchFile.write(kPatchData)
+        patchFile.close()
+
+        fileBuffer = PatchBuffer.fromFile(patchPath)
+        streamBuffer = PatchBuffer.fromStream(io.BytesIO(kPatchData))
+        self.assertEqual(list(fileBuffer.iterSections()), list(streamBuffer.iterSections()))
+        self.assertEqual(bytes(fileBuffer.getBytes(0, len(fileBuffer))), kPatchData)
+        fileBuffer.close()
+
+        # an empty file can't be mapped
+        open(patchPath, "wb").close()
+        self.assertEqual(len(PatchBuffer.fromFile(patchPath)), 0)
+
+    def testIrrelevantSectionsAreSkipped(self):
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aMetrics=CheckMetrics())
+        lines = list(checker.iterBufferLines(PatchBuffer(kPatchData)))
+
+        # only the header of the first .cpp section is passed on
+        self.assertIn("diff --git a/src/foo.cpp b/src/foo.cpp\n", lines)
+        self.assertNotIn("--- a/src/foo.cpp\n", lines)
+        self.assertIn(" // see interface nsIFoo\n", lines)
+        self.assertEqual(checker.getMetrics().get('skipped_sections'), 1)
+
+    def testSkippedSectionsDontChangeCheck(self):
+        def check(aPatch):
+            checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+            events = []
+            checker.addEventListener(lambda aEvent: events.append(aEvent.toDict()))
+            result = checker.check(aPatch)
+            return ([record.getKey() for record in result.getUnrevvedRecords()], result.getMissingIDLFiles(), events)
+
+        expected = check(list(PatchBuffer(kPatchData).decodeLines(0, len(kPatchData))))
+        self.assertEqual(expected[0], [('nsIFoo.idl', 'nsIFoo')])
+
+        # including the line numbers in the patch of what was found
+        self.assertEqual(check(PatchBuffer(kPatchData)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from prettyprinter import PrettyPrinter
+from prettyprinter import OutputSink
+from prettyprinter import ConsoleSink
+from prettyprinter import FileSink
+from prettyprinter import JSONLinesSink
+from prettyprinter import NullSink
+
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -4,4 +4,5 @@ interface nsIFoo : nsISupports
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the buffering of output by sinks, and of when it's written out.
+class OutputSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mTemporaryPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mTemporaryPath)
+
+    def testOutputIsBuffered(self):
+        stream = io.StringIO()
+        printer = PrettyPrinter(False, False, False, ConsoleSink(stream))
+        printer.warn("one")
+        self.assertEqual(stream.getvalue(), "")
+
+        printer.flush()
+        self.assertEqual(stream.getvalue(), "WARNING: one\n")
+
+        # a full buffer is written out without waiting for a flush
+        printer.error("x" * OutputSink.kBufferSize)
+        self.assertTrue(stream.getvalue().endswith("x\n"))
+
+    def testBaseSinkDiscardsOutput(self):
+        sink = OutputSink()
+        sink.write('error', "ERROR: ", "lost")
+        sink.flush()
+        sink.close()
+
+    def testSinksAreNotFlushedAtExit(self):
+        readDescriptor, writeDescriptor = os.pipe()
+        try:
+            with mock.patch('atexit.register') as register:
+                NullSink()
+                ConsoleSink(io.StringIO())
+                FileSink(os.path.join(self.mTemporaryPath, "log")).close()
+                JSONLinesSink(writeDescriptor)
+
+                # nor are the sinks of shadow checkers
+                IIDChecker(self.mTemporaryPath, PrettyPrinter(False, False, False, NullSink()), aEngine=IIDChecker.kVectorEngine, aShadow=True)
+            self.assertEqual(register.call_count, 0)
+        finally:
+            os.close(readDescriptor)
+            os.close(writeDescriptor)
+
+    def testJSONLinesFormat(self):
+        readDescriptor, writeDescriptor = os.pipe()
+        printer = PrettyPrinter(True, False, False, JSONLinesSink(writeDescriptor))
+        printer.warn("careful")
+        printer.flush()
+        os.close(writeDescriptor)
+
+        readFile = os.fdopen(readDescriptor)
+        self.assertEqual(json.loads(readFile.read()), {'level': 'warn', 'message': 'careful'})
+        readFile.close()
+
+
+# Tests that the debug messages of a check are only built when they're printed.
+class DebugOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def getDebugMessages(self, aDebugEnabled):
+        printer = PrettyPrinter(False, aDebugEnabled, False, NullSink())
+        with mock.patch.object(printer, 'debug') as debug:
+            IIDChecker(self.mRootPath, printer).check(kPatch.splitlines(True))
+        return [call[0][0] for call in debug.call_args_list]
+
+    def testPerLineMessagesAreSkipped(self):
+        self.assertIn("Line number 4 is context line.", self.getDebugMessages(True))
+        self.assertEqual([message for message in self.getDebugMessages(False) if message.startswith("Line number")], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from metrics import CheckMetrics
+from progress import ProgressReporter
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kPatch = """diff --git a/src/foo.cpp b/src/foo.cpp
+--- a/src/foo.cpp
++++ b/src/foo.cpp
+@@ -1,2 +1,3 @@
+ int a;
++int b;
+ int c;
+diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -4,4 +4,5 @@ interface nsIFoo : nsISupports
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the progress reports made while a check is under way.
+class ProgressReporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def testReportDescribesParse(self):
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aMetrics=CheckMetrics())
+        reporter = ProgressReporter(checker)
+        reports = []
+
+        # reports are made on the checking thread here, as each interface is
+        # flagged, rather than by the reporter's own thread
+        checker.addEventListener(lambda aEvent: reports.append(reporter.createReport()))
+        reporter.start()
+        try:
+            checker.check(kPatch.splitlines(True))
+        finally:
+            reporter.stop()
+
+        self.assertEqual(len(reports), 2)
+        self.assertEqual((reports[0]['engine'], reports[0]['patchLine'], reports[0]['idlFile'], reports[0]['interface']),
+                         (IIDChecker.kLegacyEngine, 12, "nsIFoo.idl", "nsIFoo"))
+
+        # nothing is being parsed once the check is over
+        report = reporter.createReport()
+        self.assertNotIn('engine', report)
+        self.assertEqual(report['caches']['rangeCache']['files'], len(checker.getRangeCache()))
+
+
+if __name__ == '__main__':
+    unittest.main()
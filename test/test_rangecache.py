@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from idlutils import FileContentProvider
+from idlutils import SpecialBlockRangeCache
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kIDLFileContents = """/* a comment
+   over two lines */
+#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+%{C++
+  int x;
+%}
+  void bar();
+};
+"""
+
+
+# @class CountingContentProvider A FileContentProvider that counts the files it
+#        opens.
+class CountingContentProvider(FileContentProvider):
+
+    def __init__(self, aRootPath):
+        FileContentProvider.__init__(self, aRootPath)
+        self.mOpenedPaths = []
+
+    def openFile(self, aFilePath):
+        self.mOpenedPaths.append(aFilePath)
+        return FileContentProvider.openFile(self, aFilePath)
+
+
+# Tests of the scanning of IDL files for special blocks ahead of time, on worker
+# threads, while a patch is parsed.
+class PrefetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        self.mPrinter = PrettyPrinter(False, False, False, NullSink())
+        self.mContentProvider = CountingContentProvider(self.mRootPath)
+
+        self.mPaths = []
+        for name in ["nsIFoo", "nsIBar"]:
+            path = os.path.join(self.mRootPath, "dom", name + ".idl")
+            idlFile = open(path, "w")
+            idlFile.write(kIDLFileContents.replace("nsIFoo", name))
+            idlFile.close()
+            self.mPaths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def getRanges(self, aCache, aPath):
+        return [(blockRange.getStartLine(), blockRange.getEndLine()) for blockRange in aCache.getRangesForFilePath(aPath, self.mPrinter)]
+
+    def testPrefetchedScanIsUsed(self):
+        cache = SpecialBlockRangeCache(self.mContentProvider)
+        cache.prefetchRangesForFilePath(self.mPaths[0], self.mPrinter)
+        cache.prefetchRangesForFilePath(self.mPaths[0], self.mPrinter)
+        self.assertTrue(cache.waitForFileScan(self.mPaths[0], 10))
+
+        self.assertEqual(self.getRanges(cache, self.mPaths[0]), [(1, 2), (8, 10)])
+        self.assertEqual(cache.getInterfaceIndexForFilePath(self.mPaths[0], self.mPrinter).getSpans()[0].getName(), "nsIFoo")
+        self.assertEqual(self.mContentProvider.mOpenedPaths, [self.mPaths[0]])
+
+        # the same as a scan on demand
+        self.assertEqual(self.getRanges(SpecialBlockRangeCache(), self.mPaths[0]), [(1, 2), (8, 10)])
+
+    def testPrefetchedErrorIsRaised(self):
+        cache = SpecialBlockRangeCache(self.mContentProvider)
+        missingPath = os.path.join(self.mRootPath, "dom", "nsIMissing.idl")
+        cache.prefetchRangesForFilePath(missingPath, self.mPrinter)
+
+        for attempt in range(2):
+            with self.assertRaises(IOError):
+                cache.getRangesForFilePath(missingPath, self.mPrinter)
+        self.assertEqual(self.mContentProvider.mOpenedPaths, [missingPath])
+
+    def testCancelledPrefetchesScanOnDemand(self):
+        cache = SpecialBlockRangeCache(self.mContentProvider)
+        cache.cancelPrefetches()
+        cache.prefetchRangesForFilePath(self.mPaths[0], self.mPrinter)
+        self.assertFalse(cache.isFileScanned(self.mPaths[0]))
+
+        self.assertEqual(self.getRanges(cache, self.mPaths[0]), [(1, 2), (8, 10)])
+
+    def testPatchFileIsPrefetched(self):
+        patchText = "".join("diff --git a/dom/%s b/dom/%s\n--- a/dom/%s\n+++ b/dom/%s\n" % ((os.path.basename(path), ) * 4) for path in self.mPaths)
+        checker = IIDChecker(self.mRootPath, self.mPrinter, aContentProvider=self.mContentProvider)
+
+        patchFile = io.StringIO("header\n" + patchText)
+        patchFile.readline()
+        checker.prefetchIDLFilesInPatch(patchFile)
+        self.assertEqual(patchFile.readline(), "diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl\n")
+
+        for path in self.mPaths:
+            self.assertTrue(checker.getRangeCache().waitForFileScan(path, 10), path)
+        self.assertEqual(sorted(self.mContentProvider.mOpenedPaths), sorted(self.mPaths))
+
+        # input that can't be rewound is left alone
+        checker = IIDChecker(self.mRootPath, self.mPrinter, aContentProvider=CountingContentProvider(self.mRootPath))
+        checker.prefetchIDLFilesInPatch(iter(patchText.splitlines(True)))
+        self.assertEqual(len(checker.getRangeCache()), 0)
+        self.assertFalse(checker.getRangeCache().isFileScanned(self.mPaths[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
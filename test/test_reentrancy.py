@@ -0,0 +1,125 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from checkiid import createDefaultDescriptors
+from idlutils import IDLDescriptor
+from idlutils import SpecialBlockRangeCache
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+  /*
+  [notxpcom] void old();
+  */
+  void baz();
+};
+"""
+
+# Changes a line in the comment of nsIFoo: only the descriptor on it can make
+# it require a new IID.
+kCommentPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -5,4 +5,4 @@ interface nsIFoo : nsISupports
+ {
+   /*
+-  [notxpcom] void older();
++  [notxpcom] void old();
+   */
+"""
+
+# Adds a method to nsIFoo, and changes nsIMissing, which isn't in the tree.
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -8,3 +8,4 @@ interface nsIFoo : nsISupports
+   */
++  void bar();
+   void baz();
+ };
+diff --git a/dom/nsIMissing.idl b/dom/nsIMissing.idl
+--- a/dom/nsIMissing.idl
++++ b/dom/nsIMissing.idl
+@@ -4,3 +4,4 @@
+ interface nsIMissing : nsISupports
+ {
++  void bar();
+   void baz();
+"""
+
+
+# Tests that checkers keep their configuration and state to themselves, so that
+# several can be used in the same process, and at the same time.
+class ReentrancyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), "w")
+        idlFile.write(kIDLFileContents)
+        idlFile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def check(self, aChecker, aPatch):
+        result = aChecker.check(aPatch.splitlines(True))
+        return ([record.getKey() for record in result.getUnrevvedRecords()], result.getMissingIDLFiles())
+
+    def testDescriptorListsAreSeparate(self):
+        descriptorList = createDefaultDescriptors()
+        self.assertIsNot(descriptorList, createDefaultDescriptors())
+
+        withDescriptors = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), descriptorList)
+        withoutDescriptors = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), [])
+        self.assertEqual(self.check(withDescriptors, kCommentPatch), ([('nsIFoo.idl', 'nsIFoo')], []))
+        self.assertEqual(self.check(withoutDescriptors, kCommentPatch), ([], []))
+
+        # nor does either use the shared list
+        IDLDescriptor.kDescriptorList.append(IDLDescriptor("notxpcom", True))
+        try:
+            self.assertEqual(self.check(withoutDescriptors, kCommentPatch), ([], []))
+        finally:
+            IDLDescriptor.kDescriptorList.pop()
+
+    def testPrintersAreSeparate(self):
+        printers = [PrettyPrinter(False, False, False, NullSink()) for index in range(2)]
+        IIDChecker(self.mRootPath, printers[0]).check(kPatch.splitlines(True))
+        self.assertEqual(printers[0].getMessageCount('warn'), 1)
+        self.assertEqual(printers[1].getMessageCount('warn'), 0)
+
+    def testConcurrentChecks(self):
+        expected = self.check(IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink())), kPatch)
+        self.assertEqual(expected, ([('nsIFoo.idl', 'nsIFoo'), ('nsIMissing.idl', 'nsIMissing')], ['nsIMissing.idl']))
+
+        # the checkers share a range cache, as checkers of the same tree may
+        rangeCache = SpecialBlockRangeCache()
+        results = []
+
+        def runChecks():
+            for index in range(20):
+                checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aRangeCache=rangeCache)
+                results.append(self.check(checker, kPatch))
+
+        threads = [threading.Thread(target=runChecks) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [expected] * 80)
+
+
+if __name__ == '__main__':
+    unittest.main()
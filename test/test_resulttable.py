@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from resulttable import InterfaceResultTable
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(%s)]
+interface nsIDup : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+# nsIDup is defined in two files, and changed in both.
+kPatch = """diff --git a/dom/nsIDupA.idl b/dom/nsIDupA.idl
+--- a/dom/nsIDupA.idl
++++ b/dom/nsIDupA.idl
+@@ -4,4 +4,5 @@ interface nsIDup : nsISupports
+ interface nsIDup : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+diff --git a/dom/nsIDupB.idl b/dom/nsIDupB.idl
+--- a/dom/nsIDupB.idl
++++ b/dom/nsIDupB.idl
+@@ -4,4 +4,5 @@ interface nsIDup : nsISupports
+ interface nsIDup : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests that the results of a check are kept per IDL file and interface, rather
+# than per interface name.
+class InterfaceResultTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def testSameNameInDifferentFiles(self):
+        table = InterfaceResultTable()
+        table.markRequiresNewIID("a.idl", "nsIDup", 6)
+        table.markRequiresNewIID("b.idl", "nsIDup", 8)
+        self.assertEqual([record.getKey() for record in table.getUnrevvedRecords()], [("a.idl", "nsIDup"), ("b.idl", "nsIDup")])
+        self.assertEqual(table.getRecord("b.idl", "nsIDup").getChangeLines(), [8])
+
+        # removing the interface from one file leaves the other alone
+        table.clearRequiresNewIID("a.idl", "nsIDup")
+        self.assertFalse(table.requiresNewIID("a.idl", "nsIDup"))
+        self.assertTrue(table.requiresNewIID("b.idl", "nsIDup"))
+        self.assertEqual([record.getKey() for record in table.getUnrevvedRecords()], [("b.idl", "nsIDup")])
+
+        # the evidence of the removed one is kept
+        self.assertEqual(table.getRecord("a.idl", "nsIDup").getChangeLines(), [6])
+        self.assertEqual(len(table.getRecordsForInterface("nsIDup")), 2)
+
+    def testMovedInterfaceIsCovered(self):
+        # a method is removed from nsIMoved where it was, and it gets a new IID in
+        # the file it moved to
+        table = InterfaceResultTable()
+        table.markRequiresNewIID("old.idl", "nsIMoved", 10)
+        table.markRevved("new.idl", "nsIMoved", 3)
+        self.assertEqual(table.getUnrevvedRecords(), [])
+        self.assertFalse(table.isUnrevved(table.getRecord("old.idl", "nsIMoved")))
+
+        # but its verdict in the file it left isn't decided by that
+        self.assertFalse(table.isDecided("old.idl", "nsIMoved"))
+        table.markRevved("old.idl", "nsIMoved", 9)
+        self.assertTrue(table.isDecided("old.idl", "nsIMoved"))
+
+    def testListRoundTrip(self):
+        table = InterfaceResultTable()
+        table.markRequiresNewIID("a.idl", "nsIDup", 6)
+        table.markRequiresNewIID("a.idl", "nsIDup", 7)
+        table.markRevved("b.idl", "nsIDup", 4)
+        table.markRequiresNewIID("b.idl", "nsIOther", 12)
+        table.addInterface("c.idl", "nsIUnchanged")
+
+        copy = InterfaceResultTable.fromList(json.loads(json.dumps(table.toList())))
+        self.assertEqual(copy.toList(), table.toList())
+        self.assertEqual([record.getKey() for record in copy.getUnrevvedRecords()], [("b.idl", "nsIOther")])
+        self.assertEqual([record.getKey() for record in copy.getRevvedRecords()], [("b.idl", "nsIDup")])
+        self.assertEqual(copy.getRecord("a.idl", "nsIDup").getChangeLines(), [6, 7])
+
+    def testCheckReportsEachFile(self):
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        for (fileName, uuid) in [("nsIDupA.idl", "11111111-1111-1111-1111-111111111111"), ("nsIDupB.idl", "22222222-2222-2222-2222-222222222222")]:
+            idlFile = open(os.path.join(self.mRootPath, "dom", fileName), "w")
+            idlFile.write(kIDLFileContents % uuid)
+            idlFile.close()
+
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+        result = checker.check(kPatch.splitlines(True))
+        self.assertEqual([record.getKey() for record in result.getUnrevvedRecords()], [("nsIDupA.idl", "nsIDup"), ("nsIDupB.idl", "nsIDup")])
+
+        # the nsIDup in nsIDupA.idl gets a new IID, which also covers the one in
+        # nsIDupB.idl, as if it had been moved from there
+        revvedPatch = kPatch.replace("@@ -4,4 +4,5 @@ interface nsIDup : nsISupports\n interface nsIDup : nsISupports\n {\n+  void bar();\n   void baz();\n };\n",
+                                     "@@ -3,5 +3,6 @@\n-[scriptable, uuid(33333333-3333-3333-3333-333333333333)]\n+[scriptable, uuid(11111111-1111-1111-1111-111111111111)]\n interface nsIDup : nsISupports\n {\n+  void bar();\n   void baz();\n };\n", 1)
+        self.assertNotEqual(revvedPatch, kPatch)
+        result = checker.check(revvedPatch.splitlines(True))
+        self.assertEqual(result.getUnrevvedRecords(), [])
+        self.assertEqual(sorted(result.getRevvedInterfaces()), ['nsIDup'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+kPackageDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, kPackageDirectory)
+
+import checkiid
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -3,5 +3,6 @@
+ [scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the exit status of the checkiid script, which runMain() returns
+# rather than exiting with itself.
+class RunMainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        self.mPatchPath = os.path.join(self.mRootPath, "change.diff")
+        self.mLogPath = os.path.join(self.mRootPath, "check.log")
+        self.writeFile(self.mPatchPath, kPatch)
+
+        self.mSavedArgv = sys.argv
+
+    def tearDown(self):
+        sys.argv = self.mSavedArgv
+        shutil.rmtree(self.mRootPath)
+
+    def writeFile(self, aPath, aContents):
+        outputFile = open(aPath, "w")
+        outputFile.write(aContents)
+        outputFile.close()
+
+    def readLog(self):
+        logFile = open(self.mLogPath)
+        contents = logFile.read()
+        logFile.close()
+        return contents
+
+    def testTreeMismatchIsReturned(self):
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents.replace("void baz();", "void qux();"))
+
+        sys.argv = ['checkiid', '--log-file', self.mLogPath, '--verify-tree', self.mRootPath, self.mPatchPath]
+        self.assertEqual(checkiid.runMain(), 1)
+        self.assertIn("is not at the revision the patch ends at", self.readLog())
+
+    def testPartialCheckIsReturned(self):
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents)
+
+        # a check that runs out of time right away returns, rather than ending
+        # the process
+        sys.argv = ['checkiid', '--log-file', self.mLogPath, '--deadline', '0', self.mRootPath, self.mPatchPath]
+        self.assertEqual(checkiid.runMain(), 0)
+        self.assertIn("was not fully checked before the deadline", self.readLog())
+
+    def testScriptExitStatus(self):
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents.replace("void baz();", "void qux();"))
+        process = subprocess.run([sys.executable, os.path.join(kPackageDirectory, "checkiid.py"), '-n', '--verify-tree', self.mRootPath, self.mPatchPath],
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(process.returncode, 1)
+        self.assertIn(b"is not at the revision the patch ends at", process.stdout)
+
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents)
+        process = subprocess.run([sys.executable, os.path.join(kPackageDirectory, "checkiid.py"), '-n', self.mRootPath, self.mPatchPath],
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(process.returncode, 0)
+        self.assertIn(b"nsIFoo", process.stdout)
+
+    def testScanUUIDsExitStatus(self):
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), kIDLFileContents)
+
+        sys.argv = ['checkiid', '--log-file', self.mLogPath, '--scan-uuids', self.mRootPath]
+        self.assertEqual(checkiid.runMain(), 0)
+
+        process = subprocess.run([sys.executable, os.path.join(kPackageDirectory, "checkiid.py"), '-n', '-d', '--scan-uuids', self.mRootPath],
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(process.returncode, 0)
+        self.assertIn(b"Read 1 IDL files while indexing IIDs.", process.stdout)
+
+        # an IID used by two interfaces is an error
+        self.writeFile(os.path.join(self.mRootPath, "dom", "nsIBar.idl"), kIDLFileContents.replace("nsIFoo", "nsIBar"))
+        sys.argv = ['checkiid', '--log-file', self.mLogPath, '--scan-uuids', self.mRootPath]
+        self.assertEqual(checkiid.runMain(), 1)
+        self.assertIn("is used more than once", self.readLog())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from idlutils import FileContentProvider
+from patchinput import PatchBuffer
+from treeverify import WorkingTreeVerifier
+from treeverify import computeBlobHash
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface nsIFoo : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+# A patch whose post-image of dom/nsIFoo.idl is kIDLFileContents, with an
+# 'index' line for the given blob hash, if any.
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+%s--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -3,5 +3,6 @@
+ [scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the verification of a working tree against the post-image of a
+# patch (--verify-tree).
+class WorkingTreeVerifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def writeIDLFile(self, aContents):
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), "w")
+        idlFile.write(aContents)
+        idlFile.close()
+
+    # Verify the tree against kPatch.
+    #
+    # @param aWithIndexLine True, to give the patch an 'index' line with the
+    #        blob hash of kIDLFileContents.
+    #
+    # @returns A list of (path, lineNumber) tuples, one per mismatch.
+    def verify(self, aWithIndexLine):
+        indexLine = ""
+        if aWithIndexLine:
+            indexLine = "index 1234567.." + computeBlobHash(kIDLFileContents.encode('utf-8'))[:12] + " 100644\n"
+
+        patchBuffer = PatchBuffer((kPatch % indexLine).encode('utf-8'))
+        mismatches = WorkingTreeVerifier(FileContentProvider(self.mRootPath)).verify(patchBuffer)
+        return [(mismatch.getPath(), mismatch.getLineNumber()) for mismatch in mismatches]
+
+    def testMatchingTreeIsVerified(self):
+        self.writeIDLFile(kIDLFileContents)
+        self.assertEqual(self.verify(False), [])
+        self.assertEqual(self.verify(True), [])
+
+    def testMismatchedHunkIsReported(self):
+        self.writeIDLFile(kIDLFileContents.replace("void baz();", "void qux();"))
+        self.assertEqual(self.verify(False), [("dom/nsIFoo.idl", 7)])
+        self.assertEqual(self.verify(True), [("dom/nsIFoo.idl", 7)])
+
+    def testMismatchOutsideHunksIsReportedThroughBlobHash(self):
+        self.writeIDLFile(kIDLFileContents + "\n")
+        self.assertEqual(self.verify(False), [])
+        self.assertEqual(self.verify(True), [("dom/nsIFoo.idl", None)])
+
+    def testMissingFileIsReported(self):
+        self.assertEqual(self.verify(False), [("dom/nsIFoo.idl", None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
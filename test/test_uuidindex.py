@@ -0,0 +1,82 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from uuidindex import UUIDIndex
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kOldIID = "12345678-1234-1234-1234-123456789abc"
+kNewIID = "87654321-4321-4321-4321-cba987654321"
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(87654321-4321-4321-4321-cba987654321)]
+interface nsIFoo : nsISupports
+{
+  void bar();
+  void baz();
+};
+"""
+
+# A patch that adds a method to nsIFoo and revs its IID from kOldIID to kNewIID.
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -3,5 +3,6 @@
+-[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
++[scriptable, uuid(87654321-4321-4321-4321-cba987654321)]
+ interface nsIFoo : nsISupports
+ {
++  void bar();
+   void baz();
+ };
+"""
+
+
+# Tests of the IIDs a checker records as retired in its UUIDIndex.
+class RetiredIIDTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.mRootPath, "dom"))
+        idlFile = open(os.path.join(self.mRootPath, "dom", "nsIFoo.idl"), "w")
+        idlFile.write(kIDLFileContents)
+        idlFile.close()
+
+        self.mIndex = UUIDIndex(self.mRootPath)
+        self.mIndex.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def check(self, aRetireIIDs):
+        checker = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aUUIDIndex=self.mIndex, aRetireIIDs=aRetireIIDs)
+        result = checker.check(kPatch.splitlines(True))
+        self.assertEqual(result.getUnrevvedRecords(), [])
+
+    def testCheckedPatchDoesNotRetireIIDs(self):
+        self.check(False)
+        self.assertFalse(self.mIndex.isRetired(kOldIID))
+
+        # so checking the same patch again isn't reported as reusing an IID
+        self.check(False)
+
+    def testPushedPatchRetiresRemovedIIDs(self):
+        self.check(True)
+        self.assertTrue(self.mIndex.isRetired(kOldIID))
+        self.assertFalse(self.mIndex.isRetired(kNewIID))
+
+        # the retirement outlives the index
+        cachePath = os.path.join(self.mRootPath, "uuids.json")
+        self.mIndex.save(cachePath)
+        self.assertTrue(UUIDIndex.load(self.mRootPath, cachePath).isRetired(kOldIID))
+
+
+if __name__ == '__main__':
+    unittest.main()
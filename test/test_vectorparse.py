@@ -0,0 +1,100 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from metrics import CheckMetrics
+from patchinput import PatchBuffer
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+from resulttable import InterfaceResultTable
+
+kTestDirectory = os.path.dirname(os.path.abspath(__file__))
+
+kPatchNames = ["dictionary-change.diff", "firefox-22-idl-changes.diff", "full-removal.diff", "interface-rename.diff"]
+
+
+# Tests that the NumPy engine finds what parsePatch() finds, and of shadow mode,
+# which compares the two.
+class VectorEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy isn't installed")
+
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Check a patch with an engine.
+    #
+    # @param aFromBuffer True, to check the patch from a PatchBuffer; False, to
+    #        check it from a list of lines.
+    # @param aShadow True, to check the patch in shadow mode.
+    # @param aMetrics An optional CheckMetrics for the checker.
+    #
+    # @returns A tuple, (outcome, warningCount), where outcome holds everything
+    #          the check found.
+    def check(self, aPatchName, aEngine, aFromBuffer, aShadow=False, aMetrics=None):
+        printer = PrettyPrinter(False, False, False, NullSink())
+        checker = IIDChecker(self.mRootPath, printer, aEngine=aEngine, aShadow=aShadow, aMetrics=aMetrics)
+        return self.checkWith(checker, printer, aPatchName, aFromBuffer)
+
+    # Check a patch with the given checker.
+    #
+    # @returns The tuple returned by check().
+    def checkWith(self, aChecker, aPrinter, aPatchName, aFromBuffer):
+        patchPath = os.path.join(kTestDirectory, aPatchName)
+        if aFromBuffer:
+            patchBuffer = PatchBuffer.fromFile(patchPath)
+            result = aChecker.check(patchBuffer)
+            patchBuffer.close()
+        else:
+            patchFile = open(patchPath)
+            result = aChecker.check(patchFile.readlines())
+            patchFile.close()
+
+        outcome = (result.getResultTable().toList(), result.getMissingIDLFiles(),
+                   [record.getKey() for record in result.getUnrevvedRecords()])
+        return (outcome, aPrinter.getMessageCount('warn'))
+
+    def testVectorEngineMatchesLegacyEngine(self):
+        for patchName in kPatchNames:
+            for fromBuffer in (False, True):
+                self.assertEqual(self.check(patchName, IIDChecker.kVectorEngine, fromBuffer),
+                                 self.check(patchName, IIDChecker.kLegacyEngine, fromBuffer),
+                                 patchName)
+
+    def testShadowModeMatchesLegacyEngine(self):
+        for patchName in kPatchNames:
+            for fromBuffer in (False, True):
+                metrics = CheckMetrics()
+                self.assertEqual(self.check(patchName, IIDChecker.kVectorEngine, fromBuffer, True, metrics),
+                                 self.check(patchName, IIDChecker.kLegacyEngine, fromBuffer),
+                                 patchName)
+                self.assertEqual(metrics.get('shadow_differing_parses'), 0)
+
+    def testShadowModeWarnsAboutDifferences(self):
+        (expectedOutcome, expectedWarningCount) = self.check("interface-rename.diff", IIDChecker.kLegacyEngine, False)
+
+        # an engine that never finds anything
+        metrics = CheckMetrics()
+        printer = PrettyPrinter(False, False, False, NullSink())
+        checker = IIDChecker(self.mRootPath, printer, aEngine=IIDChecker.kVectorEngine, aShadow=True, aMetrics=metrics)
+        checker.mShadowChecker.parse = lambda aInputPatch, aResumeState, aSkippedLines: (InterfaceResultTable(), [], [])
+
+        (outcome, warningCount) = self.checkWith(checker, printer, "interface-rename.diff", False)
+        self.assertEqual(outcome, expectedOutcome)
+        self.assertGreater(warningCount, expectedWarningCount)
+        self.assertEqual(metrics.get('shadow_differing_parses'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
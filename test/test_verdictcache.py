@@ -0,0 +1,194 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkiid import IIDChecker
+from uuidindex import UUIDIndex
+from verdictcache import VerdictCache
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+
+kFooIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(87654321-4321-4321-4321-cba987654321)]
+interface nsIFoo : nsISupports
+{
+  void foo1();
+  void foo2();
+};
+"""
+
+kBarIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(22222222-2222-2222-2222-222222222222)]
+interface nsIBar : nsISupports
+{
+  void bar1();
+  void bar2();
+};
+"""
+
+# nsIFoo gets a new method and a new IID; nsIBar only a new method.
+kPatch = """diff --git a/dom/nsIFoo.idl b/dom/nsIFoo.idl
+--- a/dom/nsIFoo.idl
++++ b/dom/nsIFoo.idl
+@@ -3,5 +3,6 @@
+-[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
++[scriptable, uuid(87654321-4321-4321-4321-cba987654321)]
+ interface nsIFoo : nsISupports
+ {
++  void foo1();
+   void foo2();
+ };
+diff --git a/dom/nsIBar.idl b/dom/nsIBar.idl
+--- a/dom/nsIBar.idl
++++ b/dom/nsIBar.idl
+@@ -3,5 +3,6 @@
+ [scriptable, uuid(22222222-2222-2222-2222-222222222222)]
+ interface nsIBar : nsISupports
+ {
++  void bar1();
+   void bar2();
+ };
+"""
+
+
+# Tests of the eviction of old entries from a VerdictCache, and of when it's
+# saved.
+class VerdictCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+        self.mCachePath = os.path.join(self.mRootPath, "verdicts.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    # Load the cache, as if on the given number of days after the current one.
+    def loadCache(self, aDaysLater=0):
+        cache = VerdictCache(self.mCachePath)
+        cache.mToday = cache.mToday + aDaysLater
+        return cache
+
+    def testUnchangedCacheIsNotSaved(self):
+        cache = self.loadCache()
+        cache.put("a", {'unrevved': []})
+        cache.save()
+        modificationTime = os.stat(self.mCachePath).st_mtime_ns
+        os.utime(self.mCachePath, ns=(modificationTime - 10 ** 9, modificationTime - 10 ** 9))
+
+        # a hit on the day the entry was last used doesn't change anything
+        cache = self.loadCache()
+        self.assertEqual(cache.get("a"), {'unrevved': []})
+        self.assertFalse(cache.mDirty)
+        cache.save()
+        self.assertEqual(os.stat(self.mCachePath).st_mtime_ns, modificationTime - 10 ** 9)
+
+        # a hit on a later day does
+        cache = self.loadCache(1)
+        self.assertEqual(cache.get("a"), {'unrevved': []})
+        self.assertTrue(cache.mDirty)
+
+    def testUnusedEntriesExpire(self):
+        cache = self.loadCache()
+        cache.put("a", {'unrevved': []})
+        cache.put("b", {'unrevved': []})
+        cache.save()
+
+        cache = self.loadCache(VerdictCache.kMaxAgeDays)
+        cache.get("a")
+        cache.save()
+
+        cache = self.loadCache(VerdictCache.kMaxAgeDays + 1)
+        self.assertEqual(len(cache), 2)
+        cache.put("c", {'unrevved': []})
+        cache.save()
+
+        cache = self.loadCache()
+        self.assertEqual(sorted(cache.mEntries), ["a", "c"])
+
+    def testLeastRecentlyUsedEntriesAreEvicted(self):
+        cache = self.loadCache()
+        cache.kMaxEntries = 2
+        cache.put("a", {'unrevved': []})
+        cache.put("b", {'unrevved': []})
+        cache.save()
+
+        cache = self.loadCache(1)
+        cache.kMaxEntries = 2
+        cache.get("a")
+        cache.put("c", {'unrevved': []})
+        cache.save()
+
+        self.assertEqual(sorted(self.loadCache().mEntries), ["a", "c"])
+
+
+# Tests of checks that answer file sections from a VerdictCache.
+class CachedCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mTemporaryPath = tempfile.mkdtemp()
+        self.mCachePath = os.path.join(self.mTemporaryPath, "verdicts.json")
+        self.mRootPath = os.path.join(self.mTemporaryPath, "one")
+        self.createTree(self.mRootPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.mTemporaryPath)
+
+    def createTree(self, aRootPath):
+        os.makedirs(os.path.join(aRootPath, "dom"))
+        for (fileName, contents) in [("nsIFoo.idl", kFooIDLFileContents), ("nsIBar.idl", kBarIDLFileContents)]:
+            idlFile = open(os.path.join(aRootPath, "dom", fileName), "w")
+            idlFile.write(contents)
+            idlFile.close()
+
+    # Check a patch, with a cache loaded from mCachePath.
+    #
+    # @returns A tuple, (result, hits, misses), of the IIDCheckResult and the
+    #          cache's statistics.
+    def checkWithCache(self, aPatch, aRootPath=None, aUUIDIndex=None):
+        verdictCache = VerdictCache(self.mCachePath)
+        checker = IIDChecker(aRootPath or self.mRootPath, PrettyPrinter(False, False, False, NullSink()), aVerdictCache=verdictCache, aUUIDIndex=aUUIDIndex)
+        result = checker.check(aPatch.splitlines(True))
+        return (result, ) + verdictCache.getStatistics()
+
+    def summarize(self, aResult):
+        return ([record.getKey() for record in aResult.getUnrevvedRecords()], sorted(aResult.getRevvedInterfaces()))
+
+    def testChangedSectionIsChecked(self):
+        (result, hits, misses) = self.checkWithCache(kPatch)
+        self.assertEqual((hits, misses), (0, 2))
+        self.assertEqual(self.summarize(result), ([('nsIBar.idl', 'nsIBar')], ['nsIFoo']))
+
+        # the nsIBar section now also revs its IID
+        changedPatch = kPatch.replace("@@ -3,5 +3,6 @@\n [scriptable, uuid(22222222-2222-2222-2222-222222222222)]\n",
+                                      "@@ -3,6 +3,7 @@\n-[scriptable, uuid(11111111-1111-1111-1111-111111111111)]\n+[scriptable, uuid(22222222-2222-2222-2222-222222222222)]\n")
+        self.assertNotEqual(changedPatch, kPatch)
+
+        (result, hits, misses) = self.checkWithCache(changedPatch)
+        self.assertEqual((hits, misses), (1, 1))
+        self.assertEqual(self.summarize(result), ([], ['nsIBar', 'nsIFoo']))
+
+        uncachedResult = IIDChecker(self.mRootPath, PrettyPrinter(False, False, False, NullSink())).check(changedPatch.splitlines(True))
+        self.assertEqual(self.summarize(result), self.summarize(uncachedResult))
+
+    def testCacheIsSharedBetweenRoots(self):
+        self.checkWithCache(kPatch, self.mRootPath, UUIDIndex(self.mRootPath))
+
+        # the IIDs added by the cached sections belong to the other root's files,
+        # so they don't conflict with what's already in that root
+        otherRootPath = os.path.join(self.mTemporaryPath, "two")
+        self.createTree(otherRootPath)
+        uuidIndex = UUIDIndex(otherRootPath)
+        uuidIndex.refresh()
+        (result, hits, misses) = self.checkWithCache(kPatch, otherRootPath, uuidIndex)
+        self.assertEqual((hits, misses), (2, 0))
+        self.assertEqual(result.getIIDConflicts(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prettyprinter import PrettyPrinter
+from prettyprinter import NullSink
+from watcher import IDLTreeWatcher
+
+kIDLFileContents = """#include "nsISupports.idl"
+
+[scriptable, uuid(12345678-1234-1234-1234-123456789abc)]
+interface %s : nsISupports
+{
+  void baz();
+};
+"""
+
+
+# Tests of the version control commands an IDLTreeWatcher runs at startup.
+class IDLTreeWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mRootPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.mRootPath)
+
+    def runCommand(self, aCommand):
+        subprocess.check_call(aCommand, cwd=self.mRootPath, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def writeFile(self, aRelativePath, aContents):
+        path = os.path.join(self.mRootPath, aRelativePath)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        idlFile = open(path, "w")
+        idlFile.write(aContents)
+        idlFile.close()
+
+    # Commit two IDL files, then change one of them.
+    def createTree(self, aInitCommand, aAddCommand, aCommitCommand):
+        self.runCommand(aInitCommand)
+        self.writeFile("dom/nsIFoo.idl", kIDLFileContents % "nsIFoo")
+        self.writeFile("dom/nsIBar.idl", kIDLFileContents % "nsIBar")
+        self.runCommand(aAddCommand)
+        self.runCommand(aCommitCommand)
+        self.writeFile("dom/nsIFoo.idl", (kIDLFileContents % "nsIFoo").replace("void baz();", "void baz();\n  void qux();"))
+
+    def testObjectDirectoriesAreIgnored(self):
+        self.writeFile("dom/nsIFoo.idl", kIDLFileContents % "nsIFoo")
+        self.writeFile("obj-x86_64-pc-linux-gnu/dist/idl/nsIFoo.idl", kIDLFileContents % "nsIFoo")
+        self.writeFile("build-opt/config.status", "")
+        self.writeFile("build-opt/dist/idl/nsIFoo.idl", kIDLFileContents % "nsIFoo")
+
+        watcher = IDLTreeWatcher(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+        self.assertEqual(list(watcher.findIDLFiles()), [os.path.join(self.mRootPath, "dom", "nsIFoo.idl")])
+
+    def testGitStartupChecksOnlyChangedFiles(self):
+        if shutil.which('git') is None:
+            self.skipTest("git isn't installed")
+
+        self.createTree(['git', 'init', '-q'], ['git', 'add', '.'],
+                        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'initial'])
+
+        # staged changes are local changes, too
+        self.runCommand(['git', 'add', 'dom/nsIFoo.idl'])
+
+        watcher = IDLTreeWatcher(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+        fooPath = os.path.join(self.mRootPath, "dom", "nsIFoo.idl")
+        self.assertEqual(watcher.findChangedIDLFiles(), [fooPath])
+        self.assertTrue(any(line.startswith("+  void qux();") for line in watcher.getDiffForFile(fooPath)))
+
+        # nothing has changed since the state of the files was recorded
+        watcher.recordFileStats()
+        self.assertEqual(watcher.poll(), [])
+
+    def testHgStartupChecksOnlyChangedFiles(self):
+        if shutil.which('hg') is None:
+            self.skipTest("hg isn't installed")
+
+        self.createTree(['hg', 'init'], ['hg', 'add'], ['hg', 'commit', '-u', 'test', '-m', 'initial'])
+
+        watcher = IDLTreeWatcher(self.mRootPath, PrettyPrinter(False, False, False, NullSink()))
+        fooPath = os.path.join(self.mRootPath, "dom", "nsIFoo.idl")
+        self.assertEqual(watcher.findChangedIDLFiles(), [fooPath])
+        self.assertTrue(any(line.startswith("+  void qux();") for line in watcher.getDiffForFile(fooPath)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import os
+import re
+import hashlib
+from patchinput import decodePatchLine
+from patchinput import decodeFileLines
+from checkiid import extractIDLFilePath
+from checkiid import doesLineSignifyDeletion
+
+# Verification that a working tree is at the revision a patch ends at, before
+# it's checked.
+#
+# The checker reads the IDL files a patch touches from the working tree, to
+# tell comments from code and to find renamed interfaces, so a tree at the
+# wrong revision gives wrong results, and used to be noticed only late, if at
+# all. Each IDL file is compared with the post-image of the last section of the
+# patch that changes it (earlier sections, e.g. from 'hg log -p', describe
+# earlier revisions): through its git blob hash, if the section has an 'index'
+# line, or else through the added and context lines of its hunks.
+
+# Matches the header of a git-style file section, capturing the path of the
+# pre-image.
+kSectionHeaderPattern = re.compile(r"^diff --git a/(\S+) b/")
+
+# Matches the 'index <old>..<new>' line of a git-style file section, capturing
+# the (possibly abbreviated) blob hash of the post-image.
+kIndexLinePattern = re.compile(r"^index [0-9a-f]+\.\.([0-9a-f]+)")
+
+# Matches a hunk header, capturing the number of lines of the pre-image, and the
+# first line and number of lines of the post-image.
+kHunkHeaderPattern = re.compile(r"^@@ -[0-9]+(?:,([0-9]+))? \+([0-9]+)(?:,([0-9]+))? @@")
+
+# Number of files read concurrently.
+kVerifyWorkers = 16
+
+# Longest excerpt of a line quoted in a TreeMismatch.
+kMaxExcerptLength = 60
+
+
+# Compute the git blob hash of a file's contents, as found on 'index' lines.
+#
+# @param aData A bytes object with the contents of the file.
+#
+# @returns The hash, as a string of hex digits.
+def computeBlobHash(aData):
+    blobHash = hashlib.sha1()
+    blobHash.update(b"blob " + str(len(aData)).encode('ascii') + b"\0")
+    blobHash.update(aData)
+    return blobHash.hexdigest()
+
+
+# Shorten a line of text for quoting in a message.
+def createExcerpt(aLine):
+    if len(aLine) > kMaxExcerptLength:
+        return repr(aLine[:kMaxExcerptLength] + "...")
+    return repr(aLine)
+
+
+# @class TreeMismatch A file in the working tree that doesn't match the
+#        post-image of a patch.
+class TreeMismatch:
+
+    # Create a new TreeMismatch.
+    #
+    # @param aPath The path of the file, relative to the root of the tree.
+    # @param aLineNumber The first line at which the file differs from the
+    #        post-image, or None, if the difference isn't at a particular line.
+    # @param aDescription A description of the difference.
+    def __init__(self, aPath, aLineNumber, aDescription):
+        self.mPath = aPath
+        self.mLineNumber = aLineNumber
+        self.mDescription = aDescription
+
+    def getPath(self):
+        return self.mPath
+
+    def getLineNumber(self):
+        return self.mLineNumber
+
+    # @returns A message describing the mismatch, suitable for reporting.
+    def getMessage(self):
+        location = "'" + self.mPath + "'"
+        if self.mLineNumber is not None:
+            location += ", line " + str(self.mLineNumber) + ","
+        return location + " doesn't match the patch: " + self.mDescription + "."
+
+
+# Compare the lines of a file with the post-image of the hunks of a file
+# section.
+#
+# @param aPath The path of the file, relative to the root of the tree.
+# @param aSectionLines The lines of the file section, including its header.
+# @param aFileLines The lines of the file, without line endings.
+#
+# @returns A TreeMismatch for the first line that differs, or None.
+def findPostImageMismatch(aPath, aSectionLines, aFileLines):
+    oldRemaining = 0
+    newRemaining = 0
+    lineNumber = 0
+    for line in aSectionLines:
+        if oldRemaining <= 0 and newRemaining <= 0:
+            # between hunks, e.g. in the header, or in the commit message of the
+            # next changeset of 'hg log -p' output
+            match = kHunkHeaderPattern.match(line)
+            if match:
+                oldRemaining = int(match.group(1) or 1)
+                lineNumber = int(match.group(2))
+                newRemaining = int(match.group(3) or 1)
+            continue
+
+        if line.startswith("-"):
+            oldRemaining = oldRemaining - 1
+            continue
+        if not line.startswith("+") and not line.startswith(" "):
+            # e.g. '\ No newline at end of file'
+            continue
+
+        expected = line[1:].rstrip("\n")
+        if lineNumber > len(aFileLines):
+            return TreeMismatch(aPath, lineNumber, "the file ends before this line, which should be " + createExcerpt(expected))
+
+        found = aFileLines[lineNumber - 1]
+        if found != expected:
+            return TreeMismatch(aPath, lineNumber, "expected " + createExcerpt(expected) + ", found " + createExcerpt(found))
+
+        if line.startswith(" "):
+            oldRemaining = oldRemaining - 1
+        newRemaining = newRemaining - 1
+        lineNumber = lineNumber + 1
+
+    return None
+
+
+# @class WorkingTreeVerifier Compares the IDL files in a working tree with the
+#        post-images of a patch.
+class WorkingTreeVerifier:
+
+    # Create a new WorkingTreeVerifier.
+    #
+    # @param aContentProvider The FileContentProvider through which to read the
+    #        files of the tree.
+    def __init__(self, aContentProvider):
+        self.mContentProvider = aContentProvider
+
+    # Verify the files changed by a patch.
+    #
+    # @param aPatchBuffer The PatchBuffer containing the patch.
+    #
+    # @returns A list of TreeMismatch objects, in the order in which their files
+    #          were last changed by the patch, which is empty if the tree
+    #          matches.
+    def verify(self, aPatchBuffer):
+        from concurrent.futures import ThreadPoolExecutor
+
+        # the last section for each file; only its header lines are decoded here
+        lastSections = {}
+        for (start, headerEnd, end) in aPatchBuffer.iterSections():
+            if headerEnd == start:
+                continue
+            header = decodePatchLine(aPatchBuffer.getBytes(start, headerEnd))
+            path = extractIDLFilePath(header, '')
+            if path is None:
+                continue
+
+            # a file that's renamed is checked under its new name only
+            match = kSectionHeaderPattern.match(header)
+            if match and match.group(1) != path:
+                lastSections.pop(match.group(1), None)
+
+            lastSections.pop(path, None)
+            lastSections[path] = (start, end)
+
+        sections = [(path, list(aPatchBuffer.decodeLines(start, end))) for (path, (start, end)) in lastSections.items()]
+
+        pool = ThreadPoolExecutor(max_workers=kVerifyWorkers)
+        mismatches = list(pool.map(self.verifySection, sections))
+        pool.shutdown()
+
+        return [mismatch for mismatch in mismatches if mismatch is not None]
+
+    # Verify a single file against the last section of a patch that changes it.
+    #
+    # @param aSection A (path, sectionLines) tuple, where path is relative to the
+    #        root of the tree.
+    #
+    # @returns A TreeMismatch, or None, if the file matches.
+    def verifySection(self, aSection):
+        (path, sectionLines) = aSection
+
+        # the header, up to the first hunk
+        blobHash = None
+        deleted = False
+        for line in sectionLines:
+            if line.startswith("@@"):
+                break
+            match = kIndexLinePattern.match(line)
+            if match:
+                blobHash = match.group(1)
+            if doesLineSignifyDeletion(line):
+                deleted = True
+
+        if blobHash is not None and blobHash.strip("0") == "":
+            deleted = True
+
+        try:
+            data = self.mContentProvider.readBytes(os.path.join(self.mContentProvider.getRootPath(), path))
+        except (IOError, OSError):
+            if deleted:
+                return None
+            return TreeMismatch(path, None, "the file doesn't exist")
+
+        if deleted:
+            return TreeMismatch(path, None, "the file exists, but the patch deletes it")
+
+        if blobHash is not None and computeBlobHash(data).startswith(blobHash):
+            return None
+
+        mismatch = findPostImageMismatch(path, sectionLines, decodeFileLines(data))
+        if mismatch is None and blobHash is not None:
+            mismatch = TreeMismatch(path, None, "it differs outside of the hunks of the patch (its git blob hash isn't " + blobHash + ")")
+        return mismatch
@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import threading
+from idlutils import findIDLFileStamps
+
+# An index of every uuid(...) annotation in the IDL files of a repository, used
+# to find interfaces that share an IID, and to check IIDs added by a patch
+# against all of the IIDs already in use in constant time.
+
+# Matches a uuid(...) annotation, capturing the IID.
+kUUIDPattern = re.compile(r"uuid\(\s*([0-9A-Fa-f\-]+)\s*\)")
+
+# Matches the remainder of an annotation block after a uuid(...), up to and
+# including the name of the interface it annotates.
+kAnnotatedInterfacePattern = re.compile(r"[^\]]*\]\s*interface\s+([A-Za-z0-9_]+)")
+
+
+# Normalize an IID, so that differences in case and surrounding whitespace don't
+# prevent two copies of the same IID from being matched.
+#
+# @param aIID The IID, as a string.
+#
+# @returns The normalized IID.
+def normalizeIID(aIID):
+    return aIID.strip().lower()
+
+
+# Extract the IIDs from the text of an IDL file.
+#
+# @param aText The contents of the IDL file.
+#
+# @returns A list of (iid, interfaceName) tuples, in the order in which they
+#          appear. interfaceName is None for a uuid(...) that does not annotate
+#          an interface.
+def extractIIDsFromText(aText):
+    iids = []
+    for match in kUUIDPattern.finditer(aText):
+        interfaceMatch = kAnnotatedInterfacePattern.match(aText, match.end())
+        interfaceName = None
+        if interfaceMatch:
+            interfaceName = interfaceMatch.group(1)
+        iids.append((normalizeIID(match.group(1)), interfaceName))
+    return iids
+
+
+# @class UUIDIndex A hash table of all IIDs in the IDL files of a repository.
+#
+# The index can be saved to, and loaded from, a JSON cache file. Each file's
+# modification time and size are stored along with its IIDs, so that refreshing
+# a loaded index only needs to re-read the files that changed.
+#
+# The index also keeps a set of "retired" IIDs: those removed by patches that
+# were pushed (see IIDChecker's aRetireIIDs). An IID that is retired should
+# never be used again.
+class UUIDIndex:
+
+    # Version of the on-disk format.
+    kFormatVersion = 1
+
+    # Number of files read concurrently while scanning a tree.
+    kScanWorkers = 16
+
+    # Create a new, empty UUIDIndex.
+    #
+    # @param aRootPath The path to the root of the repository.
+    def __init__(self, aRootPath):
+        self.mRootPath = aRootPath
+        self.mLock = threading.Lock()
+
+        # A mapping of paths (relative to the root) to (stamp, iids) tuples, where
+        # stamp is the [mtime, size] of the file when it was read, and iids is the
+        # list returned by extractIIDsFromText().
+        self.mFileEntries = {}
+
+        # A mapping of IIDs to lists of (relativePath, interfaceName) tuples. This
+        # is derived from mFileEntries.
+        self.mIIDOwners = {}
+
+        # IIDs removed by patches that were pushed.
+        self.mRetiredIIDs = set()
+
+    # Load an index from a cache file.
+    #
+    # @param aRootPath The path to the root of the repository.
+    # @param aCachePath The path of the cache file.
+    #
+    # @returns A UUIDIndex. If the cache file can't be read, or was written by a
+    #          different version or for a different root, the index is empty.
+    def load(aRootPath, aCachePath):
+        index = UUIDIndex(aRootPath)
+        try:
+            cacheFile = open(aCachePath)
+            contents = json.load(cacheFile)
+            cacheFile.close()
+        except:
+            return index
+
+        if not isinstance(contents, dict) or contents.get('version') != UUIDIndex.kFormatVersion:
+            return index
+
+        if contents.get('root') != os.path.abspath(aRootPath):
+            return index
+
+        for (path, (stamp, iids)) in contents.get('files', {}).items():
+            index.mFileEntries[path] = (stamp, [tuple(iid) for iid in iids])
+        index.mRetiredIIDs = set(contents.get('retired', []))
+        index.rebuildOwners()
+        return index
+
+    # Save this index to a cache file, replacing it atomically.
+    #
+    # @param aCachePath The path of the cache file.
+    def save(self, aCachePath):
+        with self.mLock:
+            contents = {'version': self.kFormatVersion,
+                        'root': os.path.abspath(self.mRootPath),
+                        'files': self.mFileEntries,
+                        'retired': sorted(self.mRetiredIIDs)}
+
+        temporaryPath = aCachePath + ".tmp" + str(os.getpid())
+        cacheFile = open(temporaryPath, "w")
+        json.dump(contents, cacheFile)
+        cacheFile.close()
+        os.replace(temporaryPath, aCachePath)
+
+    # Bring the index up to date with the IDL files in the tree: files that were
+    # added or whose modification time or size changed are read (in parallel),
+    # and files that no longer exist are dropped.
+    #
+    # @returns The number of files that were read.
+    def refresh(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        currentStamps = findIDLFileStamps(self.mRootPath)
+
+        stalePaths = []
+        for (path, stamp) in currentStamps.items():
+            entry = self.mFileEntries.get(path)
+            if not entry or entry[0] != stamp:
+                stalePaths.append(path)
+
+        pool = ThreadPoolExecutor(max_workers=self.kScanWorkers)
+        scannedIIDs = list(pool.map(self.readIIDsForFile, stalePaths))
+        pool.shutdown()
+
+        with self.mLock:
+            for path in list(self.mFileEntries.keys()):
+                if path not in currentStamps:
+                    del self.mFileEntries[path]
+
+            for (path, iids) in zip(stalePaths, scannedIIDs):
+                self.mFileEntries[path] = (currentStamps[path], iids)
+
+        self.rebuildOwners()
+        return len(stalePaths)
+
+    # Read the IIDs in a single file.
+    #
+    # @param aRelativePath The path of the file, relative to the root.
+    #
+    # @returns The list returned by extractIIDsFromText(), or an empty list, if
+    #          the file can't be read.
+    def readIIDsForFile(self, aRelativePath):
+        try:
+            idlFile = open(os.path.join(self.mRootPath, aRelativePath), errors='replace')
+            text = idlFile.read()
+            idlFile.close()
+        except IOError:
+            return []
+        return extractIIDsFromText(text)
+
+    # Rebuild the IID hash table from the per-file entries.
+    def rebuildOwners(self):
+        owners = {}
+        with self.mLock:
+            for (path, (stamp, iids)) in self.mFileEntries.items():
+                for (iid, interfaceName) in iids:
+                    owners.setdefault(iid, []).append((path, interfaceName))
+            self.mIIDOwners = owners
+
+    # Retrieve the places an IID is used.
+    #
+    # @param aIID The IID to look up.
+    #
+    # @returns A list of (relativePath, interfaceName) tuples, which is empty if
+    #          the IID isn't used anywhere.
+    def getOwners(self, aIID):
+        return self.mIIDOwners.get(normalizeIID(aIID), [])
+
+    # Find the IIDs that are used more than once.
+    #
+    # @returns A map from each such IID to its list of owners, as returned by
+    #          getOwners().
+    def findCollisions(self):
+        collisions = {}
+        for (iid, owners) in self.mIIDOwners.items():
+            if len(owners) > 1:
+                collisions[iid] = owners
+        return collisions
+
+    # Find the uses of an IID other than a given interface in a given file.
+    #
+    # @param aIID The IID to look up.
+    # @param aRelativePath The path, relative to the root, of the IDL file in
+    #        which the interface is defined.
+    # @param aInterfaceName The name of the interface using aIID.
+    #
+    # @returns A list of (relativePath, interfaceName) tuples for every other use
+    #          of aIID.
+    def getConflictingOwners(self, aIID, aRelativePath, aInterfaceName):
+        conflicts = []
+        for (path, interfaceName) in self.getOwners(aIID):
+            if path == aRelativePath and interfaceName == aInterfaceName:
+                continue
+            conflicts.append((path, interfaceName))
+        return conflicts
+
+    # Determine whether an IID was retired by a previously pushed patch.
+    def isRetired(self, aIID):
+        return normalizeIID(aIID) in self.mRetiredIIDs
+
+    # Record that an IID was removed by a patch that was pushed, so that it's
+    # reported if it is ever added again.
+    def retire(self, aIID):
+        with self.mLock:
+            self.mRetiredIIDs.add(normalizeIID(aIID))
+
+    load = staticmethod(load)
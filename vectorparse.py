@@ -0,0 +1,603 @@
+import bisect
+import numpy
+from idlutils import IDLDescriptor
+from resulttable import InterfaceResultTable
+from checkevents import InterfaceFlaggedEvent
+from checkevents import InterfaceClearedEvent
+from checkevents import IIDChangeEvent
+from checkevents import SectionFinishedEvent
+from checkiid import isStartOfIDLFile
+from checkiid import isLineStartOfNewFile
+from checkiid import isLineIIDAddition
+from checkiid import isLineIIDDefinition
+from checkiid import isLineIIDRemoval
+from checkiid import isRemovalLine
+from checkiid import isInterfaceDefinitionLine
+from checkiid import isInterfaceContextLine
+from checkiid import isLineConstantExpression
+from checkiid import isLineSingleLineComment
+from checkiid import isEndOfInterfaceRemoval
+from checkiid import doesLineSignifyDeletion
+from checkiid import extractIID
+from checkiid import extractIDLFileName
+from checkiid import extractIDLFilePath
+from checkiid import extractInterfaceNameFromDefinitionLine
+from checkiid import extractInterfaceNameFromContextLine
+from checkiid import extractLineNumberFromContext
+from checkiid import extractNewLineNumberFromContext
+from checkiid import extractContentFromChangeLine
+
+# A NumPy implementation of IIDChecker.parsePatch(), for very large patches
+# (e.g. audits of long revision ranges).
+#
+# The patch is encoded into a single byte array, and every line is classified
+# (addition, removal, hunk header, ...) by array operations over it. The few
+# lines that can change the parser's state -- file headers, uuid(...) lines and
+# interface definitions -- are found by searching the array, and only those are
+# run through the line-by-line predicates of checkiid, in order. The state
+# between them (the current file and interface) is filled forward to every
+# other line, the lines requiring a new IID are selected with boolean masks,
+# and the findings for each interface are gathered with grouped reductions.
+#
+# The results are the same as those of parsePatch(), including the order of
+# interfaces in the InterfaceResultTable. Only the debug output differs.
+
+# Bytes that str.rstrip() strips, other than non-ASCII whitespace.
+kASCIIWhitespace = [9, 10, 11, 12, 13, 28, 29, 30, 31, 32]
+
+# The order in which events on the same line of the patch are applied to the
+# InterfaceResultTable (and dispatched to the checker's event listeners),
+# matching the order in which parsePatch() applies them.
+kSectionEvent = 0
+kDefinitionEvent = 1
+kContextEvent = 2
+kIIDRemovalEvent = 3
+kFlagEvent = 4
+kClearEvent = 5
+
+
+# Find the positions at which the value of a sparse array last changed.
+#
+# @param aMarks An integer array, which is 0 wherever nothing happens.
+#
+# @returns An integer array holding, for each index, the index of the last
+#          non-zero element of aMarks at or before it, or -1, if there is none.
+def findLastMarks(aMarks):
+    positions = numpy.where(aMarks != 0, numpy.arange(len(aMarks)), -1)
+    return numpy.maximum.accumulate(positions)
+
+
+# @class VectorizedPatchParser Parses patches for an IIDChecker with array
+#        operations, giving the same results as IIDChecker.parsePatch().
+class VectorizedPatchParser:
+
+    # Create a new VectorizedPatchParser.
+    #
+    # @param aChecker The IIDChecker whose configuration, caches and printer are
+    #        used.
+    def __init__(self, aChecker):
+        self.mChecker = aChecker
+        self.mPrinter = aChecker.getPrinter()
+
+        self.mWhitespace = numpy.zeros(256, dtype=bool)
+        self.mWhitespace[kASCIIWhitespace] = True
+
+    # Parse a patch. See IIDChecker.parsePatch().
+    #
+    # @param aInputPatch An iterable of the lines of the diff output.
+    # @param aSkippedLines An optional deque of the lines left out of aInputPatch
+    #        (see IIDChecker.parsePatch()).
+    #
+    # @returns A tuple, (resultTable, missingIDLFiles, iidChanges), as returned
+    #          by IIDChecker.parsePatch().
+    def parsePatch(self, aInputPatch, aSkippedLines=None):
+        lines = list(aInputPatch)
+        self.mLines = lines
+
+        # the number of lines of the patch left out before each line, and after
+        # the last one
+        skippedLineCounts = numpy.zeros(len(lines) + 1, dtype=numpy.int64)
+        for (index, lineCount) in aSkippedLines or []:
+            skippedLineCounts[index] += lineCount
+        self.mSkippedLineCounts = numpy.cumsum(skippedLineCounts)
+
+        resultTable = InterfaceResultTable()
+        missingIDLFiles = []
+        iidChanges = []
+
+        if lines:
+            self.encodeLines(lines)
+            self.classifyLines()
+            self.findActiveLines()
+            self.computeLineNumbers()
+            tableEvents = self.followState(iidChanges)
+            flagLines = self.findFlaggedLines(missingIDLFiles)
+            self.fillResultTable(resultTable, tableEvents, flagLines)
+
+        metrics = self.mChecker.getMetrics()
+        if metrics is not None:
+            metrics.add('patch_lines', len(lines) + int(self.mSkippedLineCounts[-1]))
+            metrics.add('idl_sections', len(self.mIDLStarts) if lines else 0)
+
+        self.mLines = None
+        return (resultTable, missingIDLFiles, iidChanges)
+
+    # Find the (1-based) line number, in the patch, of a line.
+    #
+    # @param aIndex The index of the line in the input.
+    def getPatchLineNumber(self, aIndex):
+        return aIndex + 1 + int(self.mSkippedLineCounts[aIndex])
+
+    # Encode the lines of the patch into a single byte array, and find where each
+    # line starts and ends in it.
+    def encodeLines(self, aLines):
+        data = "".join(aLines).encode('utf-8', 'surrogatepass')
+        self.mBytes = numpy.frombuffer(data, dtype=numpy.uint8)
+        lineCount = len(aLines)
+
+        newlines = numpy.flatnonzero(self.mBytes == ord("\n"))
+        expectedNewlines = lineCount if aLines[-1].endswith("\n") else lineCount - 1
+        if len(newlines) == expectedNewlines:
+            ends = numpy.append(newlines + 1, len(data))[:lineCount]
+        else:
+            # Some line holds a newline other than at its end, so line boundaries
+            # can't be found by searching for them.
+            ends = numpy.cumsum([len(line.encode('utf-8', 'surrogatepass')) for line in aLines])
+
+        self.mEnds = ends
+        self.mStarts = numpy.concatenate(([0], ends[:-1]))
+
+    # Retrieve a given byte of every line.
+    #
+    # @param aOffset The offset of the byte from the start of the line.
+    #
+    # @returns An array of the bytes, which are 0 for lines that are too short.
+    def getColumn(self, aOffset):
+        padded = numpy.concatenate((self.mBytes, numpy.zeros(aOffset + 1, dtype=numpy.uint8)))
+        return numpy.where(self.mEnds - self.mStarts > aOffset, padded[self.mStarts + aOffset], 0)
+
+    # Find the lines that contain a sequence of bytes.
+    #
+    # @param aToken The bytes to search for.
+    #
+    # @returns A boolean array, with one element per line.
+    def findLinesContaining(self, aToken):
+        found = numpy.zeros(len(self.mStarts), dtype=bool)
+        length = len(aToken)
+        if len(self.mBytes) < length:
+            return found
+
+        candidateCount = len(self.mBytes) - length + 1
+        matches = self.mBytes[:candidateCount] == aToken[0]
+        for offset in range(1, length):
+            matches &= self.mBytes[offset:offset + candidateCount] == aToken[offset]
+
+        positions = numpy.flatnonzero(matches)
+        found[numpy.searchsorted(self.mStarts, positions, side='right') - 1] = True
+        return found
+
+    # Classify every line by its leading bytes, and find the lines that contain
+    # the tokens the line-by-line predicates look for.
+    def classifyLines(self):
+        first = self.getColumn(0)
+        second = self.getColumn(1)
+        third = self.getColumn(2)
+
+        plus = first == ord("+")
+        minus = first == ord("-")
+        self.mIsAddition = plus & ~((second == ord("+")) & (third == ord("+")))
+        self.mIsRemoval = minus & ~((second == ord("-")) & (third == ord("-")))
+        self.mIsChange = self.mIsAddition | self.mIsRemoval
+        self.mIsFileHeader = plus & (second == ord("+")) & (third == ord("+"))
+        self.mIsContext = (first == ord("@")) & (second == ord("@"))
+        self.mIsDiff = first == ord("d")
+
+        self.mHasUUID = self.findLinesContaining(b"uuid(")
+        self.mHasInterface = self.findLinesContaining(b"interface")
+        self.mHasConst = self.findLinesContaining(b"const")
+        self.mHasBrace = self.findLinesContaining(b"}")
+        self.mHasSlashes = self.findLinesContaining(b"//")
+
+        self.mHasDescriptor = numpy.zeros(len(self.mStarts), dtype=bool)
+        for descriptor in self.mChecker.getDescriptorList():
+            self.mHasDescriptor |= self.findLinesContaining(descriptor.getToken().encode('utf-8'))
+
+    # Find the lines that parsePatch() skips: those in a file section after its
+    # '+++ /dev/null' line, up to the next IDL file, and change lines without
+    # any content.
+    def findActiveLines(self):
+        lines = self.mLines
+
+        self.mIDLStarts = set()
+        self.mNewFileStarts = set()
+        for index in numpy.flatnonzero(self.mIsDiff):
+            if isStartOfIDLFile(lines[index]):
+                self.mIDLStarts.add(index)
+            if isLineStartOfNewFile(lines[index]):
+                self.mNewFileStarts.add(index)
+
+        marks = numpy.zeros(len(lines), dtype=numpy.int8)
+        marks[list(self.mIDLStarts)] = 1
+        for index in numpy.flatnonzero(self.mIsFileHeader):
+            if doesLineSignifyDeletion(lines[index]):
+                marks[index] = 2
+        lastMarks = findLastMarks(marks)
+        deleted = (lastMarks >= 0) & (marks[numpy.maximum(lastMarks, 0)] == 2)
+
+        # A change line is empty if everything after its first byte is
+        # whitespace. Lines whose only other bytes are non-ASCII might hold
+        # Unicode whitespace, so those are checked one at a time.
+        nonWhitespace = numpy.concatenate(([0], numpy.cumsum(~self.mWhitespace[self.mBytes])))
+        nonASCII = numpy.concatenate(([0], numpy.cumsum(self.mBytes >= 0x80)))
+        contentStarts = numpy.minimum(self.mStarts + 1, self.mEnds)
+        nonWhitespaceCount = nonWhitespace[self.mEnds] - nonWhitespace[contentStarts]
+        nonASCIICount = nonASCII[self.mEnds] - nonASCII[contentStarts]
+
+        empty = self.mIsChange & (nonWhitespaceCount == 0)
+        for index in numpy.flatnonzero(self.mIsChange & (nonWhitespaceCount > 0) & (nonWhitespaceCount == nonASCIICount)):
+            empty[index] = len(extractContentFromChangeLine(lines[index]).rstrip()) == 0
+
+        self.mIsActive = ~deleted & ~empty
+
+    # Compute the line number, in the patched file, at which each line of the
+    # patch takes effect, as updateFileMetadata() and the hunk headers do.
+    def computeLineNumbers(self):
+        follows = numpy.zeros(len(self.mLines), dtype=bool)
+        follows[1:] = self.mIsRemoval[:-1]
+
+        increments = numpy.ones(len(self.mLines), dtype=numpy.int64)
+        increments[self.mIsRemoval | (self.mIsAddition & follows)] = 0
+        counts = numpy.cumsum(increments)
+
+        # Each hunk header restarts the count at its own line number.
+        offsets = numpy.full(len(self.mLines), -1, dtype=numpy.int64)
+        marks = numpy.zeros(len(self.mLines), dtype=numpy.int8)
+        for index in numpy.flatnonzero(self.mIsContext & self.mIsActive):
+            offsets[index] = extractLineNumberFromContext(self.mLines[index]) - counts[index]
+            marks[index] = 1
+        lastMarks = findLastMarks(marks)
+        self.mLineNumbers = numpy.where(lastMarks >= 0, offsets[numpy.maximum(lastMarks, 0)], -1) + counts
+
+    # Run the parts of parsePatch()'s state machine that track the current file
+    # and interface over the lines that can change them.
+    #
+    # @param aIIDChanges The list to which IID changes are appended.
+    #
+    # @returns A list of (lineIndex, order, sequence, kind, key, lineNumber, iid)
+    #          tuples, one for each interface seen ('add') or revved ('rev'), and
+    #          each IID removed ('retire'). iid is None for interfaces seen.
+    def followState(self, aIIDChanges):
+        lines = self.mLines
+        checker = self.mChecker
+        rangeCache = checker.getRangeCache()
+
+        currentIDLFile = None
+        currentIDLPath = None
+        sectionIDLFile = None
+        currentInterfaceName = None
+        previousInterfaceName = None
+        currentInterfaceWasRenamed = False
+        foundIIDChangeLine = False
+        addedIID = None
+        lastUUIDChangeLineSeen = None
+
+        # Once parsePatch() has seen its first line, it needs an interface name
+        # whenever it doesn't have one.
+        needInterfaceName = True
+
+        tableEvents = []
+        self.mRemovedIIDLines = []
+        self.mIIDRemovals = numpy.zeros(len(lines), dtype=bool)
+
+        # The state after each line that can change it. State 0 is the state
+        # before the first line.
+        self.mStateLines = []
+        self.mStates = [(None, None, None, False)]
+
+        eventLines = numpy.flatnonzero(self.mIsActive & (self.mIsDiff | self.mIsContext | self.mHasUUID | self.mHasInterface))
+        for index in eventLines:
+            line = lines[index]
+            lineNumber = int(self.mLineNumbers[index])
+            idlStart = index in self.mIDLStarts
+
+            if line.startswith("diff "):
+                sectionIDLFile = extractIDLFileName(line)
+
+            if idlStart:
+                currentInterfaceWasRenamed = False
+
+            if index in self.mNewFileStarts and not idlStart:
+                lastUUIDChangeLineSeen = None
+                currentInterfaceWasRenamed = False
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+
+            if idlStart:
+                lastUUIDChangeLineSeen = None
+                currentIDLFile = extractIDLFileName(line)
+                currentIDLPath = extractIDLFilePath(line, checker.getRootPath())
+                rangeCache.prefetchRangesForFilePath(currentIDLPath, self.mPrinter)
+                needInterfaceName = True
+                previousInterfaceName = currentInterfaceName
+                currentInterfaceName = None
+                foundIIDChangeLine = False
+
+            if self.mHasUUID[index]:
+                if isLineIIDAddition(line):
+                    needInterfaceName = True
+                    previousInterfaceName = currentInterfaceName
+                    currentInterfaceName = None
+                    foundIIDChangeLine = True
+                    addedIID = extractIID(line)
+                elif isLineIIDDefinition(line):
+                    if isRemovalLine(line):
+                        self.mRemovedIIDLines.append(index)
+                    needInterfaceName = True
+                    previousInterfaceName = currentInterfaceName
+                    currentInterfaceName = None
+                    foundIIDChangeLine = False
+
+            isDefinition = self.mHasInterface[index] and isInterfaceDefinitionLine(line)
+            if needInterfaceName and isDefinition:
+                currentInterfaceName = extractInterfaceNameFromDefinitionLine(line)
+                if foundIIDChangeLine:
+                    tableEvents.append((index, kDefinitionEvent, len(tableEvents), 'rev', (currentIDLFile, currentInterfaceName), lineNumber, addedIID))
+                    aIIDChanges.append(('+', addedIID, currentInterfaceName, currentIDLPath))
+                    foundIIDChangeLine = False
+                needInterfaceName = False
+                tableEvents.append((index, kDefinitionEvent, len(tableEvents), 'add', (currentIDLFile, currentInterfaceName), lineNumber, None))
+
+            if not needInterfaceName and isDefinition:
+                if checker.isLineInterfaceRename(line, previousInterfaceName, currentIDLPath, (lastUUIDChangeLineSeen, lineNumber + 1)):
+                    currentInterfaceWasRenamed = True
+
+            if self.mIsContext[index] and self.mHasInterface[index] and isInterfaceContextLine(line):
+                currentInterfaceName = extractInterfaceNameFromContextLine(line)
+                tableEvents.append((index, kContextEvent, len(tableEvents), 'add', (currentIDLFile, currentInterfaceName), lineNumber, None))
+            elif self.mIsContext[index] and currentInterfaceName and sectionIDLFile and not checker.shouldSkipFileLookup(currentIDLPath):
+                # as in parsePatch(), the interface the hunk is in is looked up
+                try:
+                    span = checker.getEnclosingInterface(currentIDLPath, extractNewLineNumberFromContext(line))
+                    currentInterfaceName = span.getName() if span else None
+                except:
+                    pass
+                else:
+                    if currentInterfaceName:
+                        tableEvents.append((index, kContextEvent, len(tableEvents), 'add', (currentIDLFile, currentInterfaceName), lineNumber, None))
+
+            if self.mHasUUID[index] and isLineIIDRemoval(line):
+                lastUUIDChangeLineSeen = lineNumber
+                aIIDChanges.append(('-', extractIID(line), None, currentIDLPath))
+                tableEvents.append((index, kIIDRemovalEvent, len(tableEvents), 'retire', (currentIDLFile, None), lineNumber, aIIDChanges[-1][1]))
+                self.mIIDRemovals[index] = True
+
+            if not currentInterfaceName:
+                needInterfaceName = True
+
+            self.mStateLines.append(index)
+            self.mStates.append((currentIDLFile, currentIDLPath, currentInterfaceName, currentInterfaceWasRenamed))
+
+        return tableEvents
+
+    # Find the lines that require a new IID for the interface they're in, and
+    # warn about IDL files that can't be found.
+    #
+    # @param aMissingIDLFiles The list to which the names of IDL files that
+    #        can't be found are appended.
+    #
+    # @returns An array of the indices of the lines, in order.
+    def findFlaggedLines(self, aMissingIDLFiles):
+        lines = self.mLines
+        checker = self.mChecker
+        lineCount = len(lines)
+
+        # The state each line is in, as an index into mStates, and the columns of
+        # that state.
+        self.mStateIndices = numpy.searchsorted(numpy.array(self.mStateLines, dtype=numpy.int64), numpy.arange(lineCount), side='right')
+
+        self.mKeys = []
+        keyIds = {}
+        paths = []
+        pathIds = {}
+        stateKeys = []
+        statePaths = []
+        stateHasInterface = []
+        stateRenamed = []
+        for (idlFile, idlPath, interfaceName, renamed) in self.mStates:
+            key = (idlFile, interfaceName)
+            if key not in keyIds:
+                keyIds[key] = len(self.mKeys)
+                self.mKeys.append(key)
+            if idlPath is not None and idlPath not in pathIds:
+                pathIds[idlPath] = len(paths)
+                paths.append((idlPath, idlFile))
+            stateKeys.append(keyIds[key])
+            statePaths.append(pathIds.get(idlPath, -1))
+            stateHasInterface.append(bool(interfaceName))
+            stateRenamed.append(renamed)
+
+        self.mKeyIds = numpy.array(stateKeys, dtype=numpy.int64)[self.mStateIndices]
+        linePathIds = numpy.array(statePaths, dtype=numpy.int64)[self.mStateIndices]
+        hasInterface = numpy.array(stateHasInterface, dtype=bool)[self.mStateIndices]
+        renamed = numpy.array(stateRenamed, dtype=bool)[self.mStateIndices]
+
+        active = self.mIsActive
+        affectsBinaryCompat = numpy.zeros(lineCount, dtype=bool)
+        hasDescriptors = numpy.zeros(lineCount, dtype=bool)
+        descriptorList = checker.getDescriptorList()
+        for index in numpy.flatnonzero(active & self.mHasDescriptor):
+            affectsBinaryCompat[index] = IDLDescriptor.areDescriptorsInLineAffectingBinaryCompat(lines[index], None, descriptorList)
+            hasDescriptors[index] = IDLDescriptor.hasDescriptorsInLine(lines[index], None, descriptorList)
+
+        constants = numpy.zeros(lineCount, dtype=bool)
+        for index in numpy.flatnonzero(active & self.mIsChange & self.mHasConst):
+            constants[index] = isLineConstantExpression(lines[index])
+
+        # Lines are only ever comments in sections with an IDL file.
+        comments = numpy.zeros(lineCount, dtype=bool)
+        for index in numpy.flatnonzero(active & self.mIsChange & self.mHasSlashes & (linePathIds >= 0)):
+            comments[index] = isLineSingleLineComment(lines[index])
+
+        candidates = active & self.mIsChange & hasInterface & ~renamed & ~hasDescriptors & ~self.mIIDRemovals & ~constants & ~comments
+
+        # Every change line that isn't a '//' comment is looked up in the IDL
+        # file of its section, so every such file that's missing is warned
+        # about, in the order in which parsePatch() would have looked it up.
+        lookupLines = numpy.flatnonzero(active & self.mIsChange & ~comments & (linePathIds >= 0))
+        (lookupPathIds, firstLookups) = numpy.unique(linePathIds[lookupLines], return_index=True)
+
+        candidateLines = numpy.flatnonzero(candidates & (linePathIds >= 0))
+        order = numpy.argsort(linePathIds[candidateLines], kind='stable')
+        candidateLines = candidateLines[order]
+        (groupPathIds, groupStarts, groupCounts) = numpy.unique(linePathIds[candidateLines], return_index=True, return_counts=True)
+        candidateLinesByPath = {}
+        for (pathId, start, count) in zip(groupPathIds, groupStarts, groupCounts):
+            candidateLinesByPath[int(pathId)] = candidateLines[start:start + count]
+
+        warnedFiles = set()
+        for pathId in lookupPathIds[numpy.argsort(firstLookups)]:
+            (path, idlFile) = paths[pathId]
+            try:
+                lineStates = checker.getRangeCache().getLineStatesForFilePath(path, self.mPrinter)
+            except:
+                if idlFile not in warnedFiles:
+                    warnedFiles.add(idlFile)
+                    aMissingIDLFiles.append(idlFile)
+                    checker.warnMissingIDLFile(idlFile)
+                continue
+
+            pathLines = candidateLinesByPath.get(int(pathId))
+            states = numpy.frombuffer(bytes(lineStates.getStates()), dtype=numpy.uint8)
+            if pathLines is None or len(states) == 0:
+                continue
+
+            lineNumbers = self.mLineNumbers[pathLines]
+            inFile = (lineNumbers >= 1) & (lineNumbers <= len(states))
+            lineStateValues = states[numpy.clip(lineNumbers - 1, 0, len(states) - 1)]
+            special = inFile & ((lineStateValues == lineStates.kComment) | (lineStateValues == lineStates.kCpp))
+            comments[pathLines[special]] = True
+
+        flagged = active & (affectsBinaryCompat | (candidates & ~comments))
+        return numpy.flatnonzero(flagged)
+
+    # Fill in the result table: interfaces are added and revved, flagged and
+    # cleared in the order in which parsePatch() would have done so, and the
+    # evidence of each flagged interface is gathered in one go.
+    #
+    # @param aResultTable The InterfaceResultTable to fill in.
+    # @param aTableEvents The list returned by followState().
+    # @param aFlagLines The array returned by findFlaggedLines().
+    def fillResultTable(self, aResultTable, aTableEvents, aFlagLines):
+        flagKeys = self.mKeyIds[aFlagLines]
+
+        # group the flagged lines by interface
+        order = numpy.argsort(flagKeys, kind='stable')
+        (groupKeys, groupStarts, groupCounts) = numpy.unique(flagKeys[order], return_index=True, return_counts=True)
+        sortedFlagLines = aFlagLines[order]
+        flagLinesByKey = {}
+        for (keyId, start, count) in zip(groupKeys, groupStarts, groupCounts):
+            flagLinesByKey[int(keyId)] = sortedFlagLines[start:start + count]
+
+        clears = self.findClearedInterfaces(flagLinesByKey)
+
+        # Only the first flag of an interface, and the first after each time it's
+        # cleared, change the table; parsePatch() never looks at the rest.
+        events = list(aTableEvents)
+        for (keyId, keyLines) in flagLinesByKey.items():
+            flagPositions = [0]
+            for (clearIndex, clearKeyId) in clears:
+                if clearKeyId == keyId:
+                    position = numpy.searchsorted(keyLines, clearIndex, side='right')
+                    if position < len(keyLines):
+                        flagPositions.append(position)
+            for position in sorted(set(flagPositions)):
+                index = int(keyLines[position])
+                events.append((index, kFlagEvent, len(events), 'flag', self.mKeys[keyId], int(self.mLineNumbers[index]), None))
+
+        for (clearIndex, clearKeyId) in clears:
+            events.append((clearIndex, kClearEvent, len(events), 'clear', self.mKeys[clearKeyId], int(self.mLineNumbers[clearIndex]), None))
+
+        checker = self.mChecker
+        listeners = checker.hasEventListeners()
+        if listeners:
+            self.addSectionEvents(events)
+
+        events.sort(key=lambda event: event[:3])
+        for (index, order, sequence, kind, (idlFile, interfaceName), lineNumber, iid) in events:
+            if kind == 'add':
+                aResultTable.addInterface(idlFile, interfaceName)
+            elif kind == 'rev':
+                aResultTable.markRevved(idlFile, interfaceName, lineNumber)
+                if listeners:
+                    checker.dispatchEvent(IIDChangeEvent(idlFile, interfaceName, lineNumber, self.getPatchLineNumber(index), '+', iid))
+            elif kind == 'retire':
+                if listeners:
+                    checker.dispatchEvent(IIDChangeEvent(idlFile, None, lineNumber, self.getPatchLineNumber(index), '-', iid))
+            elif kind == 'flag':
+                aResultTable.markRequiresNewIID(idlFile, interfaceName, lineNumber)
+                if listeners:
+                    checker.dispatchEvent(InterfaceFlaggedEvent(idlFile, interfaceName, lineNumber, self.getPatchLineNumber(index)))
+            elif kind == 'clear':
+                aResultTable.clearRequiresNewIID(idlFile, interfaceName)
+                if listeners:
+                    checker.dispatchEvent(InterfaceClearedEvent(idlFile, interfaceName, lineNumber, self.getPatchLineNumber(index)))
+            else:
+                # a section finishes on the line before the one it's keyed by
+                checker.dispatchEvent(SectionFinishedEvent(idlFile, None, None, self.getPatchLineNumber(index - 1)))
+
+    # Add an event for the end of each IDL file section to a list of events:
+    # each ends at the next file section, or at the end of the patch, and is
+    # keyed by the line after its last one.
+    #
+    # @param aEvents The list of events (see followState()) to add to.
+    def addSectionEvents(self, aEvents):
+        lines = self.mLines
+        sectionStarts = [int(index) for index in numpy.flatnonzero(self.mIsDiff) if lines[index].startswith("diff ")]
+        sectionStarts.append(len(lines))
+
+        for start in sorted(self.mIDLStarts):
+            end = sectionStarts[bisect.bisect_right(sectionStarts, start)]
+            aEvents.append((end, kSectionEvent, len(aEvents), 'finish', (extractIDLFileName(lines[start]), None), None, None))
+
+    # Find the lines at which parsePatch() would decide that an interface is
+    # being removed completely, and so doesn't require a new IID after all.
+    #
+    # @param aFlagLinesByKey A map from key ids to arrays of the indices of the
+    #        lines flagged for them.
+    #
+    # @returns A list of (lineIndex, keyId) tuples, in order.
+    def findClearedInterfaces(self, aFlagLinesByKey):
+        lineCount = len(self.mLines)
+
+        # An interface may be being removed after an IID removal line, until the
+        # next addition line or IDL file.
+        setMarks = numpy.zeros(lineCount, dtype=numpy.int8)
+        setMarks[self.mRemovedIIDLines] = 1
+        resetMarks = self.mIsAddition.astype(numpy.int8)
+        resetMarks[list(self.mIDLStarts)] = 1
+        lastSets = findLastMarks(setMarks)
+        lastResets = findLastMarks(resetMarks)
+
+        clears = []
+        lastClear = -1
+        lastClearByKey = {}
+        candidates = self.mIsActive & self.mIsRemoval & self.mHasBrace & (lastSets > lastResets)
+        for index in numpy.flatnonzero(candidates):
+            if lastSets[index] <= lastClear or not isEndOfInterfaceRemoval(self.mLines[index]):
+                continue
+
+            keyId = int(self.mKeyIds[index])
+            keyLines = aFlagLinesByKey.get(keyId)
+            if keyLines is None:
+                continue
+
+            # the interface requires a new IID if it was flagged since it was last
+            # cleared, up to and including this line
+            since = lastClearByKey.get(keyId, -1)
+            position = numpy.searchsorted(keyLines, since, side='right')
+            if position < len(keyLines) and keyLines[position] <= index:
+                clears.append((index, keyId))
+                lastClear = index
+                lastClearByKey[keyId] = index
+
+        return clears
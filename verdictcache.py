@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# A persistent cache of the verdicts reached for individual file sections of a
+# patch, so that sections which have been checked before (e.g. on a CI retry or
+# after a rebase) don't need to be analysed again.
+
+
+# @class VerdictCache A content-addressed store of per-file-section verdicts.
+#
+# Each entry is keyed by a hash of the text of a file section, the identity of
+# the file it applies to and the configuration of the checker (see
+# createVerdictKey()), and holds the verdict reached for that section: the
+# InterfaceResultTable of the interfaces it touches (see
+# InterfaceResultTable.toList()), whether the file was missing and which IIDs
+# it added or removed. Paths in a verdict are relative to the root of the
+# repository, so that a cache can be shared by several checkouts.
+#
+# The cache is stored as a single JSON file. It is loaded when the cache is
+# created, and written back by save(), only if it changed. The day on which each
+# entry was last used is stored with it, so that entries that go unused for
+# kMaxAgeDays, and the least recently used ones beyond kMaxEntries, are dropped
+# when the cache is saved, and it doesn't keep growing (along with the time it
+# takes to load and save).
+class VerdictCache:
+
+    # Version of the on-disk format, and of the verdicts themselves. Bump this
+    # whenever the checker's logic changes in a way that could change a verdict.
+    kFormatVersion = 8
+
+    # Number of entries kept when the cache is saved.
+    kMaxEntries = 20000
+
+    # Number of days an entry is kept without being used.
+    kMaxAgeDays = 30
+
+    # Number of seconds in the days by which entries' last use is recorded.
+    kSecondsPerDay = 86400
+
+    # Create a new VerdictCache.
+    #
+    # @param aPath The path of the file in which the cache is stored. If the file
+    #        exists, its entries are loaded; if it can't be read, or was written
+    #        by a different version, the cache starts out empty.
+    def __init__(self, aPath):
+        self.mPath = aPath
+        self.mLock = threading.Lock()
+        self.mEntries = {}
+        self.mDirty = False
+        self.mHits = 0
+        self.mMisses = 0
+
+        # The day on which each entry was last used. Uses are only recorded by
+        # the day, so that a cache that is used over and over on the same day is
+        # only saved once.
+        self.mLastUsedDays = {}
+        self.mToday = int(time.time() // self.kSecondsPerDay)
+
+        try:
+            cacheFile = open(aPath)
+            contents = json.load(cacheFile)
+            cacheFile.close()
+        except:
+            return
+
+        if isinstance(contents, dict) and contents.get('version') == self.kFormatVersion:
+            self.mEntries = contents.get('entries', {})
+            lastUsedDays = contents.get('lastUsedDays', {})
+            for key in self.mEntries:
+                self.mLastUsedDays[key] = lastUsedDays.get(key, self.mToday)
+
+    # Look up the verdict for a file section.
+    #
+    # @param aKey A key created by createVerdictKey().
+    #
+    # @returns The stored verdict, as a dict, or None, if there is none.
+    def get(self, aKey):
+        with self.mLock:
+            verdict = self.mEntries.get(aKey)
+            if verdict is None:
+                self.mMisses = self.mMisses + 1
+                return None
+
+            self.mHits = self.mHits + 1
+            if self.mLastUsedDays[aKey] != self.mToday:
+                self.mLastUsedDays[aKey] = self.mToday
+                self.mDirty = True
+            return verdict
+
+    # Store the verdict for a file section.
+    #
+    # @param aKey A key created by createVerdictKey().
+    # @param aVerdict A dict with the keys 'interfaces', 'missingFiles' and
+    #        'iidChanges'.
+    def put(self, aKey, aVerdict):
+        with self.mLock:
+            self.mEntries[aKey] = aVerdict
+            self.mLastUsedDays[aKey] = self.mToday
+            self.mDirty = True
+
+    # Drop the entries that haven't been used for kMaxAgeDays, and then the least
+    # recently used ones, until at most kMaxEntries are left. The caller must
+    # hold mLock.
+    def evictEntries(self):
+        expiredKeys = [key for (key, day) in self.mLastUsedDays.items() if self.mToday - day > self.kMaxAgeDays]
+
+        excessCount = len(self.mEntries) - len(expiredKeys) - self.kMaxEntries
+        if excessCount > 0:
+            keptKeys = [key for (key, day) in self.mLastUsedDays.items() if self.mToday - day <= self.kMaxAgeDays]
+            keptKeys.sort(key=lambda aKey: self.mLastUsedDays[aKey])
+            expiredKeys.extend(keptKeys[:excessCount])
+
+        for key in expiredKeys:
+            del self.mEntries[key]
+            del self.mLastUsedDays[key]
+
+    # Write the cache back to disk, if anything has been added to it or used in
+    # it on a new day since it was loaded, dropping old entries first (see
+    # evictEntries()). The file is replaced atomically, so concurrent readers
+    # never see a partially written cache.
+    def save(self):
+        with self.mLock:
+            if not self.mDirty:
+                return
+
+            self.evictEntries()
+
+            temporaryPath = self.mPath + ".tmp" + str(os.getpid())
+            cacheFile = open(temporaryPath, "w")
+            json.dump({'version': self.kFormatVersion, 'entries': self.mEntries, 'lastUsedDays': self.mLastUsedDays}, cacheFile)
+            cacheFile.close()
+            os.replace(temporaryPath, self.mPath)
+            self.mDirty = False
+
+    # @returns A tuple, (hits, misses), of the number of lookups that did and
+    #          did not find a verdict.
+    def getStatistics(self):
+        with self.mLock:
+            return (self.mHits, self.mMisses)
+
+    def __len__(self):
+        with self.mLock:
+            return len(self.mEntries)
+
+
+# Create the key under which the verdict for a file section is stored.
+#
+# @param aSectionLines A list of the lines of the file section, starting with
+#        its 'diff --git' header.
+# @param aFileIdentity A string identifying the contents of the file the
+#        section applies to (e.g. a hash of the file), or None, if the file
+#        could not be read.
+# @param aDescriptorList The list of IDLDescriptor objects used by the checker.
+#
+# @returns The key, as a string.
+def createVerdictKey(aSectionLines, aFileIdentity, aDescriptorList):
+    digest = hashlib.sha1()
+    digest.update(("version:" + str(VerdictCache.kFormatVersion) + "\n").encode('utf-8'))
+
+    for descriptor in aDescriptorList:
+        digest.update(("descriptor:" + descriptor.getToken() + ":" + str(descriptor.affectsBinaryCompatibility()) + "\n").encode('utf-8'))
+
+    digest.update(("file:" + str(aFileIdentity) + "\n").encode('utf-8'))
+
+    for line in aSectionLines:
+        digest.update(line.encode('utf-8', 'surrogateescape'))
+
+    return digest.hexdigest()
+
+
+# Compute a string identifying the contents of a file.
+#
+# @param aFileObject A file object opened in text mode.
+#
+# @returns The SHA-1 hash of the file's contents, as a hex string.
+def hashFileContents(aFileObject):
+    digest = hashlib.sha1()
+    for line in aFileObject:
+        digest.update(line.encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
@@ -0,0 +1,189 @@
+import os
+import time
+import subprocess
+from idlutils import SpecialBlockRangeCache
+from idlutils import FileContentProvider
+from idlutils import findIDLFileStamps
+from checkiid import IIDChecker
+from checkiid import createFindingMessage
+
+# Watch mode for checkiid: keep an eye on the IDL files in a working tree and
+# re-check each one as soon as it's saved.
+#
+# Changes are detected by polling the modification time and size of every IDL
+# file in the tree, so no external services (or non-standard modules) are
+# needed. Only the files that changed are diffed and re-checked; everything the
+# checker learned about the other files (e.g. their special block ranges) stays
+# cached between checks.
+
+
+# @class IDLTreeWatcher Watches the IDL files in a working tree and reports
+#        findings for each file whenever it changes.
+class IDLTreeWatcher:
+
+    # Number of seconds to wait between checking IDL files for changes.
+    kPollInterval = 0.1
+
+    # Number of seconds between walks of the tree looking for IDL files that
+    # were added or removed.
+    kRescanInterval = 5.0
+
+    # Create a new IDLTreeWatcher.
+    #
+    # @param aRootPath The path to the root of the hg or git working tree.
+    # @param aPrinter The PrettyPrinter through which to report findings.
+    # @param aDescriptorList An optional list of IDLDescriptor objects to use in
+    #        place of the default list.
+    def __init__(self, aRootPath, aPrinter, aDescriptorList=None):
+        self.mRootPath = aRootPath
+        self.mPrinter = aPrinter
+        self.mDescriptorList = aDescriptorList
+        self.mRangeCache = SpecialBlockRangeCache(FileContentProvider(aRootPath))
+
+        # A mapping of the full paths of all known IDL files to their last seen
+        # (modification time, size) pair.
+        self.mFileStats = {}
+
+        # A mapping of the full paths of IDL files to the list of findings last
+        # reported for them.
+        self.mFindings = {}
+
+        self.mLastRescanTime = 0
+
+    # Find all IDL files in the working tree (see findIDLFileStamps()).
+    #
+    # @returns A map from the full path of each IDL file to its (modification
+    #          time, size) pair.
+    def findIDLFiles(self):
+        idlFiles = {}
+        for (relativePath, stamp) in findIDLFileStamps(self.mRootPath).items():
+            idlFiles[os.path.join(self.mRootPath, relativePath)] = tuple(stamp)
+        return idlFiles
+
+    # Remember the current state of every IDL file in the working tree, so that
+    # poll() only reports the ones that change from now on.
+    def recordFileStats(self):
+        self.mLastRescanTime = time.time()
+        self.mFileStats.update(self.findIDLFiles())
+
+    # Retrieve the (modification time, size) pair of a file.
+    #
+    # @returns The pair, or None, if the file no longer exists.
+    def statFile(self, aPath):
+        try:
+            fileStat = os.stat(aPath)
+        except OSError:
+            return None
+        return (fileStat.st_mtime_ns, fileStat.st_size)
+
+    # Check every known IDL file for changes since the last poll, and walk the
+    # tree for new IDL files every kRescanInterval seconds.
+    #
+    # @returns A list of the full paths of IDL files that changed, were added or
+    #          were removed.
+    def poll(self):
+        now = time.time()
+        if now - self.mLastRescanTime >= self.kRescanInterval:
+            self.mLastRescanTime = now
+            for path in self.findIDLFiles():
+                self.mFileStats.setdefault(path, None)
+
+        changedPaths = []
+        for (path, lastStat) in list(self.mFileStats.items()):
+            currentStat = self.statFile(path)
+            if currentStat != lastStat:
+                changedPaths.append(path)
+                if currentStat is None:
+                    del self.mFileStats[path]
+                else:
+                    self.mFileStats[path] = currentStat
+
+        return changedPaths
+
+    # Run an hg or git command in the working tree, depending on which kind of
+    # working tree it is.
+    #
+    # @param aHgArgs The arguments to pass to hg (not including 'hg' itself).
+    # @param aGitArgs The arguments to pass to git (not including 'git' itself).
+    #
+    # @returns A list of the lines of the command's output, which is empty if it
+    #          couldn't be run.
+    def runVersionControlCommand(self, aHgArgs, aGitArgs):
+        if os.path.isdir(os.path.join(self.mRootPath, '.hg')):
+            command = ['hg', '--cwd', self.mRootPath] + aHgArgs
+        else:
+            command = ['git', '-C', self.mRootPath] + aGitArgs
+
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as error:
+            self.mPrinter.warn("Unable to run '" + command[0] + "': " + str(error))
+            return []
+
+        (output, errors) = process.communicate()
+        return output.decode('utf-8', 'replace').splitlines(True)
+
+    # Find the IDL files that have local changes, i.e. that were modified or
+    # added since the working tree's parent revision, with a single hg or git
+    # command.
+    #
+    # @returns A list of the full paths of the files.
+    def findChangedIDLFiles(self):
+        lines = self.runVersionControlCommand(['status', '--modified', '--added', '--no-status'],
+                                              ['diff', '--name-only', '--relative', 'HEAD', '--'])
+        return [os.path.join(self.mRootPath, line.rstrip("\r\n")) for line in lines if line.rstrip().endswith('.idl')]
+
+    # Retrieve the diff of a single file against the working tree's parent
+    # revision, including changes that are staged (in git) or not.
+    #
+    # @param aPath The full path of the file.
+    #
+    # @returns A list of the lines of the diff, which is empty if the file is
+    #          unchanged (or isn't tracked).
+    def getDiffForFile(self, aPath):
+        relativePath = os.path.relpath(aPath, self.mRootPath)
+        return self.runVersionControlCommand(['diff', '--git', relativePath],
+                                             ['diff', '--no-color', 'HEAD', '--', relativePath])
+
+    # Re-check a single IDL file, and report its findings if they changed.
+    #
+    # @param aPath The full path of the file.
+    def checkFile(self, aPath):
+        self.mRangeCache.invalidate(aPath)
+
+        findings = []
+        patchLines = self.getDiffForFile(aPath)
+        if patchLines:
+            checker = IIDChecker(self.mRootPath, self.mPrinter, self.mDescriptorList, aRangeCache=self.mRangeCache)
+            result = checker.check(patchLines)
+            for record in result.getUnrevvedRecords():
+                findings.append((record.getInterfaceName(), record.getIDLFileName()))
+
+        if findings == self.mFindings.get(aPath, []):
+            return
+
+        self.mFindings[aPath] = findings
+        if not findings:
+            self.mPrinter.info("'" + os.path.relpath(aPath, self.mRootPath) + "' no longer has interfaces needing a new IID.")
+
+        for (interface, idlFileName) in findings:
+            self.mPrinter.error(createFindingMessage(interface, idlFileName))
+
+    # Watch the tree until interrupted, re-checking files as they change. The
+    # IDL files with local changes are checked once at startup.
+    def run(self):
+        self.mPrinter.info("Watching IDL files in '" + self.mRootPath + "'...")
+
+        self.recordFileStats()
+        for path in self.findChangedIDLFiles():
+            self.checkFile(path)
+        self.mPrinter.flush()
+
+        try:
+            while True:
+                time.sleep(self.kPollInterval)
+                for path in self.poll():
+                    self.checkFile(path)
+                self.mPrinter.flush()
+        except KeyboardInterrupt:
+            pass